@@ -1,3 +1,3 @@
 from app.game_tracker import GameTracker
 from app.bracket import get_teams, get_matches
-from app.types.types import GAME_ID_NUM_CHAR, INITIAL_COUNTDOWN, INITIAL_BID, INITIAL_BALANCE, CreateModel, JoinModel, ViewModel, BidModel, GameInfo, PlayerInfo, TeamInfo, MatchInfo
\ No newline at end of file
+from app.types.types import GAME_ID_NUM_CHAR, GAME_ID_CHARS, valid_game_id, INITIAL_COUNTDOWN, INITIAL_BID, INITIAL_BALANCE, CreateModel, JoinModel, ViewModel, BidModel, BatchCommand, BatchModel, GameInfo, PlayerInfo, TeamInfo, MatchInfo, ScoringRules
\ No newline at end of file
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+COMMAND_QUEUE_SIZE = 256  # commands a game may have waiting before callers are made to wait for room
+
+
+class CommandRejected(Exception):
+    """
+    A command that is invalid against the game state at the moment it runs, e.g. a bid below the current one.
+    """
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class GameActor:
+    """
+    Runs one game's commands one at a time, in the order they were submitted.
+
+    A single task drains a bounded queue, so a command always sees the state left by the one before it and
+    never interleaves with another command of the same game. Callers await their own command's result; when
+    the queue is full they wait for room, which slows a flood of requests down instead of piling them up.
+    """
+
+    def __init__(
+        self, game_id: str, handle: Callable[[str, dict], Awaitable[Any]], queue_size: int = COMMAND_QUEUE_SIZE
+    ):
+        self.game_id = game_id
+        self._handle = handle
+        self._queue_size = queue_size
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: asyncio.Task | None = None
+        self._busy = False
+
+    @property
+    def idle(self) -> bool:
+        # nothing queued and nothing running
+        return self._queue.empty() and not self._busy
+
+    async def submit(self, command: dict) -> Any:
+        """
+        Queue a command and wait for its result. Raises whatever the command raised, e.g. CommandRejected.
+        """
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((command, future))
+        return await future
+
+    def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        while not self._queue.empty():  # commands that will never run now
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(CommandRejected("Game ID not found"))
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            if self._task is not None and self._task.get_loop() is not asyncio.get_running_loop():
+                self._queue = asyncio.Queue(maxsize=self._queue_size)  # a queue is bound to its event loop
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            command, future = await self._queue.get()
+            self._busy = True
+            try:
+                result = await self._handle(self.game_id, command)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_exception(CommandRejected("Game ID not found"))  # the game left memory while it ran
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._busy = False
@@ -0,0 +1,214 @@
+"""
+Append-only store of every bid and sale, for price analytics across games.
+
+Rows are queued from the event loop and written in batches by a background thread, the way the journal is, so
+recording a bid costs the auction one queue put. The tables are flat, one row per bid or sale with the team's
+seed and region copied in, which keeps them trivial to export. Covering indexes serve the per-game and per-team
+queries, and per-team market totals are kept up to date as sales are written, so season-wide questions read a
+row per team instead of every sale.
+"""
+import csv
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import closing
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ANALYTICS_DB = os.getenv("ANALYTICS_DB", "app/bids.sqlite")
+FLUSH_INTERVAL = 0.25  # seconds the writer keeps collecting rows before it commits a batch
+TABLES = ("bids", "sales")
+FORMATS = ("csv", "parquet")
+MARKET_COLUMNS = ("team", "seed", "region", "sales", "average", "low", "high", "last")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bids (
+    game_id TEXT NOT NULL, team TEXT NOT NULL, seed INTEGER NOT NULL, region TEXT NOT NULL,
+    player TEXT NOT NULL, amount REAL NOT NULL, at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sales (
+    game_id TEXT NOT NULL, team TEXT NOT NULL, seed INTEGER NOT NULL, region TEXT NOT NULL,
+    player TEXT NOT NULL, price REAL NOT NULL, bids INTEGER NOT NULL, at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS team_market (
+    team TEXT PRIMARY KEY, seed INTEGER NOT NULL, region TEXT NOT NULL,
+    sales INTEGER NOT NULL, total REAL NOT NULL, low REAL NOT NULL, high REAL NOT NULL, last REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_bids_game_at ON bids (game_id, at, amount);
+CREATE INDEX IF NOT EXISTS ix_bids_team_at ON bids (team, at, amount);
+CREATE INDEX IF NOT EXISTS ix_sales_team_at ON sales (team, at, price, game_id, player);
+CREATE INDEX IF NOT EXISTS ix_sales_game_player_at ON sales (game_id, player, at, price, team, seed);
+"""
+
+UPDATE_MARKET = """
+INSERT INTO team_market (team, seed, region, sales, total, low, high, last) VALUES (?, ?, ?, 1, ?, ?, ?, ?)
+ON CONFLICT (team) DO UPDATE SET
+    sales = sales + 1, total = total + excluded.total, low = min(low, excluded.low), high = max(high, excluded.high),
+    last = excluded.last
+"""
+
+
+class BidArchive:
+    """
+    Bids and sales of every game, written behind the auction and queried from worker threads.
+    """
+
+    def __init__(self, path: str = ANALYTICS_DB):
+        self.path = path
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")  # readers never wait for the writer
+            db.executescript(SCHEMA)
+        self._queue: queue.Queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="bid-archive", daemon=True)
+        self._writer.start()
+
+    def record_bid(
+        self, gameId: str, team: str, seed: int, region: str, player: str, amount: float, at: float
+    ) -> None:
+        self._queue.put(("bid", (gameId, team, seed, region, player, amount, at)))
+
+    def record_sale(
+        self, gameId: str, team: str, seed: int, region: str, player: str, price: float, bids: int, at: float
+    ) -> None:
+        self._queue.put(("sale", (gameId, team, seed, region, player, price, bids, at)))
+
+    def flush(self) -> None:
+        """
+        Block until everything queued so far is committed.
+        """
+        self._queue.join()
+
+    def close(self) -> None:
+        """
+        Commit everything queued and stop the writer. Nothing can be recorded afterwards.
+        """
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    # ---- queries, blocking: run them off the event loop ----
+
+    def team_prices(self, team: str, limit: int = 1000) -> dict:
+        """
+        A team's market totals and its latest sales across games, oldest first.
+        """
+        sales = self._query(
+            "SELECT game_id, player, price, at FROM sales WHERE team = ? ORDER BY at DESC LIMIT ?", (team, limit)
+        )
+        market = self._query(
+            "SELECT team, seed, region, sales, total / sales, low, high, last FROM team_market WHERE team = ?", (team,)
+        )
+        return {
+            "team": team,
+            "market": dict(zip(MARKET_COLUMNS, market[0])) if market else None,
+            "sales": [{"gameId": g, "player": p, "price": price, "at": at} for g, p, price, at in reversed(sales)],
+        }
+
+    def market(self) -> list[dict]:
+        """
+        Sale count, average, low, high and last price of every team sold so far, over all games.
+        """
+        rows = self._query(
+            "SELECT team, seed, region, sales, total / sales, low, high, last FROM team_market ORDER BY seed, team"
+        )
+        return [dict(zip(MARKET_COLUMNS, row)) for row in rows]
+
+    def seed_prices(self) -> list[dict]:
+        """
+        Sale count and average, low and high price per seed line, over all games.
+        """
+        rows = self._query(
+            "SELECT seed, SUM(sales), SUM(total) / SUM(sales), MIN(low), MAX(high) FROM team_market "
+            "GROUP BY seed ORDER BY seed"
+        )
+        return [dict(zip(("seed", "sales", "average", "low", "high"), row)) for row in rows]
+
+    def bid_velocity(self, gameId: str, bucket: float = 60) -> list[dict]:
+        """
+        Bids per bucket of seconds in one game, and the highest bid of each bucket.
+        """
+        rows = self._query(
+            "SELECT CAST(at / ? AS INTEGER) AS slot, COUNT(*), MAX(amount) FROM bids WHERE game_id = ? "
+            "GROUP BY slot ORDER BY slot",
+            (bucket, gameId),
+        )
+        return [{"at": slot * bucket, "bids": count, "highest": highest} for slot, count, highest in rows]
+
+    def spend_curve(self, gameId: str, player: str) -> list[dict]:
+        """
+        A player's purchases in one game with their running total.
+        """
+        rows = self._query(
+            "SELECT at, team, seed, price FROM sales WHERE game_id = ? AND player = ? ORDER BY at", (gameId, player)
+        )
+        spent = 0.0
+        curve = []
+        for at, team, seed, price in rows:
+            spent += price
+            curve.append({"at": at, "team": team, "seed": seed, "price": price, "spent": spent})
+        return curve
+
+    def export(self, table: str, path: str, format: str = "csv") -> str:
+        """
+        Write a whole table to path as CSV or Parquet. Returns the path.
+        """
+        if table not in TABLES:
+            raise ValueError(f"Unknown table {table}")
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format}")
+        if format == "parquet" and pyarrow is None:
+            raise ValueError("Parquet export needs the pyarrow package")
+        with closing(self._connect()) as db:
+            cursor = db.execute(f"SELECT * FROM {table}")
+            columns = [column[0] for column in cursor.description]
+            if format == "parquet":
+                rows = cursor.fetchall()
+                data = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+                pyarrow.parquet.write_table(pyarrow.table(data), path)
+            else:
+                with open(path, "w", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+                    writer.writerows(cursor)
+        return path
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _query(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        with closing(self._connect()) as db:
+            return db.execute(sql, parameters).fetchall()
+
+    def _run(self) -> None:
+        db = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while True:
+                    batch.append(self._queue.get(timeout=FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+
+            stopping = None in batch
+            try:
+                bids = [item[1] for item in batch if item is not None and item[0] == "bid"]
+                sales = [item[1] for item in batch if item is not None and item[0] == "sale"]
+                with db:
+                    db.executemany("INSERT INTO bids VALUES (?, ?, ?, ?, ?, ?, ?)", bids)
+                    db.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?, ?, ?)", sales)
+                    db.executemany(
+                        UPDATE_MARKET, [(row[1], row[2], row[3], row[5], row[5], row[5], row[5]) for row in sales]
+                    )
+            except sqlite3.Error as e:
+                print(f"ERROR WRITING BID ARCHIVE: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stopping:
+                db.close()
+                return
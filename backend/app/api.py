@@ -1,29 +1,487 @@
 import asyncio
+import contextlib
+import json
 import random
-import string
-import pickle
 import os
-from typing import List
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+import tempfile
+import time
+import threading
+from fastapi import FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from starlette.websockets import WebSocketState
 from dotenv import load_dotenv
 
-from app import GameTracker, GAME_ID_NUM_CHAR, CreateModel, JoinModel, ViewModel, BidModel
-from app.types.types import jsonify_dict, jsonify_list
-
-# Define path for saving state
-STATE_FILE = f"app/game_state.pkl"
+from app import (
+    GAME_ID_CHARS,
+    GAME_ID_NUM_CHAR,
+    INITIAL_COUNTDOWN,
+    BatchCommand,
+    BatchModel,
+    BidModel,
+    CreateModel,
+    GameInfo,
+    GameTracker,
+    JoinModel,
+    MatchInfo,
+    ScoringRules,
+    ViewModel,
+    valid_game_id,
+)
+from app.broadcast import SEND_TIMEOUT, GameHub
+from app.encoding import negotiate, share
+from app.protocol import replace
+from app.timer import AuctionTimers
+from app.journal import EventJournal, GAME_CREATED, PLAYER_JOINED, BID_PLACED, BID_FINALIZED
+from app.results import ResultsIngestor, LiveSource, ReplaySource
+from app.repository import GameRepository
+from app.cluster import BrokerUnavailable, Cluster, make_broker
+from app.actor import GameActor, CommandRejected
+from app.analytics import BidArchive
+from app.lifecycle import GameLifecycle
+from app.spectators import SpectatorStream
+from app.simulation import TournamentSimulator, load_ratings
+from app.metrics import (
+    GAMES_RESTORED,
+    METRICS_ENABLED,
+    PROFILER_ENABLED,
+    REGISTRY,
+    STORAGE_SECONDS,
+    Gauge,
+    HttpMetrics,
+    SamplingProfiler,
+    timed,
+    watch_event_loop,
+)
 
 # Helper functions to save and load state
-def save_state() -> None:
-    with open(STATE_FILE, "wb") as f:
-        pickle.dump(gameTracker.games, f)
+def record_event(game_id: str, event: dict) -> None:
+    if not owns_game(game_id):
+        return  # the owning worker writes it
+    if GAME_STORE == "database":
+        repository.record(game_id, event, gameTracker)
+    elif journal.append(game_id, event):
+        journal.snapshot(game_id, gameTracker.game_info(game_id))
+
+@timed(STORAGE_SECONDS, "save_state")
+async def save_state() -> None:
+    if GAME_STORE == "database":
+        await repository.flush()
+        return
+    # compact every game's log into a snapshot
+    for game_id in gameTracker.games:
+        journal.snapshot(game_id, gameTracker.game_info(game_id))
+    journal.flush()
+
+@timed(STORAGE_SECONDS, "load_state")
+async def load_state() -> None:
+    # only games with an auction running are loaded at startup, to restart their countdowns from the persisted
+    # deadline; a deadline that passed while the server was down finalizes right away. The rest load on first use.
+    if GAME_STORE == "database":
+        auctions = await repository.active_auctions()
+    else:
+        auctions = journal.active_auctions()
+    for game_id in auctions:
+        if await find_game(game_id) and owns_game(game_id):
+            arm_owned_timer(game_id)
+
+async def tournament_loaded() -> None:
+    # reading the field before the startup load finished would block the event loop on the fetch, so wait for it
+    global field_loading
+    if gameTracker.teams_loaded:
+        return
+    if field_loading is None or field_loading.done():  # done without the field means it failed, so try again
+        field_loading = asyncio.get_running_loop().run_in_executor(None, lambda: gameTracker.teams_master)
+    await asyncio.shield(field_loading)
+
+async def find_game(game_id: str) -> bool:
+    # games are loaded from storage on first use and evicted when idle, so the tracker only holds the ones in play
+    if not valid_game_id(game_id):
+        return False  # never let a client-supplied id reach a storage path
+    await tournament_loaded()
+    if game_id not in gameTracker.games:
+        await restore_game(game_id)
+    if game_id not in gameTracker.games:
+        return False
+    lifecycle.touch(game_id)
+    return True
+
+async def restore_game(game_id: str) -> None:
+    if cluster is not None:
+        await cluster.hold(game_id)  # from a worker holding the game, or load_stored_game when none does
+    else:
+        await load_stored_game(game_id)
+
+async def load_stored_game(game_id: str) -> bool:
+    if GAME_STORE == "database":
+        if repository.writing(game_id):
+            await repository.flush()  # dropped with writes in flight, e.g. when the cluster broker went away
+        game = await repository.load_game(game_id)
+        if game is None or game_id in gameTracker.games:  # another request may have loaded it meanwhile
+            return game is not None
+        gameTracker.load_game(game_id, game)
+    else:
+        stored = await asyncio.to_thread(journal.read_game, game_id)
+        if stored is None or game_id in gameTracker.games:
+            return stored is not None
+        journal.restore(gameTracker, game_id, *stored)
+    game_hubs[game_id] = new_hub(game_id)
+    GAMES_RESTORED.inc()
+    return True
+
+def load_game_state(game_id: str, state: dict) -> None:
+    # the game as another worker holding it had it, the events after that follow through the broker
+    gameTracker.load_game(game_id, GameInfo.model_validate(state))
+    game_hubs[game_id] = new_hub(game_id)
+    GAMES_RESTORED.inc()
+
+def game_state(game_id: str) -> dict | None:
+    return gameTracker.game_info(game_id).model_dump(mode="json") if game_id in gameTracker.games else None
+
+def can_evict(game_id: str) -> bool:
+    # games with sockets, queued commands, a running auction or changes not in the database yet stay in memory
+    if game_id not in gameTracker.games:
+        return True
+    hub = game_hubs.get(game_id)
+    actor = game_actors.get(game_id)
+    stream = spectator_streams.get(game_id)
+    return (
+        (hub is None or not hub.subscribers)
+        and (stream is None or not stream.spectators)
+        and (actor is None or actor.idle)
+        and gameTracker.get_deadline(game_id) is None
+        and not repository.writing(game_id)
+    )
 
-def load_state() -> None:
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "rb") as f:
-            gameTracker.games = pickle.load(f)
+def evict_game(game_id: str) -> None:
+    if game_id in gameTracker.games:
+        if GAME_STORE != "database" and owns_game(game_id):
+            journal.archive(game_id, gameTracker.game_info(game_id))
+        gameTracker.remove_game(game_id)
+    if cluster is not None:
+        cluster.drop(game_id)
+    hub = game_hubs.pop(game_id, None)
+    if hub is not None:
+        hub.close()
+    stream = spectator_streams.pop(game_id, None)
+    if stream is not None:
+        stream.close()
+    actor = game_actors.pop(game_id, None)
+    if actor is not None:
+        actor.close()
+    auction_timers.cancel(game_id)
+
+def game_snapshot(game_id: str) -> dict:
+    team = gameTracker.get_current_team(game_id)
+    return {
+        "players": gameTracker.dump_players(game_id),
+        "bid": gameTracker.get_current_bid(game_id),
+        "status": gameTracker.game_status(game_id),
+        "countdown": gameTracker.games[game_id].countdown,
+        "deadline": gameTracker.get_deadline(game_id),
+        "team": None if not team else team.model_dump(),
+        "valuation": current_valuation(game_id),
+        "remaining": gameTracker.dump_remaining_teams(game_id),
+        # the same for every game, encoded once per process
+        "all_teams": share(gameTracker.dump_all_teams()),
+        "match_results": share(gameTracker.dump_match_results()),
+    }
+
+def current_valuation(game_id: str) -> dict | None:
+    # expected points and fair price of the team up for auction, read from the simulator's cache
+    if simulator is None:
+        return None
+    values = gameTracker.valuations(game_id, simulator, current_only=True)
+    return next(iter(values.values()), None) if values else None
+
+def new_hub(game_id: str) -> GameHub:
+    return GameHub(game_id, snapshot=lambda: game_snapshot(game_id))
+
+def spectator_stream(game_id: str) -> SpectatorStream:
+    if game_id not in spectator_streams:
+        spectator_streams[game_id] = SpectatorStream(game_hubs[game_id])
+    return spectator_streams[game_id]
+
+def owns_game(game_id: str) -> bool:
+    return cluster is None or cluster.owns(game_id)
+
+async def dispatch(game_id: str, event: dict) -> None:
+    # with a cluster every worker holding the game applies the event, in the order the broker delivers it
+    if cluster is None:
+        rejection = await apply_game_event(game_id, event)
+    else:
+        rejection = await cluster.dispatch(game_id, event)
+    if rejection:
+        raise CommandRejected(rejection)
+
+async def apply_game_event(game_id: str, event: dict) -> str | None:
+    """
+    Apply one game event to the tracker, store it and push the change to this worker's sockets.
+    Events are validated here, against the state they are applied to, so every replica rejects the same ones.
+    Returns why the event was rejected, or None.
+    """
+    if event["type"] != GAME_CREATED and not await find_game(game_id):
+        print(f"ERROR: EVENT FOR UNKNOWN GAME {game_id}: {event}")
+        return "Game ID not found"
+
+    if event["type"] == GAME_CREATED:
+        await tournament_loaded()
+        scoring = ScoringRules.model_validate(event["scoring"]) if event["scoring"] else None
+        gameTracker.add_game(
+            gameId=game_id,
+            creator=event["creator"],
+            teamName=event["team"],
+            scoring=scoring,
+            drawSeed=event["drawSeed"],
+        )
+        game_hubs[game_id] = new_hub(game_id)  # Initialize the broadcast hub for this game
+        lifecycle.touch(game_id)
+        record_event(game_id, event)
+
+    elif event["type"] == PLAYER_JOINED:
+        if gameTracker.has_player(game_id, event["player"]):
+            return "Player name already taken in this game"
+        gameTracker.add_player(gameId=game_id, player=event["player"])
+        record_event(game_id, event)
+        game_hubs[game_id].sync()
+
+    elif event["type"] == BID_PLACED:
+        bid_model = BidModel(gameId=game_id, player=event["player"], bid=event["bid"], team=event["team"])
+        rejection = gameTracker.check_bid(bid_model)
+        if rejection:
+            return rejection
+        gameTracker.place_bid(bid_model)
+        if owns_game(game_id):
+            team = gameTracker.get_current_team(game_id)
+            bid_archive.record_bid(
+                game_id, team.shortName, team.seed, team.region, event["player"], event["bid"], time.time()
+            )
+        # clients render the countdown locally from the deadline
+        gameTracker.set_deadline(game_id, event["deadline"])
+        if owns_game(game_id):
+            auction_timers.arm(game_id, event["deadline"] - time.time())
+        record_event(game_id, event)
+        hub = game_hubs[game_id]
+        ops = [
+            replace("/bid", gameTracker.get_current_bid(game_id)),
+            replace("/deadline", gameTracker.get_deadline(game_id)),
+            replace("/log", f"{event['player']} bid on {team_label(game_id)} for ${event['bid']:.2f}"),
+        ]
+        if hub.state.get("status") != gameTracker.game_status(game_id):
+            ops.append(replace("/status", gameTracker.game_status(game_id)))  # the first bid starts the auction
+        hub.publish(ops)
+
+    elif event["type"] == BID_FINALIZED:
+        current = gameTracker.get_current_team(game_id)
+        if current is None or event["sold"] != current.shortName:
+            return None  # a second finalize for the same auction, e.g. from a worker that just lost the game
+        auction_timers.cancel(game_id)  # the next team's countdown starts with its first bid
+        sold = team_label(game_id)
+        bids = len(gameTracker.games[game_id].log)
+        # give team to last bidder
+        winner: BidModel = gameTracker.finalize_bid(game_id, nextTeam=event["team"])
+        if winner.player and owns_game(game_id):
+            bid_archive.record_sale(
+                game_id, current.shortName, current.seed, current.region, winner.player, winner.bid, bids, time.time()
+            )
+        record_event(game_id, event)
+        if winner.player:
+            purchase_msg = f"{winner.player} bought {sold} for ${winner.bid:.2f}!"
+        else:
+            purchase_msg = f"No one bought {sold}!"
+
+        # one delta: balance and team moved to the winner, team removed from remaining, new team, bid and deadline
+        game_hubs[game_id].sync([replace("/log", purchase_msg)])
+    return None
+
+def team_label(game_id: str) -> str:
+    team = gameTracker.get_current_team(game_id)
+    return f"{team.shortName} ({team.seed})"
+
+async def run_command(game_id: str, command: dict) -> list[str | None] | None:
+    """
+    Run one command from a game's actor. The next team is drawn and the deadline set here, when the command
+    runs, so they always follow the commands before it. A batch returns its commands' rejections.
+    """
+    if command["type"] == "batch":
+        return await run_game_batch(game_id, command["commands"])
+    if command["type"] == "create":
+        await dispatch(game_id, command["event"])
+        return None
+    if not await find_game(game_id):  # evicted while the command was queued
+        raise CommandRejected("Game ID not found")
+    if command["type"] == "view":
+        game_hubs[game_id].sync()
+    elif command["type"] == "join":
+        await dispatch(game_id, {"type": PLAYER_JOINED, "player": command["player"]})
+    elif command["type"] == "bid":
+        await dispatch(
+            game_id,
+            {
+                "type": BID_PLACED,
+                "player": command["player"],
+                "bid": command["bid"],
+                "team": command["team"],
+                "deadline": time.time() + INITIAL_COUNTDOWN,
+            },
+        )
+    elif command["type"] == "finalize":
+        if gameTracker.get_current_team(game_id) is None:
+            return None  # every team has been auctioned
+        deadline = gameTracker.get_deadline(game_id)
+        if deadline is None:
+            return None  # no bids on the current team yet
+        if deadline > time.time():
+            # a bid queued ahead of this finalize extended the auction; its countdown finalizes it
+            if game_id not in auction_timers.deadlines:
+                arm_owned_timer(game_id)
+            return None
+        # the sold team guards against finalizing the same auction twice
+        await dispatch(
+            game_id,
+            {
+                "type": BID_FINALIZED,
+                "sold": gameTracker.get_current_team(game_id).shortName,
+                "team": gameTracker.pick_team_name(game_id),
+            },
+        )
+    else:
+        raise CommandRejected(f"Unknown command {command['type']}")
+    return None
+
+async def run_game_batch(game_id: str, commands: list[dict]) -> list[str | None]:
+    """
+    One game's share of a batch, run back to back as a single actor command. The changes are written in one
+    transaction and reach clients as one delta. Returns each command's rejection, None where it succeeded.
+    """
+    rejections: list[str | None] = []
+    storage = repository.transaction(game_id) if GAME_STORE == "database" else contextlib.nullcontext()
+    with storage, contextlib.ExitStack() as held:
+        if commands and commands[0]["type"] == "create":
+            try:
+                await run_command(game_id, commands.pop(0))
+                rejections.append(None)
+            except CommandRejected as e:
+                rejections.append(e.detail)
+        if not await find_game(game_id):
+            return rejections + ["Game ID not found"] * len(commands)
+        held.enter_context(game_hubs[game_id].batched())  # the hub only exists once the game does
+        for command in commands:
+            try:
+                await run_command(game_id, command)
+                rejections.append(None)
+            except CommandRejected as e:
+                rejections.append(e.detail)
+    return rejections
+
+
+async def run_batch(commands: list[BatchCommand]) -> list[dict]:
+    """
+    Run many create, join and bid commands. They are split by game, keeping each game's order, and the games run
+    concurrently, one actor command each. Returns one result per command, in order.
+    """
+    results: list[dict] = [{} for _ in commands]
+    refs: dict[str, str] = {}  # ref of a create in this batch -> the new game's id
+    games: dict[str, list[tuple[int, dict]]] = {}
+    for i, command in enumerate(commands):
+        if command.op == "create":
+            game_id = new_game_id()
+            if command.ref:
+                refs[command.ref] = game_id
+            games[game_id] = [(i, {"type": "create", "event": game_created_event(command)})]
+            continue
+        game_id = refs.get(command.gameId, command.gameId)
+        if command.op == "join":
+            entry = {"type": "join", "player": command.player}
+        elif command.op == "bid" and command.bid is not None and command.team is not None:
+            entry = {"type": "bid", "player": command.player, "bid": command.bid, "team": command.team}
+        else:
+            results[i] = {"ok": False, "detail": f"Invalid {command.op} command"}
+            continue
+        if game_id is None:
+            results[i] = {"ok": False, "detail": "gameId is required"}
+            continue
+        games.setdefault(game_id, []).append((i, entry))
+
+    async def run_game(game_id: str, entries: list[tuple[int, dict]]) -> None:
+        created = entries[0][1]["type"] == "create"
+        if not created and not await find_game(game_id):
+            rejections = ["Game ID not found"] * len(entries)
+        else:
+            if created and cluster is not None:
+                await cluster.claim(game_id)  # the creating worker runs the game's timer
+            try:
+                rejections = await game_actor(game_id).submit(
+                    {"type": "batch", "commands": [entry for _, entry in entries]}
+                )
+            except CommandRejected as e:
+                rejections = [e.detail] * len(entries)
+        for (i, _), rejection in zip(entries, rejections):
+            results[i] = {"ok": rejection is None, "gameId": game_id}
+            if rejection is not None:
+                results[i]["detail"] = rejection
+
+    await asyncio.gather(*(run_game(game_id, entries) for game_id, entries in games.items()))
+    return results
+
+def new_game_id() -> str:
+    return "".join(random.choices(GAME_ID_CHARS, k=GAME_ID_NUM_CHAR))
+
+def game_created_event(create_model: CreateModel | BatchCommand) -> dict:
+    return {
+        "type": GAME_CREATED,
+        "creator": create_model.player,
+        "team": None,  # the first lot of the draw order
+        "scoring": create_model.scoring.model_dump() if create_model.scoring else None,
+        # every replica shuffles the same draw order from this seed
+        "drawSeed": create_model.drawSeed if create_model.drawSeed is not None else random.getrandbits(32),
+    }
+
+def game_actor(game_id: str) -> GameActor:
+    if game_id not in game_actors:
+        game_actors[game_id] = GameActor(game_id, run_command)
+    return game_actors[game_id]
+
+async def submit(game_id: str, command: dict) -> None:
+    try:
+        await game_actor(game_id).submit(command)
+    except CommandRejected as e:
+        raise HTTPException(status_code=400, detail=e.detail)
+
+def publish_text(game_id: str, text: str) -> None:
+    game_hubs[game_id].publish_text(text)
+
+def arm_owned_timer(game_id: str) -> None:
+    # this worker took over the game, resume its countdown if an auction is running
+    deadline = gameTracker.get_deadline(game_id) if game_id in gameTracker.games else None
+    if deadline is not None:
+        auction_timers.arm(game_id, deadline - time.time())
+
+def publish_match_results(matches: list[MatchInfo]) -> None:
+    # points were already credited by the tracker, every game gets the new results
+    for hub in game_hubs.values():
+        hub.sync()
+    start_simulation()
+
+def start_simulation() -> None:
+    global simulation_task
+    if simulator is not None and (simulation_task is None or simulation_task.done()):
+        simulation_task = asyncio.create_task(simulate_tournament())
+
+async def simulate_tournament() -> None:
+    # one run at a time; results that arrive during a run are simulated right after it
+    if simulator is None:
+        return
+    while simulator.version != gameTracker.results_version:
+        try:
+            if not await simulator.run(gameTracker.results_version, gameTracker.match_results):
+                return
+        except Exception as e:
+            print(f"ERROR SIMULATING TOURNAMENT: {e}")
+            return
+        for hub in game_hubs.values():
+            hub.sync()  # new valuations
 
 # ================== SETUP APP ==================
 
@@ -33,240 +491,381 @@ FRONTEND_HOST = os.getenv("FRONTEND_HOST", "127.0.0.1")
 FRONTEND_PORT = int(os.getenv("FRONTEND_PORT", 3000))
 REACT_APP_BACKEND_HOST = os.getenv("REACT_APP_BACKEND_HOST", "127.0.0.1")
 REACT_APP_BACKEND_PORT = int(os.getenv("REACT_APP_BACKEND_PORT", 8000))
-
-origins = [f"http://{FRONTEND_HOST}:{FRONTEND_PORT}", f"{FRONTEND_HOST}:{FRONTEND_PORT}", f"http://localhost:{FRONTEND_PORT}"]
+RESULTS_SOURCE = os.getenv("RESULTS_SOURCE", "live")  # "live", "replay" (bundled fixtures) or "off"
+GAME_STORE = os.getenv("GAME_STORE", "journal")  # "journal" (event log files) or "database" (DATABASE_URL)
+# CLUSTER_BROKER (see app/cluster.py) runs this worker as one of several; it needs GAME_STORE=database
+MAX_BATCH_COMMANDS = 10_000  # commands in one /batch/ request or /commands message
+
+origins = [
+    f"http://{FRONTEND_HOST}:{FRONTEND_PORT}",
+    f"{FRONTEND_HOST}:{FRONTEND_PORT}",
+    f"http://localhost:{FRONTEND_PORT}",
+]
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
+if METRICS_ENABLED:
+    app.add_middleware(HttpMetrics)
+
+# Broadcast hub (and its WebSocket subscribers) for each game
+game_hubs: dict[str, GameHub] = {}
+
+# Shared, rate-limited read-only stream for each watched game
+spectator_streams: dict[str, SpectatorStream] = {}
 
-# Dictionary to keep track of WebSocket connections for each game
-game_connections: dict[str, List[WebSocket]] = {}
+# Command queue for each game, so a game's bids, joins and finalizes never interleave
+game_actors: dict[str, GameActor] = {}
 
 # Track Player Teams and Balance. Will turn into a database maybe
 gameTracker: GameTracker = GameTracker(year=2025, month="03", day=("20", "21"))
 
-# Dictionary to store countdown timer tasks
-countdown_tasks: dict[str, asyncio.Task] = {}
+# Auction deadlines for every game, finalizing the current team when one expires
+auction_timers: AuctionTimers = AuctionTimers(on_expire=lambda game_id: finalize_bid(game_id))
+
+# Moves idle games out of memory to storage, find_game loads them back
+lifecycle: GameLifecycle = GameLifecycle(can_evict=can_evict, evict=evict_game)
+
+# Per-game append-only log of state changes
+journal: EventJournal = EventJournal()
+
+# Every bid and sale, for the /analytics/ queries
+bid_archive: BidArchive = BidArchive()
+
+# SQL storage for game state, used instead of the journal when GAME_STORE is "database"
+repository: GameRepository = GameRepository()
+
+# Replication of game events between workers, None when running as a single worker
+broker = make_broker()
+if broker is not None and GAME_STORE != "database":
+    # the journal is a directory of files local to one worker, the others could never load its games
+    raise RuntimeError("CLUSTER_BROKER needs GAME_STORE=database")
+cluster: Cluster | None = None if broker is None else Cluster(
+    broker,
+    on_event=apply_game_event,
+    on_text=publish_text,
+    on_owned=arm_owned_timer,
+    on_released=auction_timers.cancel,
+    on_dropped=evict_game,
+    load=load_stored_game,
+    on_state=load_game_state,
+    state=game_state,
+)
+
+# Background poller that fills gameTracker.match_results
+results_ingestor: ResultsIngestor = ResultsIngestor(
+    gameTracker,
+    source=ReplaySource.from_fixtures(gameTracker.year) if RESULTS_SOURCE == "replay" else LiveSource(gameTracker.year),
+    on_update=publish_match_results,
+)
+
+# The tournament field loading off the event loop, started at startup
+field_loading: asyncio.Future | None = None
+
+# Expected team values for bid guidance, built once the tournament field is loaded
+simulator: TournamentSimulator | None = None
+simulation_task: asyncio.Task | None = None
+
+# Gauges read when /metrics is scraped
+REGISTRY.add(Gauge("auction_games", "Games held in memory.", collect=lambda: len(gameTracker.games)))
+REGISTRY.add(
+    Gauge(
+        "auction_sockets",
+        "Open game websockets.",
+        collect=lambda: sum(len(hub.subscribers) for hub in game_hubs.values()),
+    )
+)
+REGISTRY.add(
+    Gauge(
+        "auction_game_sockets",
+        "Open websockets per game, for games that have any.",
+        collect=lambda: {(game_id,): len(hub.subscribers) for game_id, hub in game_hubs.items() if hub.subscribers},
+        labels=("game",),
+    )
+)
+REGISTRY.add(
+    Gauge(
+        "auction_spectators",
+        "Open spectator streams.",
+        collect=lambda: sum(stream.spectators for stream in spectator_streams.values()),
+    )
+)
+REGISTRY.add(Gauge("auction_actors", "Games with a command actor.", collect=lambda: len(game_actors)))
+REGISTRY.add(Gauge("auction_tasks", "Tasks on the event loop.", collect=lambda: len(asyncio.all_tasks())))
+REGISTRY.add(Gauge("auction_armed_timers", "Auctions counting down.", collect=lambda: len(auction_timers.deadlines)))
 
 # ================== URL PATHS ==================
 
+@app.exception_handler(BrokerUnavailable)
+async def broker_unavailable(request, error: BrokerUnavailable):
+    # the cluster broker is down, the request can be retried once this worker reconnects
+    return JSONResponse(status_code=503, content={"detail": str(error)})
+
+
+@app.on_event("startup")
+async def start_background_services():
+    # load the tournament field in the background so the server accepts connections right away
+    asyncio.create_task(load_tournament_data())
+    if METRICS_ENABLED:
+        asyncio.create_task(watch_event_loop())
+    if cluster is not None:
+        await cluster.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await save_state()
+    await asyncio.to_thread(bid_archive.close)
+
+
+async def load_tournament_data():
+    global simulator
+    await tournament_loaded()
+    simulator = TournamentSimulator(gameTracker.catalog, ratings=load_ratings(gameTracker.catalog))
+    start_simulation()
+    if GAME_STORE == "database":
+        await repository.open({**gameTracker.teams_master, **gameTracker.lots}, gameTracker.bundles)
+    await load_state()
+    if RESULTS_SOURCE != "off":
+        results_ingestor.start()
+
+
 @app.post("/create-game/")
 async def create_game(create_model: CreateModel) -> dict:
-    new_game_id: str = "".join(random.choices(string.ascii_uppercase + string.digits, k=GAME_ID_NUM_CHAR))
-    gameTracker.add_game(gameId=new_game_id, creator=create_model.player)
-    game_connections[new_game_id] = []  # Initialize the list of WebSocket connections for this game
-    save_state()  # Save state after creating a game
-    return {"id": new_game_id}
+    game_id = new_game_id()
+    if cluster is not None:
+        await cluster.claim(game_id)  # the creating worker runs the game's timer
+    await dispatch(game_id, game_created_event(create_model))
+    return {"id": game_id}
 
 
 @app.post("/join-game/")
 async def join_game(join_model: JoinModel):
-    if join_model.gameId not in gameTracker.games:
+    if not await find_game(join_model.gameId):
         raise HTTPException(status_code=404, detail="Game ID not found")
-    if join_model.player in gameTracker.get_all_players(join_model.gameId):
-        raise HTTPException(status_code=400, detail="Player name already taken in this game")
 
-    gameTracker.add_player(gameId=join_model.gameId, player=join_model.player)
-    save_state()  # Save state after adding a player
-
-    if join_model.gameId in game_connections:
-        for ws in game_connections[join_model.gameId]:
-            await ws.send_json({"players": jsonify_dict(gameTracker.get_all_players(join_model.gameId))})
+    await submit(join_model.gameId, {"type": "join", "player": join_model.player})
 
     return {"detail": "Joined game successfully"}
 
 
 @app.post("/view-game/")
 async def view_game(view_model: ViewModel):
-    if view_model.gameId not in gameTracker.games:
+    if not await find_game(view_model.gameId):
         raise HTTPException(status_code=404, detail="Game ID not found")
-    
-    gameTracker.calculate_player_points(view_model.gameId)
-    
-    if view_model.gameId in game_connections:
-        for ws in game_connections[view_model.gameId]:
-            await ws.send_json({"players": jsonify_dict(gameTracker.get_all_players(view_model.gameId))})
-
-    return {"detail": "Viewed game successfully"}
 
+    await submit(view_model.gameId, {"type": "view"})
 
-async def start_countdown(game_id: str):
-    while True:
-        gameTracker.decrement_countdown(game_id)
-        for ws in game_connections[game_id]:
-            await ws.send_json({"countdown": gameTracker.games[game_id].countdown})
-        await asyncio.sleep(1)  # Wait for 1 second between each decrement
-        if gameTracker.get_current_countdown(game_id) == 0:
-            await finalize_bid(game_id)
-            break
+    return {"detail": "Viewed game successfully", "status": gameTracker.game_status(view_model.gameId)}
 
 
 async def finalize_bid(game_id: str):
-    # give team to last bidder
-    winner:BidModel = gameTracker.finalize_bid(game_id)
-    purchase_msg = f"No one bought {winner.team}!" if not winner.player else f"{winner.player} bought {winner.team} for ${winner.bid:.2f}!"
-
-    gameTracker.calculate_player_points(game_id)
-
-    for ws in game_connections[game_id]:
-        await ws.send_json({"log": purchase_msg})
-        await ws.send_json({"team": gameTracker.get_current_team(game_id).model_dump()})
-        await ws.send_json({"bid": gameTracker.get_current_bid(game_id)})
-        await ws.send_json({"countdown": gameTracker.get_current_countdown(game_id)})
-        await ws.send_json({"players": jsonify_dict(gameTracker.get_all_players(game_id))})
-        await ws.send_json({"remaining": jsonify_list(gameTracker.get_remaining_teams(game_id))})
+    # queued behind the game's pending bids without holding up the timers of other games
+    asyncio.create_task(submit(game_id, {"type": "finalize"}))
 
 
 @app.websocket("/ws/{game_id}")
-async def websocket_endpoint(websocket: WebSocket, game_id: str):
+async def websocket_endpoint(
+    websocket: WebSocket, game_id: str, encoding: str | None = None, resume: str | None = None
+):
     await websocket.accept()
-    if game_id not in game_connections:
+    if not await find_game(game_id):
         await websocket.close(code=4000, reason="Invalid game ID")
         return
-    game_connections[game_id].append(websocket)
-
-    async def send_participant_updates():
-        try:
-            while True:
-                if websocket.application_state == WebSocketState.CONNECTED:
-                    await websocket.send_json({"players": jsonify_dict(gameTracker.get_all_players(game_id))})
-                else:
-                    break  # Stop sending if the connection is no longer active
-                await asyncio.sleep(10)
-        except WebSocketDisconnect:
-            # Handle the WebSocket disconnection
-            if websocket in game_connections[game_id]:
-                game_connections[game_id].remove(websocket)
-                print(f"WebSocket disconnected: {websocket}")
-
-    async def send_bid_updates():
-        try:
-            while True:
-                if websocket.application_state == WebSocketState.CONNECTED:
-                    await websocket.send_json({"bid": gameTracker.get_current_bid(game_id)})
-                else:
-                    break  # Stop sending if the connection is no longer active
-                await asyncio.sleep(10)
-        except WebSocketDisconnect:
-            # Handle the WebSocket disconnection
-            if websocket in game_connections[game_id]:
-                game_connections[game_id].remove(websocket)
-                print(f"WebSocket disconnected: {websocket}")
-
-    async def send_team():
-        try:
-            while True:
-                if websocket.application_state == WebSocketState.CONNECTED:
-                    await websocket.send_json({"team": None if not gameTracker.get_current_team(game_id) else gameTracker.get_current_team(game_id).model_dump()})
+    hub = game_hubs[game_id]
+    # ?encoding=msgpack for binary frames, ?resume=<epoch>.<version> to get only what was missed after a reconnect
+    hub.subscribe(websocket, negotiate(encoding), resume)
+    creator = len(hub.subscribers) == 1  # first socket in the game is the creator's lobby
+
+    try:
+        while websocket.application_state == WebSocketState.CONNECTED:
+            message = await websocket.receive_text()
+            hub.seen(websocket)  # any message, usually a "pong", keeps the socket from being reaped
+            if message == "startGame" and creator:
+                if cluster is None:
+                    publish_text(game_id, "gameStarted")
                 else:
-                    break  # Stop sending if the connection is no longer active
-                await asyncio.sleep(10)
-        except WebSocketDisconnect:
-            # Handle the WebSocket disconnection
-            if websocket in game_connections[game_id]:
-                game_connections[game_id].remove(websocket)
-                print(f"WebSocket disconnected: {websocket}")
-
-    async def send_remaining():
-        try:
-            while True:
-                if websocket.application_state == WebSocketState.CONNECTED:
-                    await websocket.send_json({"remaining": jsonify_list(gameTracker.get_remaining_teams(game_id))})
-                else:
-                    break  # Stop sending if the connection is no longer active
-                await asyncio.sleep(10)
-        except WebSocketDisconnect:
-            # Handle the WebSocket disconnection
-            if websocket in game_connections[game_id]:
-                game_connections[game_id].remove(websocket)
-                print(f"WebSocket disconnected: {websocket}")
-
-    async def send_all_teams():
-        try:
-            while True:
-                if websocket.application_state == WebSocketState.CONNECTED:
-                    await websocket.send_json({"all_teams": jsonify_list(gameTracker.get_all_teams())})
-                else:
-                    break  # Stop sending if the connection is no longer active
-                await asyncio.sleep(10)
-        except WebSocketDisconnect:
-            # Handle the WebSocket disconnection
-            if websocket in game_connections[game_id]:
-                game_connections[game_id].remove(websocket)
-                print(f"WebSocket disconnected: {websocket}")
-
-    async def send_match_results():
-        try:
-            while True:
-                if websocket.application_state == WebSocketState.CONNECTED:
-                    await websocket.send_json({"match_results": jsonify_list(gameTracker.match_results)})
-                else:
-                    break  # Stop sending if the connection is no longer active
-                await asyncio.sleep(10)
-        except WebSocketDisconnect:
-            # Handle the WebSocket disconnection
-            if websocket in game_connections[game_id]:
-                game_connections[game_id].remove(websocket)
-                print(f"WebSocket disconnected: {websocket}")
-
-    async def listen_for_messages():
+                    await cluster.publish_text(game_id, "gameStarted")
+            elif message.startswith("{"):
+                try:
+                    hub.resync(websocket, int(json.loads(message)["resync"]))
+                except (ValueError, KeyError, TypeError):
+                    print(f"IGNORING MALFORMED WEBSOCKET MESSAGE {message[:100]!r} FROM {websocket}")
+    except WebSocketDisconnect:
+        print(f"WebSocket disconnected: {websocket}")
+    finally:
+        hub.unsubscribe(websocket)
+        if game_id in gameTracker.games:
+            lifecycle.touch(game_id)  # idle time counts from the last socket leaving
+
+
+@app.websocket("/spectate/{game_id}")
+async def spectate_socket(websocket: WebSocket, game_id: str, resume: str | None = None):
+    # read-only: the socket is never a lobby creator and nothing it sends is read
+    await websocket.accept()
+    if not await find_game(game_id):
+        await websocket.close(code=4000, reason="Invalid game ID")
+        return
+    try:
+        async for text in spectator_stream(game_id).follow(resume):
+            await asyncio.wait_for(websocket.send_text(text), SEND_TIMEOUT)
+    except Exception:
+        print(f"Spectator disconnected: {websocket}")  # closed, or too slow to take an update
+    if websocket.application_state == WebSocketState.CONNECTED:
         try:
-            while True:
-                if websocket.application_state == WebSocketState.CONNECTED:
-                    message = await websocket.receive_text()
-                    if message == "startGame" and websocket in game_connections[game_id][:1]:
-                        for participant_ws in game_connections[game_id]:
-                            await participant_ws.send_text("gameStarted")
-                        break  # Exit the loop if the game starts
-                else:
-                    break  # Stop sending if the connection is no longer active
-        except WebSocketDisconnect:
-            # Handle the WebSocket disconnection
-            if websocket in game_connections[game_id]:
-                game_connections[game_id].remove(websocket)
-                print(f"WebSocket disconnected: {websocket}")
-
-    send_participant_task = asyncio.create_task(send_participant_updates())
-    send_bid_task = asyncio.create_task(send_bid_updates())
-    send_team_task = asyncio.create_task(send_team())
-    send_remaining_task = asyncio.create_task(send_remaining())
-    send_all_teams_task = asyncio.create_task(send_all_teams())
-    send_match_results_task = asyncio.create_task(send_match_results())
-    listen_task = asyncio.create_task(listen_for_messages())
-
-    # Wait for either task to complete
-    done, pending = await asyncio.wait(
-        [send_participant_task, send_bid_task, listen_task, send_team_task, send_remaining_task, send_all_teams_task, send_match_results_task],
-        return_when=asyncio.FIRST_COMPLETED,
-    )
+            await asyncio.wait_for(websocket.close(), SEND_TIMEOUT)
+        except Exception:
+            pass  # already gone
 
-    # Cancel any pending tasks if one task completes
-    for task in pending:
-        task.cancel()
 
-    # Cleanup after tasks complete
-    if game_id in game_connections and websocket in game_connections[game_id]:
-        game_connections[game_id].remove(websocket)
+@app.get("/spectate/{game_id}/events")
+async def spectate_events(game_id: str, resume: str | None = None, last_event_id: str | None = Header(None)):
+    # Server-Sent Events; a reconnecting EventSource resumes from the Last-Event-ID it sends
+    if not await find_game(game_id):
+        raise HTTPException(status_code=404, detail="Game ID not found")
+    return StreamingResponse(
+        spectator_stream(game_id).follow(resume or last_event_id, sse=True),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/bid/")
 async def bid(bid_model: BidModel):
-    if bid_model.gameId not in gameTracker.games:
+    if not await find_game(bid_model.gameId):
+        raise HTTPException(status_code=404, detail="Game ID not found")
+
+    await submit(
+        bid_model.gameId,
+        {"type": "bid", "player": bid_model.player, "bid": bid_model.bid, "team": bid_model.team},
+    )
+
+    return {"detail": "Bid placed successfully"}
+
+
+@app.post("/batch/")
+async def batch(batch_model: BatchModel):
+    # many creates, joins and bids at once, e.g. setting up a league or running bots
+    if len(batch_model.commands) > MAX_BATCH_COMMANDS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_COMMANDS} commands per batch")
+    return {"results": await run_batch(batch_model.commands)}
+
+
+@app.websocket("/commands")
+async def command_socket(websocket: WebSocket):
+    # the batch API over one long-lived socket: {"id": ..., "commands": [...]} -> {"id": ..., "results": [...]}
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                batch_model = BatchModel.model_validate_json(message)
+            except ValueError as e:
+                await websocket.send_text(json.dumps({"detail": str(e)}))
+                continue
+            if len(batch_model.commands) > MAX_BATCH_COMMANDS:
+                reply = {"id": batch_model.id, "detail": f"At most {MAX_BATCH_COMMANDS} commands per batch"}
+            else:
+                reply = {"id": batch_model.id, "results": await run_batch(batch_model.commands)}
+            await websocket.send_text(json.dumps(reply))
+    except WebSocketDisconnect:
+        pass
+
+
+@app.post("/team-values/")
+async def team_values(view_model: ViewModel):
+    if not await find_game(view_model.gameId):
         raise HTTPException(status_code=404, detail="Game ID not found")
+    values = None if simulator is None else gameTracker.valuations(view_model.gameId, simulator)
+    if simulator is None or values is None:
+        raise HTTPException(status_code=503, detail="Team values are still being simulated")
+    return {"resultsVersion": simulator.version, "simulations": simulator.simulations, "teams": values}
+
+
+@app.get("/analytics/market")
+async def market_prices():
+    return await asyncio.to_thread(bid_archive.market)
+
+
+@app.get("/analytics/seeds")
+async def seed_prices():
+    return await asyncio.to_thread(bid_archive.seed_prices)
+
+
+@app.get("/analytics/teams/{team}")
+async def team_prices(team: str, limit: int = 1000):
+    return await asyncio.to_thread(bid_archive.team_prices, team, min(max(limit, 1), 10_000))
+
+
+@app.get("/analytics/games/{game_id}/velocity")
+async def bid_velocity(game_id: str, bucket: float = 60):
+    return await asyncio.to_thread(bid_archive.bid_velocity, game_id, max(bucket, 1))
+
+
+@app.get("/analytics/games/{game_id}/players/{player}/spend")
+async def spend_curve(game_id: str, player: str):
+    return await asyncio.to_thread(bid_archive.spend_curve, game_id, player)
+
+
+@app.get("/analytics/export/{table}")
+async def export_table(table: str, format: str = "csv"):
+    # the archive as a file; written to a temporary file that is removed once it has been sent
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        await asyncio.to_thread(bid_archive.export, table, path, format)
+    except ValueError as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileResponse(path, filename=f"{table}.{format}", background=BackgroundTask(os.remove, path))
+
+
+@app.get("/metrics")
+async def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile")
+async def profile(seconds: float = 10):
+    # sample the event loop thread while it keeps serving, then return the stacks for a flame graph
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Set PROFILER_ENABLED=1 to use the profiler")
+    profiler = SamplingProfiler(threading.get_ident())
+    profiler.start()
+    await asyncio.sleep(min(max(seconds, 0.1), 60))
+    return PlainTextResponse(profiler.stop())
+
+
+if __name__ == "__main__":
+    # seconds to create GAMES games with three joins each, one request per command against one /batch/ request,
+    # in process with the bundled fixtures and throwaway storage
+    #   TOURNAMENT_OFFLINE=1 RESULTS_SOURCE=off JOURNAL_DIR=$(mktemp -d) ANALYTICS_DB=$(mktemp) python -m app.api
+    from fastapi.testclient import TestClient
 
-    gameTracker.place_bid(bid_model)
-    save_state()  # Save state after placing a bid
+    GAMES = 200
+    JOINS = ("bob", "carol", "dave")
 
-    if bid_model.gameId in game_connections:
-        for ws in game_connections[bid_model.gameId]:
-            await ws.send_json({"bid": gameTracker.get_current_bid(bid_model.gameId)})
-            await ws.send_json({"log": f"{bid_model.player} bid on {bid_model.team} for ${bid_model.bid:.2f}"})
+    with TestClient(app) as client:
+        client.post("/create-game/", json={"player": "alice"})  # waits for the tournament field, not timed
 
-    # Ensure there's no running countdown task or cancel if there is one
-    if bid_model.gameId in countdown_tasks and not countdown_tasks[bid_model.gameId].cancelled():
-        countdown_tasks[bid_model.gameId].cancel()
+        start = time.perf_counter()
+        for _ in range(GAMES):
+            game_id = client.post("/create-game/", json={"player": "alice"}).json()["id"]
+            for player in JOINS:
+                client.post("/join-game/", json={"gameId": game_id, "player": player}).raise_for_status()
+        single = time.perf_counter() - start
 
-    countdown_tasks[bid_model.gameId] = asyncio.create_task(start_countdown(bid_model.gameId))
+        commands: list[dict] = []
+        for number in range(GAMES):
+            commands.append({"op": "create", "ref": f"g{number}", "player": "alice"})
+            commands.extend({"op": "join", "gameId": f"g{number}", "player": player} for player in JOINS)
+        start = time.perf_counter()
+        results = client.post("/batch/", json={"commands": commands}).json()["results"]
+        batched = time.perf_counter() - start
+        assert all(result["ok"] for result in results)
 
-    return {"detail": "Bid placed successfully"}
\ No newline at end of file
+    print(f"{GAMES} games with {len(JOINS)} joins each, store: {GAME_STORE}")
+    print(f"{'single requests':20} {single:7.2f} s")
+    print(f"{'one batch':20} {batched:7.2f} s")
@@ -1,118 +1,179 @@
 import csv
-import requests
 
 from app.types.types import TeamInfo, MatchInfo
+from app.scoreboard import scoreboard
+
+
+def parse_scoreboard(data: dict, first_id: int = 0) -> list[MatchInfo]:
+    """
+    Parse one day's scoreboard into tournament matches. Games without seeds are not tournament games and are skipped.
+
+    :param data: Scoreboard JSON for one day.
+    :type data: dict
+    :param first_id: Id given to the first match, the rest are numbered after it.
+    :type first_id: int
+    :return: matches in feed order
+    :rtype: list[MatchInfo]
+    """
+
+    matches: list[MatchInfo] = []
+    for game in data.get("games", []):  # Adjust the path based on the actual data structure
+        away_team: dict = game.get("game").get("away")
+        home_team: dict = game.get("game").get("home")
+        region = game.get("game").get("bracketRegion")
+        if not away_team.get("seed") or not home_team.get("seed"):
+            continue
+
+        away_team_info = TeamInfo(
+            shortName=away_team.get("names").get("short"),
+            urlName=away_team.get("names").get("seo"),
+            seed=away_team.get("seed"),
+            region=region
+        )
+        home_team_info = TeamInfo(
+            shortName=home_team.get("names").get("short"),
+            urlName=home_team.get("names").get("seo"),
+            seed=home_team.get("seed"),
+            region=region
+        )
+        winner_name = ""  # not played yet
+        if away_team.get("winner"):
+            winner_name = away_team_info.shortName
+        elif home_team.get("winner"):
+            winner_name = home_team_info.shortName
+
+        matches.append(
+            MatchInfo(
+                id=first_id + len(matches),
+                nextMatchId=-1,
+                roundName=game.get("game").get("bracketRound"),
+                participants=[
+                    away_team_info,
+                    home_team_info
+                ],
+                winner=winner_name,
+                startDate=game.get("game").get("startDate")
+            )
+        )
+    return matches
+
+
+REGIONS = ("East", "West", "South", "Midwest")
+FINAL_FOUR_PAIRS = (("South", "West"), ("East", "Midwest"))  # regions whose champions meet in each semifinal
+FIRST_ROUND_SLOTS = {  # seed -> first round game within its region, in bracket order
+    seed: slot for slot, pair in enumerate(((1, 16), (8, 9), (5, 12), (4, 13), (6, 11), (3, 14), (7, 10), (2, 15)))
+    for seed in pair
+}
+
+
+def round_index(round_name: str) -> int | None:
+    """
+    0 for the first round up to 5 for the championship. None for the First Four and anything unrecognized.
+    """
+    name = round_name.lower()
+    if "four" in name:
+        return None if "first" in name else 4
+    for index, key in enumerate(("first", "second", "sweet", "elite")):
+        if key in name:
+            return index
+    if "championship" in name:
+        return 5
+    return None
+
+
+def bracket_position(bracket_round: int, region: str, seed: int) -> int:
+    """
+    Stable match id from where a match sits in the bracket, derived from a participant's region and seed.
+    """
+    if bracket_round == 5:
+        return 500
+    if bracket_round == 4:
+        return 400 + next(i for i, pair in enumerate(FINAL_FOUR_PAIRS) if region in pair)
+    return bracket_round * 100 + REGIONS.index(region) * 16 + (FIRST_ROUND_SLOTS[seed] >> bracket_round)
+
+
+def link_bracket(matches: list[MatchInfo], teams: dict[str, TeamInfo]) -> list[MatchInfo]:
+    """
+    Give each match its bracket position as id and point nextMatchId at the match its winner plays next.
+
+    :param matches: Parsed tournament matches of any rounds.
+    :type matches: list[MatchInfo]
+    :param teams: The tournament field, used for each team's home region and seed.
+    :type teams: dict[str, TeamInfo]
+    :return: linked matches ordered by id, play-in games dropped
+    :rtype: list[MatchInfo]
+    """
+
+    linked: dict[int, MatchInfo] = {}
+    for match in matches:
+        bracket_round = round_index(match.roundName)
+        team = teams.get(match.participants[0].shortName)
+        if bracket_round is None or team is None or team.region not in REGIONS:
+            continue
+
+        match_id = bracket_position(bracket_round, team.region, team.seed)
+        next_id = None if bracket_round == 5 else bracket_position(bracket_round + 1, team.region, team.seed)
+        linked[match_id] = match.model_copy(update={"id": match_id, "nextMatchId": next_id})
+    return [linked[match_id] for match_id in sorted(linked)]
+
+
+def load_matches(year: int, month: str, days: tuple[str, ...]) -> list[MatchInfo]:
+    """
+    Fetch every requested day in one concurrent round and parse each day once.
+
+    :param year: The tournament year.
+    :type year: int
+    :param month: The month format like '03' for March.
+    :type month: string
+    :param days: The days to load ie ('21', '22').
+    :type days: tuple(string, ...)
+    :return: matches of all days, in day order
+    :rtype: list[MatchInfo]
+    """
+
+    matches: list[MatchInfo] = []
+    for day, data in scoreboard.get_many(year, month, days).items():
+        if data is not None:
+            matches.extend(parse_scoreboard(data, first_id=len(matches)))
+    return matches
 
 
 def get_teams(year: int, month: str, days: tuple[str, str]) -> dict[str, TeamInfo]:
     """
-    Generate Team Name, Seed, and Region. Uses an api indexing the dates of the first rounds of 64 to fill csv.
+    Generate Team Name, Seed, and Region. Uses an api indexing the dates of the first rounds of 64.
 
     :param year: The tournament year.
     :type year: int
     :param month: The month format like '03' for March.
     :type month: string
-    :param month: The days of the first two games ie (21,22).
-    :type month: tuple(string, string)
-    :return: list of list containing name, seedn, region
-    :rtype: list[list[str]]
+    :param days: The days of the first two games ie (21,22).
+    :type days: tuple(string, string)
+    :return: teams keyed by short name
+    :rtype: dict[str, TeamInfo]
     """
 
     teams: dict[str, TeamInfo] = {}
-    for day in days:
-        url: str = f"https://data.ncaa.com/casablanca/scoreboard/basketball-men/d1/{year}/{month}/{day}/scoreboard.json"
-        response = requests.get(url)
-
-        if response.status_code == 200:
-            data = response.json()
-
-            for game in data.get("games", []):  # Adjust the path based on the actual data structure
-                away_team:dict = game.get("game").get("away")
-                home_team:dict = game.get("game").get("home")
-                region = game.get("game").get("bracketRegion")
-
-                if away_team.get("seed"):
-                    away_team_info = TeamInfo(
-                        shortName=away_team.get("names").get("short"),
-                        urlName=away_team.get("names").get("seo"),
-                        seed=away_team.get("seed"),
-                        region=region
-                    )
-                    teams[away_team_info.shortName] = away_team_info
-
-                if home_team.get("seed"):
-                    home_team_info = TeamInfo(
-                        shortName=home_team.get("names").get("short"),
-                        urlName=home_team.get("names").get("seo"),
-                        seed=home_team.get("seed"),
-                        region=region
-                    )
-                    teams[home_team_info.shortName] = home_team_info
-        else:
-            print(f"ERROR READING URL: {url}: {response.status_code}")
+    for match in load_matches(year, month, days):
+        for team in match.participants:
+            teams[team.shortName] = team
     return teams
 
 
 def get_matches(year: int, month: str, days: tuple[str, str]) -> list[MatchInfo]:
     """
-    Generate Team Name, Seed, and Region. Uses an api indexing the dates of the first rounds of 64 to fill csv.
+    Generate the match results of the given days.
 
     :param year: The tournament year.
     :type year: int
     :param month: The month format like '03' for March.
     :type month: string
-    :param month: The days of the first two games ie (21,22).
-    :type month: tuple(string, string)
-    :return: list of list containing name, seedn, region
-    :rtype: list[list[str]]
+    :param days: The days of the games ie (21,22).
+    :type days: tuple(string, string)
+    :return: matches of all days
+    :rtype: list[MatchInfo]
     """
 
-    matches: list[MatchInfo] = []
-    id = 0
-    for day in days:
-        url: str = f"https://data.ncaa.com/casablanca/scoreboard/basketball-men/d1/{year}/{month}/{day}/scoreboard.json"
-        response = requests.get(url)
-
-        if response.status_code == 200:
-            data = response.json()
-
-            for game in data.get("games", []):  # Adjust the path based on the actual data structure
-                away_team = game.get("game").get("away")
-                home_team = game.get("game").get("home")
-                region = game.get("game").get("bracketRegion")
-                start_date = game.get("game").get("startDate")
-                bracket_round = game.get("game").get("bracketRound")
-
-                away_team_info = TeamInfo(
-                    shortName=away_team.get("names").get("short"),
-                    urlName=away_team.get("names").get("seo"),
-                    seed=away_team.get("seed"),
-                    region=region
-                )
-                home_team_info = TeamInfo(
-                    shortName=home_team.get("names").get("short"),
-                    urlName=home_team.get("names").get("seo"),
-                    seed=home_team.get("seed"),
-                    region=region
-                )
-                winner_name = away_team_info.shortName if away_team.get("winner") else home_team_info.shortName
-
-                matches.append(
-                    MatchInfo(
-                        id=id,
-                        nextMatchId=-1,
-                        roundName=bracket_round,
-                        participants=[
-                            away_team_info,
-                            home_team_info
-                        ],
-                        winner=winner_name,
-                        startDate=start_date
-                    )
-                )
-        else:
-            print(f"ERROR READING URL: {url}: {response.status_code}")
-    return matches
+    return load_matches(year, month, days)
 
 
 def generate_bracket_csv(year: int, month: str, days: tuple[str, str]):
@@ -123,33 +184,18 @@ def generate_bracket_csv(year: int, month: str, days: tuple[str, str]):
     :type year: int
     :param month: The month format like '03' for March.
     :type month: string
-    :param month: The days of the first two games ie (21,22).
-    :type month: tuple(string, string)
+    :param days: The days of the first two games ie (21,22).
+    :type days: tuple(string, string)
     """
 
     with open("march_madness_teams.csv", mode="w", newline="") as file:
         writer = csv.writer(file)
         writer.writerow(["Team Name", "Seed", "Region"])
 
-        for day in days:
-            url: str = (
-                f"https://data.ncaa.com/casablanca/scoreboard/basketball-men/d1/{year}/{month}/{day}/scoreboard.json"
-            )
-            response = requests.get(url)
-
-            if response.status_code == 200:
-                data = response.json()
-
-                for game in data.get("games", []):  # Adjust the path based on the actual data structure
-                    away_team = game.get("game").get("away")
-                    home_team = game.get("game").get("home")
-                    region = game.get("game").get("bracketRegion")
-
-                    writer.writerow([away_team.get("names").get("short"), away_team.get("seed"), region])
-                    writer.writerow([home_team.get("names").get("short"), home_team.get("seed"), region])
-            else:
-                print(f"ERROR READING URL: {url}: {response.status_code}")
+        for match in load_matches(year, month, days):
+            for team in match.participants:
+                writer.writerow([team.shortName, team.seed, team.region])
 
 
 if __name__ == "__main__":
-    generate_bracket_csv(year=2024, month="03", days=("21", "22"))
\ No newline at end of file
+    generate_bracket_csv(year=2024, month="03", days=("21", "22"))
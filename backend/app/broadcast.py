@@ -0,0 +1,370 @@
+import asyncio
+import itertools
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+
+from fastapi import WebSocket
+
+from app.encoding import JSON, Encoded, encode, encode_value, join_array, join_object
+from app.metrics import METRICS_ENABLED, WS_BYTES, WS_MESSAGES
+from app.protocol import SNAPSHOT, DELTA, VERSION, BATCH, PING, compact, diff, apply_patch, unescape
+
+RESYNC_INTERVAL = 30  # seconds of silence before a hub sends a version heartbeat
+HISTORY_LENGTH = 256  # deltas kept per game so reconnecting clients can catch up without a snapshot
+SEND_QUEUE_SIZE = 64  # frames a subscriber may fall behind before the slow-consumer policy kicks in
+SLOW_CONSUMER_POLICY = "resync"  # "resync": drop the backlog and queue a snapshot, "disconnect": close the socket
+SLOW_CONSUMER_CLOSE_CODE = 1013  # "try again later"
+HEARTBEAT_INTERVAL = 15  # seconds between pings to every socket of a game
+HEARTBEAT_TIMEOUT = 45  # seconds a socket may stay silent (no pong or other message) before it is reaped
+SEND_TIMEOUT = 10  # seconds one send may take before the socket is taken for dead, e.g. a half-closed connection
+DEAD_SOCKET_CLOSE_CODE = 1001  # "going away"
+
+_connection_ids = itertools.count(1)
+
+
+class Frame:
+    """
+    One message for every subscriber of a hub. It is encoded the first time a subscriber needs it in its
+    encoding and the result is reused for every other socket. Raw frames like "gameStarted" are plain text in
+    every encoding.
+    """
+
+    __slots__ = ("message", "raw", "_build", "_encoded")
+
+    def __init__(
+        self,
+        message: dict | None = None,
+        raw: str | None = None,
+        build: Callable[[str], Encoded] | None = None,
+    ):
+        self.message = message
+        self.raw = raw
+        self._build = build or (lambda encoding: encode(self.message, encoding))
+        self._encoded: dict[str, Encoded] = {}
+
+    def encoded(self, encoding: str = JSON) -> Encoded:
+        if self.raw is not None:
+            return self.raw
+        if encoding not in self._encoded:
+            self._encoded[encoding] = self._build(encoding)
+        return self._encoded[encoding]
+
+
+def batch_frame(frames: list[Encoded], encoding: str = JSON) -> Encoded:
+    """
+    Wrap already encoded frames in one envelope without re-encoding them.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    return join_object([("type", encode(BATCH, encoding)), ("frames", join_array(frames, encoding))], encoding)
+
+
+def clock_frame() -> Frame:
+    """
+    A ping with the server's wall-clock time, which clients count down to deadlines against.
+    """
+    return Frame({"type": PING, "now": time.time()})
+
+
+class Subscriber:
+    """
+    One websocket's bounded outbound queue and the task that drains it.
+
+    Everything waiting in the queue when the socket is ready goes out as a single batch frame, so a client
+    that is a little slow gets fewer, larger frames and a client that is very slow never holds up the others.
+    The queue size is the high-water mark for the slow-consumer policy; a send that does not complete within
+    SEND_TIMEOUT, or a client that stops answering pings, gets the socket reaped.
+    """
+
+    def __init__(self, websocket: WebSocket, hub: "GameHub", encoding: str = JSON):
+        self.id = next(_connection_ids)
+        self.websocket = websocket
+        self.hub = hub
+        self.encoding = encoding
+        self.last_seen = time.monotonic()  # last message from the client
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.task = asyncio.create_task(self._run())
+
+    def send(self, frame: Frame) -> None:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self._overflow()
+
+    def close(self) -> None:
+        self.task.cancel()
+
+    def reap(self, code: int, reason: str) -> None:
+        """
+        Drop the socket from its hub and close it without waiting on the client.
+        """
+        print(f"WebSocket {self.id} {reason}, disconnecting: {self.websocket}")
+        self.hub.unsubscribe(self.websocket)
+        asyncio.create_task(self._close(code))
+
+    def _overflow(self) -> None:
+        if SLOW_CONSUMER_POLICY == "disconnect":
+            self.reap(SLOW_CONSUMER_CLOSE_CODE, "too slow")
+            return
+
+        # the client will skip every delta it missed by loading the latest snapshot; raw frames like "gameStarted"
+        # are not part of the game state, so they are kept (once each)
+        backlog = [self.queue.get_nowait() for _ in range(self.queue.qsize())]
+        for raw in dict.fromkeys(frame.raw for frame in backlog if frame.raw is not None):
+            self.queue.put_nowait(Frame(raw=raw))
+        self.queue.put_nowait(self.hub.snapshot_frame(self.encoding))
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                frames = [await self.queue.get()]
+                while not self.queue.empty():
+                    frames.append(self.queue.get_nowait())
+
+                # raw text frames like "gameStarted" cannot go inside an envelope
+                batch: list[Encoded] = []
+                for frame in frames:
+                    if frame.raw is None:
+                        batch.append(frame.encoded(self.encoding))
+                        continue
+                    if batch:
+                        await self._send(batch_frame(batch, self.encoding))
+                        batch = []
+                    await self._send(frame.raw)
+                if batch:
+                    await self._send(batch_frame(batch, self.encoding))
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.reap(DEAD_SOCKET_CLOSE_CODE, "stalled")
+        except Exception:
+            print(f"WebSocket {self.id} disconnected: {self.websocket}")
+            self.hub.unsubscribe(self.websocket)
+
+    async def _send(self, payload: Encoded) -> None:
+        if METRICS_ENABLED:
+            WS_MESSAGES.inc((self.hub.game_id,))
+            WS_BYTES.inc((self.hub.game_id,), len(payload))  # characters for text frames
+        if isinstance(payload, str):
+            await asyncio.wait_for(self.websocket.send_text(payload), SEND_TIMEOUT)
+        else:
+            await asyncio.wait_for(self.websocket.send_bytes(payload), SEND_TIMEOUT)
+
+    async def _close(self, code: int) -> None:
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), SEND_TIMEOUT)
+        except Exception:
+            pass  # already gone
+
+
+class GameHub:
+    """
+    Fan-out point for one game's websockets.
+
+    The hub keeps the last published game state and a version number. Every change is sent as a delta that
+    is encoded once per encoding and handed to each subscriber's send queue without awaiting, so publishing
+    never waits on a socket. New subscribers get a full snapshot, and clients that fall behind ask for a resync
+    from the version they hold.
+
+    Snapshots are spliced from encoded top-level members of the state (players, remaining, ...). A member is
+    only re-encoded after a delta touched it, and members shared by every game are encoded once per process.
+
+    Versions count from 0 again whenever a hub is created (a restart, a game loaded back from storage), so every
+    hub also has a random epoch. A reconnecting client names the epoch and version it holds and is only caught
+    up with deltas when both still mean the same state.
+    """
+
+    def __init__(self, game_id: str, snapshot: Callable[[], dict]):
+        self.game_id = game_id
+        self.subscribers: dict[WebSocket, Subscriber] = {}
+        self.version = 0
+        self.epoch = secrets.token_hex(4)
+        self._snapshot = snapshot
+        self._state: dict | None = None
+        self._snapshot_frame: Frame | None = None
+        self._fragments: dict[str, dict[str, Encoded]] = {}  # encoding -> state member -> its encoding
+        self._history: deque[tuple[int, Frame]] = deque(maxlen=HISTORY_LENGTH)
+        self._last_sent = time.monotonic()
+        self._task: asyncio.Task | None = None
+        self._held: list[dict] | None = None  # ops gathered by batched(), None when publishing right away
+
+    @property
+    def state(self) -> dict:
+        if self._state is None:
+            self._state = self._snapshot()
+        return self._state
+
+    def publish(self, ops: list[dict]) -> None:
+        """
+        Send ops that the caller already knows describe the change.
+        """
+        if not ops:
+            return
+        apply_patch(self.state, ops)
+        self._publish_delta(ops)
+
+    def sync(self, ops: list[dict] | None = None) -> None:
+        """
+        Rebuild the game state, diff it against the last published one and send the difference.
+        Extra ops (e.g. log lines that are not part of the game state) go out in the same delta.
+        """
+        old = self.state
+        new = self._snapshot()
+        for key, value in old.items():
+            new.setdefault(key, value)  # hub-only fields like the log are carried over
+        self._state = new
+        changes = diff(old, new)
+        if ops:
+            apply_patch(self._state, ops)
+            changes.extend(ops)
+        if changes:
+            self._publish_delta(changes)
+
+    @contextmanager
+    def batched(self):
+        """
+        Gather everything published inside the block into one delta, without the ops later ones overwrote.
+        """
+        if self._held is not None:
+            yield  # already inside a batch
+            return
+        self._held = []
+        try:
+            yield
+        finally:
+            ops, self._held = compact(self._held), None
+            if ops:
+                self._publish_delta(ops)
+
+    def publish_text(self, text: str) -> None:
+        """
+        Send a raw, unversioned message like "gameStarted".
+        """
+        self._send_all(Frame(raw=text))
+
+    def snapshot_frame(self, encoding: str = JSON) -> Frame:
+        if self._snapshot_frame is None:
+            self._snapshot_frame = Frame(build=self._encode_snapshot)
+        self._snapshot_frame.encoded(encoding)  # now, while the state still matches the version
+        return self._snapshot_frame
+
+    def _encode_snapshot(self, encoding: str) -> Encoded:
+        fragments = self._fragments.setdefault(encoding, {})
+        members = []
+        for key, value in self.state.items():
+            if key not in fragments:
+                fragments[key] = encode_value(value, encoding)
+            members.append((key, fragments[key]))
+        header = [
+            ("type", encode(SNAPSHOT, encoding)),
+            ("epoch", encode(self.epoch, encoding)),
+            ("version", encode(self.version, encoding)),
+        ]
+        return join_object(header + [("state", join_object(members, encoding))], encoding)
+
+    def subscribe(self, websocket: WebSocket, encoding: str = JSON, resume: str | None = None) -> None:
+        """
+        Add a socket and send it a snapshot, or with a resume token ("<epoch>.<version>" of the state the client
+        already holds) just what it missed.
+        """
+        self._ensure_running()
+        subscriber = self.subscribers[websocket] = Subscriber(websocket, self, encoding)
+        subscriber.send(clock_frame())  # the server's time, for counting down to deadlines
+        version = self.resume_version(resume)
+        if version == self.version:
+            subscriber.send(Frame({"type": VERSION, "version": self.version}))  # nothing was missed
+        else:
+            self._catch_up(subscriber, -1 if version is None else version)
+
+    def seen(self, websocket: WebSocket) -> None:
+        """
+        The client sent something (a pong or any other message), so the socket is alive.
+        """
+        subscriber = self.subscribers.get(websocket)
+        if subscriber:
+            subscriber.last_seen = time.monotonic()
+
+    def unsubscribe(self, websocket: WebSocket) -> None:
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber:
+            subscriber.close()
+
+    def resync(self, websocket: WebSocket, version: int) -> None:
+        """
+        Queue everything after the version a client holds, as deltas if we still have them.
+        """
+        if version == self.version or websocket not in self.subscribers:
+            return
+        self._catch_up(self.subscribers[websocket], version)
+
+    def close(self) -> None:
+        for websocket in list(self.subscribers):
+            self.unsubscribe(websocket)
+        WS_MESSAGES.remove((self.game_id,))
+        WS_BYTES.remove((self.game_id,))
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def resume_version(self, resume: str | None) -> int | None:
+        """
+        The version a resume token ("<epoch>.<version>") names, None if it is malformed or from another epoch.
+        """
+        epoch, _, version = (resume or "").partition(".")
+        return int(version) if epoch == self.epoch and version.isdigit() else None
+
+    def deltas_after(self, version: int) -> list[Frame] | None:
+        """
+        The delta frames after a version, oldest first, or None when the history no longer reaches back to it.
+        """
+        if 0 <= version <= self.version and (version == self.version or self._history[0][0] <= version + 1):
+            return [frame for delta_version, frame in self._history if delta_version > version]
+        return None
+
+    def _catch_up(self, subscriber: Subscriber, version: int) -> None:
+        frames = self.deltas_after(version) if version < self.version else None
+        if frames:
+            subscriber.send(Frame(build=lambda encoding: batch_frame([f.encoded(encoding) for f in frames], encoding)))
+        else:
+            subscriber.send(self.snapshot_frame(subscriber.encoding))
+
+    def _publish_delta(self, ops: list[dict]) -> None:
+        if self._held is not None:
+            self._held.extend(ops)  # the state already has them, clients get them when the batch ends
+            return
+        self.version += 1
+        self._snapshot_frame = None  # game state changed, the cached snapshot is stale
+        touched = {unescape(op["path"].split("/")[1]) for op in ops}
+        for fragments in self._fragments.values():
+            for key in touched:
+                fragments.pop(key, None)
+        frame = Frame({"type": DELTA, "version": self.version, "ops": ops})
+        for encoding in {JSON} | {subscriber.encoding for subscriber in self.subscribers.values()}:
+            frame.encoded(encoding)  # before later ops modify values these ops share with the state
+        self._history.append((self.version, frame))
+        self._send_all(frame)
+
+    def _send_all(self, frame: Frame) -> None:
+        self._last_sent = time.monotonic()
+        for subscriber in list(self.subscribers.values()):
+            subscriber.send(frame)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            ping = clock_frame()
+            now = time.monotonic()
+            for subscriber in list(self.subscribers.values()):
+                if now - subscriber.last_seen > HEARTBEAT_TIMEOUT:
+                    subscriber.reap(DEAD_SOCKET_CLOSE_CODE, "stopped answering pings")
+                else:
+                    subscriber.send(ping)
+            if self.subscribers and now - self._last_sent >= RESYNC_INTERVAL:
+                self._send_all(Frame({"type": VERSION, "version": self.version}))
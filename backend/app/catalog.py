@@ -0,0 +1,148 @@
+from array import array
+
+import numpy as np
+
+from app.types.types import (
+    INITIAL_BALANCE,
+    INITIAL_BID,
+    INITIAL_COUNTDOWN,
+    BidModel,
+    ScoringRules,
+    TeamInfo,
+)
+
+
+def parse_bundle_rules(text: str) -> dict[int, int]:
+    """
+    "15:4,16:4" -> {15: 4, 16: 4}: the seeds auctioned in bundles, and how many teams go in each bundle.
+    """
+    rules: dict[int, int] = {}
+    for rule in filter(None, (part.strip() for part in text.split(","))):
+        seed, _, size = (value.strip() for value in rule.partition(":"))
+        if not (seed.isdigit() and size.isdigit() and int(size) > 0):
+            raise ValueError(f"Bundle rule {rule!r} is not seed:teams per bundle")
+        rules[int(seed)] = int(size)
+    return rules
+
+
+class TeamCatalog:
+    """
+    The tournament field interned once and shared by every game.
+
+    Teams are numbered in field order and lots (what comes up for auction: a team, or a seed bundle) are numbered
+    singles first, then bundles. bundle_rules maps the seeds auctioned in bundles to the teams per bundle. Games
+    refer to both by these ids only. The TeamInfo objects here are never mutated; anything per game (price, points)
+    is copied onto a new object when a game is turned back into models.
+    """
+
+    __slots__ = (
+        "teams", "team_id", "lots", "lot_id", "members", "lot_of", "bundles", "membership", "team_dumps", "lot_dumps",
+    )
+
+    def __init__(self, master: dict[str, TeamInfo], bundle_rules: dict[int, int]):
+        self.teams: tuple[TeamInfo, ...] = tuple(master.values())
+        self.team_id: dict[str, int] = {name: i for i, name in enumerate(master)}
+
+        seed_teams: dict[int, list[str]] = {}
+        for name, team in master.items():
+            seed_teams.setdefault(team.seed, []).append(name)
+
+        lots: list[TeamInfo] = [team for team in master.values() if team.seed not in bundle_rules]
+        members: list[tuple[int, ...]] = [(self.team_id[team.shortName],) for team in lots]
+        self.bundles: dict[str, list[str]] = {}
+        for seed, size in sorted(bundle_rules.items()):
+            names = seed_teams.get(seed, [])
+            groups = [names[i:i + size] for i in range(0, len(names), size)]
+            for number, group in enumerate(groups):
+                lot = f"{seed} seed bundle" if len(groups) == 1 else f"{seed} seed bundle {number + 1}"
+                lots.append(TeamInfo(shortName=lot, urlName=lot, seed=seed, region="bundle"))
+                members.append(tuple(self.team_id[name] for name in group))
+                self.bundles[lot] = group
+
+        self.lots: tuple[TeamInfo, ...] = tuple(lots)
+        self.lot_id: dict[str, int] = {lot.shortName: i for i, lot in enumerate(lots)}
+        # dumped once for the wire; shared by every game, so never modified
+        self.team_dumps: list[dict] = [team.model_dump() for team in self.teams]
+        self.lot_dumps: tuple[dict, ...] = tuple(lot.model_dump() for lot in lots)
+        self.members: tuple[tuple[int, ...], ...] = tuple(members)
+        self.lot_of = array("H", bytes(2 * len(self.teams)))  # team id -> id of the lot it is auctioned in
+        for lot, team_ids in enumerate(members):
+            for team in team_ids:
+                self.lot_of[team] = lot
+        # lots x teams, 1 where the lot contains the team: turns per-team points into per-lot points
+        self.membership = np.zeros((len(self.lots), len(self.teams)))
+        for lot, team_ids in enumerate(members):
+            self.membership[lot, list(team_ids)] = 1
+
+    def find_lot(self, name: str) -> int | None:
+        """
+        Id of a lot by its name, or of the lot a team was auctioned in.
+        """
+        if name in self.lot_id:
+            return self.lot_id[name]
+        if name in self.team_id:
+            return self.lot_of[self.team_id[name]]
+        return None
+
+
+class PlayerState:
+    __slots__ = ("name", "index", "balance", "points", "owned")
+
+    def __init__(self, name: str, index: int, balance: int = INITIAL_BALANCE):
+        self.name = name
+        self.index = index  # this player's number in GameState.owner
+        self.balance = balance
+        self.points = 0.0  # only kept for custom rule sets, classic points are summed from the wins
+        self.owned = 0  # bitset of lot ids
+
+
+class GameState:
+    """
+    One game over a shared TeamCatalog: who owns each lot and what it cost, the draw still to come and the
+    running auction. A finished four player game is well under two kilobytes.
+    """
+
+    __slots__ = (
+        "creator", "players", "names", "owner", "prices", "draw", "current",
+        "currentBid", "countdown", "deadline", "log", "scoring", "lot_points",
+    )
+
+    def __init__(self, creator: str, lot_count: int, draw: bytearray, scoring: ScoringRules | None = None):
+        self.creator = creator
+        self.players: dict[str, PlayerState] = {}
+        self.names: list[str] = []  # player names by index
+        self.owner = array("H", bytes(2 * lot_count))  # lot id -> buyer's index + 1, 0 while unsold
+        self.prices = array("f", bytes(4 * lot_count))  # lot id -> price paid
+        self.draw = draw  # lot ids not auctioned yet, the next one last
+        self.current = -1  # lot id up for auction, -1 once everything has been auctioned
+        self.currentBid: float = INITIAL_BID
+        self.countdown: float = INITIAL_COUNTDOWN
+        self.deadline: float | None = None
+        self.log: list[BidModel] = []
+        self.scoring = scoring
+        self.lot_points: np.ndarray | None = None  # custom rule sets: points per lot, shared by the rule set's games
+
+    def add_player(self, name: str, balance: int = INITIAL_BALANCE) -> PlayerState:
+        player = PlayerState(name, len(self.names), balance)
+        self.players[name] = player
+        self.names.append(name)
+        return player
+
+    def own(self, lot: int, player: PlayerState, price: float) -> None:
+        self.owner[lot] = player.index + 1
+        self.prices[lot] = price
+        player.owned |= 1 << lot
+
+    def sell(self, lot: int, player: PlayerState, price: float) -> None:
+        self.own(lot, player, price)
+        player.balance -= price
+
+
+def lot_ids(bitset: int):
+    """
+    The lot ids set in an ownership bitset, lowest first.
+    """
+    while bitset:
+        low = bitset & -bitset
+        yield low.bit_length() - 1
+        bitset ^= low
@@ -0,0 +1,561 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
+CLUSTER_BROKER = os.getenv("CLUSTER_BROKER", "off")  # "off", "loopback" or "tcp://host:port" of a BrokerServer
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+LEASE_TTL = 10  # seconds a worker owns a game's timer without renewing
+LEASE_RENEW_INTERVAL = 3  # seconds between lease renewals, well inside the TTL
+CONNECT_ATTEMPTS = 20  # half a second apart, so workers can start before the broker
+RECONNECT_INTERVAL = 0.5  # seconds between attempts to get back to a broker that went away
+JOIN_TIMEOUT = 5  # seconds to wait for a game's state from a worker holding it before asking again
+JOIN_ATTEMPTS = 5
+JOIN_RETRY_INTERVAL = 0.1  # seconds before asking again, for the unsubscribe of a worker letting go to arrive
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class BrokerUnavailable(ConnectionError):
+    """
+    The broker can't be reached, so nothing that goes through it can complete.
+    """
+
+
+class LeaseTable:
+    """
+    Expiring ownership of keys. A key is granted to whoever asks while it is free, expired or already theirs.
+    """
+
+    def __init__(self):
+        self.leases: dict[str, tuple[str, float]] = {}
+
+    def acquire(self, keys: Iterable[str], owner: str, ttl: float) -> list[str]:
+        now = time.monotonic()
+        granted = []
+        for key in keys:
+            holder, expires = self.leases.get(key, (owner, 0.0))
+            if holder == owner or expires <= now:
+                self.leases[key] = (owner, now + ttl)
+                granted.append(key)
+        return granted
+
+    def release(self, keys: Iterable[str], owner: str) -> None:
+        for key in keys:
+            if self.leases.get(key, ("", 0.0))[0] == owner:
+                del self.leases[key]
+
+    def release_owner(self, owner: str) -> None:
+        self.leases = {key: lease for key, lease in self.leases.items() if lease[0] != owner}
+
+
+class Topics:
+    """
+    The connections holding each game. A game's messages go only to the connections holding it.
+
+    A connection that subscribes gets an acknowledgment, ordered before every message of the game it receives
+    from then on, saying how many others hold the game. If there are any, the longest holder is asked to publish
+    the game's state as of that moment, so the new holder can apply the messages after the acknowledgment on top.
+    """
+
+    def __init__(self):
+        self.holders: dict[str, list[Any]] = {}
+
+    def subscribe(self, connection, game_id: str, token: str) -> None:
+        holders = self.holders.setdefault(game_id, [])
+        others = [holder for holder in holders if holder is not connection]
+        if connection not in holders:
+            holders.append(connection)
+        connection.deliver({"game": game_id, "subscribed": len(others), "sync": token})
+        if others:
+            others[0].deliver({"game": game_id, "sync": token})
+
+    def unsubscribe(self, connection, game_id: str) -> None:
+        holders = self.holders.get(game_id, [])
+        if connection in holders:
+            holders.remove(connection)
+        if not holders:
+            self.holders.pop(game_id, None)
+
+    def publish(self, message: dict) -> None:
+        for connection in self.holders.get(message["game"], ()):
+            connection.deliver(message)
+
+    def drop(self, connection) -> None:
+        for game_id in [game_id for game_id, holders in self.holders.items() if connection in holders]:
+            self.unsubscribe(connection, game_id)
+
+
+class LoopbackBroker:
+    """
+    In-process broker. Brokers made with the topics and leases of another act as further connections to the
+    same broker, e.g. for several Cluster instances in one test.
+    """
+
+    def __init__(self, topics: Topics | None = None, leases: LeaseTable | None = None):
+        self.topics = topics or Topics()
+        self.leases = leases or LeaseTable()
+        self._handler: Handler | None = None
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def connect(self, handler: Handler, on_lost: Callable[[], None]) -> None:
+        self._handler = handler  # in-process, so never lost
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._deliver())
+
+    async def publish(self, message: dict) -> None:
+        self.topics.publish(message)
+
+    async def subscribe(self, game_id: str, token: str) -> None:
+        self.topics.subscribe(self, game_id, token)
+
+    def unsubscribe(self, game_id: str) -> None:
+        self.topics.unsubscribe(self, game_id)
+
+    async def acquire(self, keys: list[str], owner: str, ttl: float) -> list[str]:
+        return self.leases.acquire(keys, owner, ttl)
+
+    def release(self, keys: list[str], owner: str) -> None:
+        self.leases.release(keys, owner)
+
+    async def close(self) -> None:
+        self.topics.drop(self)
+        if self._task:
+            self._task.cancel()
+
+    def deliver(self, message: dict) -> None:
+        self._queue.put_nowait(json.dumps(message))  # copied like it would be on the wire
+
+    async def _deliver(self) -> None:
+        while True:
+            await _handle(self._handler, json.loads(await self._queue.get()))
+
+
+class TcpBroker:
+    """
+    Client of a BrokerServer. Messages of the games we subscribe to come back in the order the server received them,
+    including our own.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._requests: dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+
+    async def connect(self, handler: Handler, on_lost: Callable[[], None]) -> None:
+        """
+        Connect and deliver messages to handler. If the connection drops, pending requests fail with
+        BrokerUnavailable, on_lost is called and the broker is reconnected in the background.
+        """
+        reader = await self._open(CONNECT_ATTEMPTS)
+        self._task = asyncio.create_task(self._read(reader, handler, on_lost))
+
+    async def publish(self, message: dict) -> None:
+        await self._send({"op": "pub", "msg": message})
+
+    async def subscribe(self, game_id: str, token: str) -> None:
+        await self._send({"op": "sub", "game": game_id, "sync": token})
+
+    def unsubscribe(self, game_id: str) -> None:
+        self._write({"op": "unsub", "game": game_id})
+
+    async def acquire(self, keys: list[str], owner: str, ttl: float) -> list[str]:
+        request_id = next(self._ids)
+        self._requests[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            await self._send({"op": "lease", "id": request_id, "keys": keys, "owner": owner, "ttl": ttl})
+            return await self._requests[request_id]
+        finally:
+            self._requests.pop(request_id, None)
+
+    def release(self, keys: list[str], owner: str) -> None:
+        self._write({"op": "release", "keys": keys, "owner": owner})
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    async def _open(self, attempts: int | None) -> asyncio.StreamReader:
+        # attempts None keeps trying until the broker is back
+        for attempt in itertools.count(1):
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                return reader
+            except OSError as e:
+                if attempt == attempts:
+                    raise
+                print(f"ERROR CONNECTING TO BROKER {self.host}:{self.port}, RETRYING: {e}")
+                await asyncio.sleep(RECONNECT_INTERVAL)
+
+    async def _send(self, frame: dict) -> None:
+        self._write(frame)
+        try:
+            await self._writer.drain()
+        except ConnectionError as e:
+            raise BrokerUnavailable(f"Lost connection to broker {self.host}:{self.port}: {e}") from e
+
+    def _write(self, frame: dict) -> None:
+        if self._writer is None:
+            raise BrokerUnavailable(f"Not connected to broker {self.host}:{self.port}")
+        self._writer.write(json.dumps(frame, separators=(",", ":")).encode() + b"\n")
+
+    async def _read(self, reader: asyncio.StreamReader, handler: Handler, on_lost: Callable[[], None]) -> None:
+        while True:
+            try:
+                while line := await reader.readline():
+                    frame = json.loads(line)
+                    if frame["op"] == "msg":
+                        await _handle(handler, frame["msg"])
+                    elif frame["op"] == "leased" and frame["id"] in self._requests:
+                        self._requests[frame["id"]].set_result(frame["keys"])
+                print(f"ERROR: LOST CONNECTION TO BROKER {self.host}:{self.port}")
+            except (ConnectionError, ValueError) as e:
+                print(f"ERROR: LOST CONNECTION TO BROKER {self.host}:{self.port}: {e}")
+            self._writer.close()
+            self._writer = None
+            for request in self._requests.values():
+                if not request.done():
+                    request.set_exception(BrokerUnavailable(f"Lost connection to broker {self.host}:{self.port}"))
+            on_lost()
+            reader = await self._open(None)
+            print(f"RECONNECTED TO BROKER {self.host}:{self.port}")
+
+
+class BrokerServer:
+    """
+    Minimal stand-in for an external pub/sub service, for running several workers on one machine.
+    Routes each game's messages to the connections holding it, and grants leases from one LeaseTable.
+
+    python -m app.cluster [port]
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7400):
+        self.host = host
+        self.port = port
+        self.leases = LeaseTable()
+        self.topics = Topics()
+        self.connections: set[_Connection] = set()
+
+    async def serve(self) -> None:
+        async with await self.start() as server:
+            await server.serve_forever()
+
+    async def start(self) -> asyncio.Server:
+        return await asyncio.start_server(self._client, self.host, self.port)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = _Connection(writer)
+        self.connections.add(connection)
+        owners = set()  # workers leasing through this connection, whose games are free again once it closes
+        try:
+            while line := await reader.readline():
+                frame = json.loads(line)
+                if frame["op"] == "pub":
+                    self.topics.publish(frame["msg"])
+                elif frame["op"] == "sub":
+                    self.topics.subscribe(connection, frame["game"], frame["sync"])
+                elif frame["op"] == "unsub":
+                    self.topics.unsubscribe(connection, frame["game"])
+                elif frame["op"] == "lease":
+                    owners.add(frame["owner"])
+                    keys = self.leases.acquire(frame["keys"], frame["owner"], frame["ttl"])
+                    writer.write(json.dumps({"op": "leased", "id": frame["id"], "keys": keys}).encode() + b"\n")
+                elif frame["op"] == "release":
+                    self.leases.release(frame["keys"], frame["owner"])
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(connection)
+            self.topics.drop(connection)
+            for owner in owners:
+                self.leases.release_owner(owner)
+            writer.close()
+
+
+class _Connection:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def deliver(self, message: dict) -> None:
+        self.writer.write(json.dumps({"op": "msg", "msg": message}, separators=(",", ":")).encode() + b"\n")
+
+
+async def _handle(handler: Handler, message: dict) -> None:
+    try:
+        await handler(message)
+    except Exception as e:
+        print(f"ERROR HANDLING CLUSTER MESSAGE {message}: {e}")
+
+
+def make_broker(url: str = CLUSTER_BROKER) -> LoopbackBroker | TcpBroker | None:
+    if url == "off":
+        return None
+    if url == "loopback":
+        return LoopbackBroker()
+    host, port = url.removeprefix("tcp://").rsplit(":", 1)
+    return TcpBroker(host, int(port))
+
+
+class _Join:
+    """
+    A game this worker is subscribing to. Its messages are held back until its state is in.
+    """
+
+    def __init__(self, token: str):
+        loop = asyncio.get_running_loop()
+        self.token = token
+        self.subscribed = loop.create_future()  # how many other workers hold the game
+        self.state = loop.create_future()  # the game from one of them
+        self.messages: list[dict] | None = None  # None until the subscription is acknowledged
+
+
+class Cluster:
+    """
+    Runs a worker as one of several sharing the games.
+
+    A worker holds the games it has in memory, and the broker sends a game's messages only to the workers holding
+    it. Game events are not applied where they are received. They are published to the broker and every holder,
+    the sender included, applies them in the order the broker delivers them, so all replicas agree. A worker that
+    starts holding a game gets its state from a worker already holding it, or loads it from storage if none does.
+
+    Each game is leased to one of its holders, which alone runs its auction timer and writes it to storage. Leases
+    are renewed every LEASE_RENEW_INTERVAL seconds, and a game whose owner lets go of it or stops renewing is
+    picked up by another holder.
+
+    A worker that loses the broker misses events, so pending dispatches fail with BrokerUnavailable and its games
+    are dropped from memory, to be loaded again on their next use once the broker is back.
+    """
+
+    def __init__(
+        self,
+        broker: LoopbackBroker | TcpBroker,
+        on_event: Callable[[str, dict], Awaitable[Any]],
+        on_text: Callable[[str, str], None],
+        on_owned: Callable[[str], None],
+        on_released: Callable[[str], None],
+        on_dropped: Callable[[str], None],
+        load: Callable[[str], Awaitable[bool]],
+        on_state: Callable[[str, dict], None],
+        state: Callable[[str], dict | None],
+        worker_id: str = WORKER_ID,
+    ):
+        self.broker = broker
+        self.worker_id = worker_id
+        self.held: set[str] = set()
+        self.owned: set[str] = set()
+        self._on_event = on_event
+        self._on_text = on_text
+        self._on_owned = on_owned
+        self._on_released = on_released
+        self._on_dropped = on_dropped
+        self._load = load
+        self._on_state = on_state
+        self._state = state
+        self._waiting: dict[int, asyncio.Future] = {}
+        self._joins: dict[str, _Join] = {}
+        self._joining: dict[str, asyncio.Task] = {}
+        self._seq = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        await self.broker.connect(self._receive, self._lost)
+        self._task = asyncio.create_task(self._renew_leases())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+        await self.broker.close()
+
+    def owns(self, game_id: str) -> bool:
+        return game_id in self.owned
+
+    async def claim(self, game_id: str) -> None:
+        """
+        Hold and take the lease on a game this worker is creating, so it has an owner before its first event.
+        """
+        self.held.add(game_id)
+        await self.broker.subscribe(game_id, self._token())
+        if await self.broker.acquire([game_id], self.worker_id, LEASE_TTL):
+            self.owned.add(game_id)
+
+    async def hold(self, game_id: str) -> bool:
+        """
+        Bring a game into this worker's memory and receive its events from now on. Returns whether it exists.
+        """
+        if game_id in self.held:
+            return True
+        if game_id not in self._joining:
+            self._joining[game_id] = asyncio.create_task(self._join(game_id))
+            self._joining[game_id].add_done_callback(lambda _: self._joining.pop(game_id, None))
+        return await asyncio.shield(self._joining[game_id])  # shared by every request waiting for the game
+
+    def drop(self, game_id: str) -> None:
+        """
+        Stop holding a game that left this worker's memory. Its lease goes to another holder.
+        """
+        self.held.discard(game_id)
+        try:
+            self.broker.unsubscribe(game_id)
+            if game_id in self.owned:
+                self.broker.release([game_id], self.worker_id)
+        except BrokerUnavailable:
+            pass  # the broker forgets the subscriptions and leases of a lost connection
+        self.owned.discard(game_id)
+
+    async def dispatch(self, game_id: str, event: dict) -> Any:
+        """
+        Publish a game event and wait until this worker has applied it. Returns what on_event returned.
+        """
+        if game_id not in self.held:
+            return "Game ID not found"  # dropped, so the event would never come back here
+        seq = next(self._seq)
+        self._waiting[seq] = asyncio.get_running_loop().create_future()
+        await self.broker.publish({"game": game_id, "event": event, "origin": self.worker_id, "seq": seq})
+        return await self._waiting[seq]
+
+    async def publish_text(self, game_id: str, text: str) -> None:
+        await self.broker.publish({"game": game_id, "text": text})
+
+    def _token(self) -> str:
+        return f"{self.worker_id}:{next(self._seq)}"
+
+    async def _join(self, game_id: str) -> bool:
+        for attempt in range(JOIN_ATTEMPTS):
+            join = self._joins[game_id] = _Join(self._token())
+            try:
+                await self.broker.subscribe(game_id, join.token)
+                others = await asyncio.wait_for(join.subscribed, JOIN_TIMEOUT)
+                if others:
+                    state = await asyncio.wait_for(join.state, JOIN_TIMEOUT)
+                    if state is None:
+                        await self._leave(game_id)  # the worker we asked let go of the game meanwhile
+                        await asyncio.sleep(JOIN_RETRY_INTERVAL)
+                        continue
+                    self._on_state(game_id, state)
+                elif not await self._load(game_id):
+                    await self._leave(game_id)
+                    return False
+                while join.messages:
+                    await _handle(lambda message: self._apply(game_id, message), join.messages.pop(0))
+                if self._joins.get(game_id) is not join:
+                    raise BrokerUnavailable("Lost connection to the cluster broker")  # while we were catching up
+                del self._joins[game_id]
+                self.held.add(game_id)
+                if not others and await self.broker.acquire([game_id], self.worker_id, LEASE_TTL):
+                    self.owned.add(game_id)
+                    self._on_owned(game_id)  # resumes an auction whose owner went away
+                return True
+            except asyncio.TimeoutError:
+                print(f"ERROR: NO ANSWER JOINING GAME {game_id}, ATTEMPT {attempt + 1}")
+                await self._leave(game_id)
+            except BaseException:
+                await self._leave(game_id)
+                self._on_dropped(game_id)  # whatever part of it was loaded
+                raise
+        raise BrokerUnavailable(f"Could not get game {game_id} from the workers holding it")
+
+    async def _leave(self, game_id: str) -> None:
+        join = self._joins.pop(game_id, None)
+        try:
+            self.broker.unsubscribe(game_id)
+            for message in (join.messages or []) if join else []:
+                if "sync" in message:
+                    await self._answer(game_id, message["sync"], None)  # they ask someone else
+        except BrokerUnavailable:
+            pass
+
+    async def _receive(self, message: dict) -> None:
+        game_id = message["game"]
+        join = self._joins.get(game_id)
+        if "subscribed" in message:
+            if join is not None and message["sync"] == join.token and not join.subscribed.done():
+                join.messages = []
+                join.subscribed.set_result(message["subscribed"])
+            return
+        if "state" in message:
+            if join is not None and message["sync"] == join.token and not join.state.done():
+                join.state.set_result(message["state"])
+            return
+        if join is not None:
+            if join.messages is not None:  # otherwise left over from an earlier subscription
+                join.messages.append(message)  # applied on top of the state once it is in
+        elif game_id in self.held:
+            await self._apply(game_id, message)
+        elif "sync" in message:
+            await self._answer(game_id, message["sync"], None)  # dropped after we were asked
+
+    async def _apply(self, game_id: str, message: dict) -> None:
+        if "sync" in message:
+            # everything before this message is applied and everything after it reaches the new holder too
+            await self._answer(game_id, message["sync"], self._state(game_id))
+            return
+        if "text" in message:
+            self._on_text(game_id, message["text"])
+            return
+
+        waiter = self._waiting.pop(message["seq"], None) if message["origin"] == self.worker_id else None
+        try:
+            result = await self._on_event(game_id, message["event"])
+        except Exception as e:
+            if waiter:
+                waiter.set_exception(e)
+            raise
+        if waiter:
+            waiter.set_result(result)
+
+    async def _answer(self, game_id: str, token: str, state: dict | None) -> None:
+        await self.broker.publish({"game": game_id, "sync": token, "state": state})
+
+    def _lost(self) -> None:
+        # events published while we are away never reach us, so every replica here is stale from now on
+        error = BrokerUnavailable("Lost connection to the cluster broker")
+        for waiter in self._waiting.values():
+            if not waiter.done():
+                waiter.set_exception(error)
+        self._waiting.clear()
+        for join in self._joins.values():
+            for future in (join.subscribed, join.state):
+                if not future.done():
+                    future.set_exception(error)
+        self._joins.clear()
+        for game_id in self.owned:
+            self._on_released(game_id)  # the broker frees a dead connection's leases
+        self.owned = set()
+        for game_id in list(self.held):
+            self._on_dropped(game_id)  # loaded again on next use
+        self.held = set()
+
+    async def _renew_leases(self) -> None:
+        while True:
+            try:
+                held = list(self.held)
+                granted = set(await self.broker.acquire(held, self.worker_id, LEASE_TTL))
+                if granted - self.held:
+                    self.broker.release(list(granted - self.held), self.worker_id)  # dropped while we were waiting
+                owned = (granted | (self.owned - set(held))) & self.held  # claimed while we were waiting
+                for game_id in owned - self.owned:
+                    self._on_owned(game_id)
+                for game_id in self.owned - owned:
+                    self._on_released(game_id)
+                self.owned = owned
+            except Exception as e:
+                print(f"ERROR RENEWING GAME LEASES: {e}")
+            await asyncio.sleep(LEASE_RENEW_INTERVAL)
+
+
+if __name__ == "__main__":
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 7400
+    print(f"Broker listening on 127.0.0.1:{port}")
+    asyncio.run(BrokerServer(port=port).serve())
@@ -0,0 +1,181 @@
+"""
+Wire encodings for websocket frames.
+
+JSON is encoded with orjson when it is installed and the standard library otherwise. Clients that connect with
+?encoding=msgpack get binary MessagePack frames instead, as long as the msgpack package is installed; the frames
+carry the same messages either way.
+
+Encoded values can be spliced into objects and arrays without decoding them, which is how hubs reuse the encoded
+parts of a snapshot that did not change and how values shared by every game are encoded once per process.
+"""
+import json
+import struct
+from collections import OrderedDict
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+SHARED_VALUES = 16  # read-only values shared across games (team list, match results) kept with their encodings
+
+Encoded = str | bytes  # str for JSON (sent as text frames), bytes for msgpack (sent as binary frames)
+
+_shared: OrderedDict[int, tuple[Any, dict[str, Encoded]]] = OrderedDict()
+
+
+def negotiate(requested: str | None) -> str:
+    return MSGPACK if requested == MSGPACK and msgpack is not None else JSON
+
+
+def encode(value: Any, encoding: str = JSON) -> Encoded:
+    if encoding == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def share(value: Any) -> Any:
+    """
+    Mark a value that every game sends unchanged, so it is encoded once per process instead of once per game.
+    The value must not be modified afterwards; replace it with a new object instead.
+    """
+    if id(value) not in _shared or _shared[id(value)][0] is not value:
+        _shared[id(value)] = (value, {})
+        while len(_shared) > SHARED_VALUES:
+            _shared.popitem(last=False)
+    return value
+
+
+def encode_value(value: Any, encoding: str = JSON) -> Encoded:
+    """
+    encode, reusing the encoding of a shared value.
+    """
+    entry = _shared.get(id(value))
+    if entry is None or entry[0] is not value:
+        return encode(value, encoding)
+    if encoding not in entry[1]:
+        entry[1][encoding] = encode(value, encoding)
+    return entry[1][encoding]
+
+
+def join_object(members: list[tuple[str, Encoded]], encoding: str = JSON) -> Encoded:
+    """
+    An object from member names and already encoded member values.
+    """
+    if encoding == MSGPACK:
+        return _header(len(members), 0x80, 0xDE) + b"".join(encode(key, encoding) + value for key, value in members)
+    return "{" + ",".join(f"{encode(key)}:{value}" for key, value in members) + "}"
+
+
+def join_array(items: list[Encoded], encoding: str = JSON) -> Encoded:
+    """
+    An array from already encoded items.
+    """
+    if encoding == MSGPACK:
+        return _header(len(items), 0x90, 0xDC) + b"".join(items)
+    return "[" + ",".join(items) + "]"
+
+
+def _header(size: int, fix: int, sized: int) -> bytes:
+    # msgpack map/array header: fixmap/fixarray up to 15 entries, then 16 or 32 bit lengths
+    if size < 16:
+        return bytes([fix | size])
+    if size < 1 << 16:
+        return bytes([sized]) + struct.pack(">H", size)
+    return bytes([sized + 1]) + struct.pack(">I", size)
+
+
+if __name__ == "__main__":
+    # bytes and microseconds per broadcast, this path against stdlib json over freshly dumped models
+    #   TOURNAMENT_OFFLINE=1 python -m app.encoding
+    import asyncio
+    import random
+    import time
+
+    from app.bracket import link_bracket, parse_scoreboard
+    from app.broadcast import GameHub
+    from app.game_tracker import GameTracker
+    from app.protocol import DELTA, SNAPSHOT, replace
+    from app.results import ReplaySource
+    from app.types.types import BidModel
+
+    tracker = GameTracker(2025, "03", ("20", "21"))
+    days = asyncio.run(ReplaySource.from_fixtures(tracker.year).fetch())
+    matches = [match for day in sorted(days) for match in parse_scoreboard(days[day])]
+    tracker.update_match_results(link_bracket(matches, tracker.teams_master))
+    tracker.add_game("BENCH", "p0", drawSeed=1)
+    for number in range(1, 8):
+        tracker.add_player("BENCH", f"p{number}")
+    for _ in range(40):
+        team = tracker.get_current_team("BENCH").shortName
+        tracker.place_bid(BidModel(gameId="BENCH", player=f"p{random.randrange(8)}", bid=1, team=team))
+        tracker.finalize_bid("BENCH")
+
+    def old_state() -> dict:
+        # the snapshot as it was built before: every model dumped for every snapshot
+        return {
+            "players": {name: player.model_dump() for name, player in tracker.get_all_players("BENCH").items()},
+            "bid": tracker.get_current_bid("BENCH"),
+            "remaining": {team.shortName: team.model_dump() for team in tracker.get_remaining_teams("BENCH")},
+            "all_teams": [team.model_dump() for team in tracker.get_all_teams()],
+            "match_results": {str(match.id): match.model_dump() for match in tracker.match_results},
+        }
+
+    def new_state() -> dict:
+        return {
+            "players": tracker.dump_players("BENCH"),
+            "bid": tracker.get_current_bid("BENCH"),
+            "remaining": tracker.dump_remaining_teams("BENCH"),
+            "all_teams": share(tracker.dump_all_teams()),
+            "match_results": share(tracker.dump_match_results()),
+        }
+
+    def stdlib(message: dict) -> str:
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    hub = GameHub("BENCH", snapshot=new_state)
+    bids = iter(range(10**9))
+
+    def snapshot_after_bid(encoding: str) -> Encoded:
+        # a bid touches one member, everything else is reused
+        hub.publish([replace("/bid", next(bids))])
+        return hub.snapshot_frame(encoding).encoded(encoding)
+
+    def snapshot_after_sale(encoding: str) -> Encoded:
+        # a sale is rebuilt and diffed, players and remaining are re-encoded
+        hub.sync([replace("/players/p0/balance", next(bids))])
+        return hub.snapshot_frame(encoding).encoded(encoding)
+
+    delta = {"type": DELTA, "version": 7, "ops": [replace("/bid", 12), replace("/deadline", 1742500000.5)]}
+    cases = {
+        "delta, stdlib json": lambda: stdlib(delta),
+        "delta, this path": lambda: encode(delta),
+        "snapshot, old path": lambda: stdlib({"type": SNAPSHOT, "version": 7, "state": old_state()}),
+        "snapshot, this path, nothing cached": lambda: encode({"type": SNAPSHOT, "version": 7, "state": new_state()}),
+        "snapshot after a bid, this path": lambda: snapshot_after_bid(JSON),
+        "snapshot after a sale, this path": lambda: snapshot_after_sale(JSON),
+    }
+    if msgpack is not None:
+        cases["delta, msgpack"] = lambda: encode(delta, MSGPACK)
+        cases["snapshot after a bid, msgpack"] = lambda: snapshot_after_bid(MSGPACK)
+
+    print(f"json encoder: {'orjson' if orjson else 'stdlib'}, msgpack: {'yes' if msgpack else 'not installed'}")
+    for name, run in cases.items():
+        payload = run()
+        rounds = 2000 if name.startswith("delta") else 200
+        start = time.perf_counter()
+        for _ in range(rounds):
+            run()
+        elapsed = (time.perf_counter() - start) / rounds * 1e6
+        size = len(payload.encode() if isinstance(payload, str) else payload)
+        print(f"{name:40} {size:7} bytes {elapsed:9.1f} us")
@@ -1,100 +1,366 @@
 import random
+import threading
+import time
 
 from app.types.types import (
     PlayerInfo,
     TeamInfo,
     GameInfo,
     BidModel,
+    MatchInfo,
+    ScoringRules,
     INITIAL_BID,
     INITIAL_COUNTDOWN,
+    LOBBY,
+    AUCTIONING,
+    COMPLETE,
+    BUNDLE_RULES,
 )
 from app.bracket import get_teams, get_matches
+from app.catalog import TeamCatalog, GameState, PlayerState, lot_ids, parse_bundle_rules
+from app.metrics import TRACKER_SECONDS, timed
+from app.scoring import WinMatrix, score_games
+from app.simulation import TournamentSimulator
 
 
 def missingPlayInPostProcess(teams: dict[str, TeamInfo]):
-    teams["Xavier/Texas"] = TeamInfo(
-        shortName="Xavier/Texas", urlName="", seed=11, region="Midwest"
-    )
+    # the feed leaves the play-in slot empty until the First Four game is played
+    if not any(team.seed == 11 and team.region == "Midwest" for team in teams.values()):
+        teams["Xavier/Texas"] = TeamInfo(
+            shortName="Xavier/Texas", urlName="", seed=11, region="Midwest"
+        )
     return teams
 
 
 class GameTracker:
-    def __init__(self, year: int, month: str, day: tuple[str, str]):
-        self.games: dict[str, GameInfo] = {}
-        self.teams_master = get_teams(year, month, day)
-        missingPlayInPostProcess(self.teams_master)
-        teams_list = list(self.teams_master.items())
-        teams_list.sort(key=lambda x: int(x[1].seed))
-        self.teams_master = {key: value for key, value in teams_list}
-        self.match_results = []
-
-    def add_game(self, gameId: str, creator: str) -> None:
-        creator_info = PlayerInfo(name=creator, gameId=gameId)
-        self.games[gameId] = GameInfo(
-            creator=creator,
-            players={creator: creator_info},
-            teams=self.teams_master.copy(),
+    def __init__(
+        self, year: int, month: str, day: tuple[str, str], bundle_rules: dict[int, int] | None = None
+    ):
+        self.games: dict[str, GameState] = {}
+        self.year = year
+        self.month = month
+        self.day = day
+        self._teams_master: dict[str, TeamInfo] | None = None
+        self._teams_lock = threading.Lock()
+        # team and lot ids shared by every game, built once with the field
+        self._catalog: TeamCatalog | None = None
+        self.bundle_rules = parse_bundle_rules(BUNDLE_RULES) if bundle_rules is None else bundle_rules
+        self.match_results: list[MatchInfo] = []
+        # scoring index: wins per team and per lot, and the winner counted for each match
+        self.team_wins: dict[str, int] = {}
+        self.lot_wins: list[int] = []
+        self.lot_games: list[set[str]] = []  # lot id -> classic games where someone owns it
+        self.counted_winners: dict[int, str] = {}
+        self.results_version = 0  # bumped whenever match_results change
+        self._win_matrix: WinMatrix | None = None  # results as arrays for custom rule sets, rebuilt when they change
+        self._match_dump: tuple[list[MatchInfo], dict[str, dict]] | None = None  # match_results it was dumped from
+
+    @property
+    def teams_loaded(self) -> bool:
+        return self._teams_master is not None
+
+    @property
+    def teams_master(self) -> dict[str, TeamInfo]:
+        """
+        Tournament field, loaded on first use so creating the tracker never waits on the scoreboard feed.
+        The first use blocks until the feed is read; async code should load it off the event loop first.
+        """
+        if self._teams_master is None:
+            with self._teams_lock:
+                if self._teams_master is None:
+                    teams = get_teams(self.year, self.month, self.day)
+                    missingPlayInPostProcess(teams)
+                    teams_list = list(teams.items())
+                    teams_list.sort(key=lambda x: int(x[1].seed))
+                    master = {key: value for key, value in teams_list}
+                    self._catalog = TeamCatalog(master, self.bundle_rules)
+                    self.lot_wins = [0] * len(self._catalog.lots)
+                    self.lot_games = [set() for _ in self._catalog.lots]
+                    self._teams_master = master
+        return self._teams_master
+
+    @property
+    def catalog(self) -> TeamCatalog:
+        self.teams_master
+        return self._catalog
+
+    @property
+    def lots(self) -> dict[str, TeamInfo]:
+        """
+        Everything that can come up for auction, keyed by name: single teams and seed bundles.
+        """
+        return dict(zip(self.catalog.lot_id, self.catalog.lots))
+
+    @property
+    def bundles(self) -> dict[str, list[str]]:
+        return self.catalog.bundles
+
+    @timed(TRACKER_SECONDS, "add_game")
+    def add_game(
+        self,
+        gameId: str,
+        creator: str,
+        teamName: str | None = None,
+        scoring: ScoringRules | None = None,
+        drawSeed: int | None = None,
+    ) -> None:
+        """
+        Create a game with its whole draw shuffled up front. The same drawSeed always gives the same auction order.
+        """
+        lot_count = len(self.catalog.lots)
+        draw = bytearray(range(lot_count))
+        random.Random(drawSeed).shuffle(draw)
+        game = GameState(creator, lot_count, draw, scoring)
+        game.add_player(creator)
+        self.games[gameId] = game
+        self.get_random_team(gameId, teamName)
+
+    @timed(TRACKER_SECONDS, "load_game")
+    def load_game(self, gameId: str, game: GameInfo) -> None:
+        """
+        Install a game restored from storage, where it is kept by team names, as ids into the catalog.
+        """
+        catalog = self.catalog
+        if gameId in self.games:
+            self.remove_game(gameId)  # replaced, e.g. by a newer copy of the game
+        state = GameState(
+            game.creator,
+            len(catalog.lots),
+            bytearray(catalog.lot_id[name] for name in game.drawOrder if name in catalog.lot_id),
+            game.scoring,
         )
-        self.games[gameId].currentTeam = self.get_random_team(gameId)
+        state.current = -1 if game.currentTeam is None else catalog.find_lot(game.currentTeam.shortName)
+        state.currentBid = game.currentBid
+        state.countdown = game.countdown
+        state.deadline = game.deadline
+        state.log = game.log
+        for player_info in game.players.values():
+            player = state.add_player(player_info.name, player_info.balance)
+            for team_name, team in player_info.teams.items():
+                lot = catalog.find_lot(team_name)
+                if lot is None:
+                    print(f"ERROR: GAME {gameId} OWNS UNKNOWN TEAM {team_name}")
+                    continue
+                state.own(lot, player, team.purchasePrice or 0)
+                self._index_owner(gameId, state, lot)
+        self.games[gameId] = state
+        if state.scoring is not None:
+            self.rescore_games([gameId])
+
+    @timed(TRACKER_SECONDS, "game_info")
+    def game_info(self, gameId: str) -> GameInfo:
+        """
+        The game as models with team names, for storage.
+        """
+        game = self.games[gameId]
+        return GameInfo(
+            creator=game.creator,
+            players=self.get_all_players(gameId),
+            currentBid=game.currentBid,
+            countdown=game.countdown,
+            deadline=game.deadline,
+            currentTeam=self.get_current_team(gameId),
+            drawOrder=[self.catalog.lots[lot].shortName for lot in game.draw],
+            log=list(game.log),
+            scoring=game.scoring,
+        )
+
+    def remove_game(self, gameId: str) -> None:
+        game = self.games.pop(gameId)
+        if game.scoring is None:
+            for lot, owner in enumerate(game.owner):
+                if owner:
+                    self.lot_games[lot].discard(gameId)
+
+    def game_status(self, gameId: str) -> str:
+        game = self.games[gameId]
+        if game.current < 0:
+            return COMPLETE
+        if game.log or game.deadline is not None or len(game.draw) < len(self.catalog.lots) - 1:
+            return AUCTIONING
+        return LOBBY
 
     def add_player(self, gameId: str, player: str) -> None:
-        self.games[gameId].players[player] = PlayerInfo(name=player, gameId=gameId)
+        self.games[gameId].add_player(player)
+
+    def has_player(self, gameId: str, player: str) -> bool:
+        return player in self.games[gameId].players
 
     def update_player(
         self, gameId: str, player: str, bidAmount: int, purchasedTeam: str
     ) -> None:
-        self.games[gameId].players[player].balance -= bidAmount
-        team = self.games[gameId].currentTeam.model_copy()
-        if team.shortName != purchasedTeam:
-            for temp_team in self.games[gameId].teams.values():
-                if temp_team.shortName == purchasedTeam:
-                    team = temp_team.model_copy()
-                    break
-        team.purchasePrice = bidAmount
-        self.games[gameId].players[player].teams[team.shortName] = team
+        game = self.games[gameId]
+        lot = game.current
+        if self.catalog.lots[lot].shortName != purchasedTeam and purchasedTeam in self.catalog.lot_id:
+            lot = self.catalog.lot_id[purchasedTeam]
+        game.sell(lot, game.players[player], bidAmount)
+        self._index_owner(gameId, game, lot)
+        if game.scoring is not None:
+            self.rescore_games([gameId])
+
+    def _index_owner(self, gameId: str, game: GameState, lot: int) -> None:
+        # custom rule sets are rescored as a whole, only classic games are found through the index
+        if game.scoring is None:
+            self.lot_games[lot].add(gameId)
 
     def get_player_info(self, gameId: str, player: str) -> PlayerInfo:
-        return self.games[gameId].players[player]
+        return self._player_info(gameId, self.games[gameId].players[player])
 
     def get_all_players(self, gameId: str) -> dict[str, PlayerInfo]:
-        return self.games[gameId].players
-
-    def get_random_team(self, gameId: str) -> TeamInfo:
-        team: TeamInfo = random.choice(list(self.games[gameId].teams.values()))
-
-        # bundle seeds 15 and 16
-        bundle: list[TeamInfo] = []
-        if team.seed == 15 or team.seed == 16:
-            team = TeamInfo(
-                shortName=f"{team.seed} seed bundle",
-                urlName=f"{team.seed} seed bundle",
-                seed=team.seed,
-                region="bundle",
+        return {name: self._player_info(gameId, player) for name, player in self.games[gameId].players.items()}
+
+    @timed(TRACKER_SECONDS, "dump_players")
+    def dump_players(self, gameId: str) -> dict[str, dict]:
+        """
+        get_all_players as plain dicts, built straight from the catalog's dumped teams for sending to clients.
+        """
+        game = self.games[gameId]
+        dumps = self.catalog.lot_dumps
+        players = {}
+        for name, player in game.players.items():
+            teams = {
+                dumps[lot]["shortName"]: {
+                    **dumps[lot], "purchasePrice": float(game.prices[lot]), "points": self._lot_points(game, lot)
+                }
+                for lot in lot_ids(player.owned)
+            }
+            players[name] = {
+                "name": name,
+                "gameId": gameId,
+                "balance": player.balance,
+                "points": self._player_points(game, player),
+                "teams": teams,
+            }
+        return players
+
+    def _player_info(self, gameId: str, player: PlayerState) -> PlayerInfo:
+        # teams are copied off the shared catalog with this game's price and points
+        game = self.games[gameId]
+        teams: dict[str, TeamInfo] = {}
+        for lot in lot_ids(player.owned):
+            team = self.catalog.lots[lot]
+            teams[team.shortName] = team.model_copy(
+                update={"purchasePrice": float(game.prices[lot]), "points": self._lot_points(game, lot)}
             )
-            for temp_team in self.games[gameId].teams.values():
-                if temp_team.seed == team.seed:
-                    bundle.append(temp_team)
+        points = self._player_points(game, player)
+        return PlayerInfo(name=player.name, gameId=gameId, balance=player.balance, points=points, teams=teams)
 
-        if bundle:
-            for temp_team in bundle:
-                del self.games[gameId].teams[temp_team.shortName]
+    def _player_points(self, game: GameState, player: PlayerState) -> float:
+        if game.scoring is None:
+            return sum(self.lot_wins[lot] for lot in lot_ids(player.owned))
+        return player.points
+
+    def _lot_points(self, game: GameState, lot: int) -> float | None:
+        if game.scoring is None:
+            return self.lot_wins[lot]
+        return None if game.lot_points is None else float(game.lot_points[lot])
+
+    def get_random_team(self, gameId: str, teamName: str | None = None) -> TeamInfo | None:
+        """
+        Draw the next team or bundle and put it up for auction, None once everything has been auctioned.
+        Passing teamName replays a known draw: a lot name, or a team that was auctioned in a bundle.
+        """
+        game = self.games[gameId]
+        lot = None if teamName is None else self.catalog.find_lot(teamName)
+        if not game.draw:
+            game.current = -1
+        elif lot is None or game.draw[-1] == lot:
+            game.current = game.draw.pop()
         else:
-            del self.games[gameId].teams[team.shortName]
+            game.draw.remove(lot)  # a draw recorded before this game's order was fixed
+            game.current = lot
+        return self.get_current_team(gameId)
 
-        return team
+    def pick_team_name(self, gameId: str) -> str | None:
+        """
+        Name of the team or bundle a game draws next. Naming it up front lets the draw travel with an event.
+        """
+        draw = self.games[gameId].draw
+        return self.catalog.lots[draw[-1]].shortName if draw else None
 
     def get_remaining_teams(self, gameId: str) -> list[TeamInfo]:
-        return list(self.games[gameId].teams.values())
+        # in field order, so clients cannot read the draw order from it
+        remaining = self._remaining_lots(gameId)
+        lot_of = self.catalog.lot_of
+        return [team for i, team in enumerate(self.catalog.teams) if remaining >> lot_of[i] & 1]
+
+    def _remaining_lots(self, gameId: str) -> int:
+        # bitset of the lot ids still to be drawn
+        remaining = 0
+        for lot in self.games[gameId].draw:
+            remaining |= 1 << lot
+        return remaining
+
+    def valuations(
+        self, gameId: str, simulator: TournamentSimulator, current_only: bool = False
+    ) -> dict[str, dict] | None:
+        """
+        Expected points and fair price of the teams and bundles not sold yet (or just the one up for auction),
+        under the game's rules. None until the simulator has run.
+        """
+        game = self.games[gameId]
+        unsold = sorted(game.draw) + ([game.current] if game.current >= 0 else [])  # field order hides the draw
+        budget = sum(player.balance for player in game.players.values())
+        lots = ([game.current] if game.current >= 0 else []) if current_only else None
+        values = simulator.valuations(game.scoring, unsold, budget, lots)
+        if values is None:
+            return None
+        return {self.catalog.lots[lot].shortName: value for lot, value in values.items()}
 
     def get_all_teams(self) -> list[TeamInfo]:
-        return list(self.teams_master.values())
+        return list(self.catalog.teams)
+
+    @timed(TRACKER_SECONDS, "dump_remaining_teams")
+    def dump_remaining_teams(self, gameId: str) -> dict[str, dict]:
+        remaining = self._remaining_lots(gameId)
+        lot_of = self.catalog.lot_of
+        return {
+            team["shortName"]: team for i, team in enumerate(self.catalog.team_dumps) if remaining >> lot_of[i] & 1
+        }
+
+    def dump_all_teams(self) -> list[dict]:
+        """
+        The field as dicts, shared by every game.
+        """
+        return self.catalog.team_dumps
+
+    def dump_match_results(self) -> dict[str, dict]:
+        """
+        match_results as dicts keyed by match id. The same dict until the results change, so it must not be modified.
+        """
+        if self._match_dump is None or self._match_dump[0] is not self.match_results:
+            self._match_dump = (
+                self.match_results,
+                {str(match.id): match.model_dump() for match in self.match_results},
+            )
+        return self._match_dump[1]
+
+    @timed(TRACKER_SECONDS, "check_bid")
+    def check_bid(self, bid_model: BidModel) -> str | None:
+        """
+        Why a bid cannot be placed right now, or None if it can.
+        """
+        game = self.games[bid_model.gameId]
+        if game.current < 0:
+            return "Every team has been auctioned"
+        if bid_model.player not in game.players:
+            return f"{bid_model.player} is not in this game"
+        if bid_model.team != self.catalog.lots[game.current].shortName:
+            return f"{bid_model.team} is not up for auction"
+        if bid_model.bid <= game.currentBid:
+            return f"Bid must be higher than the current bid of ${game.currentBid:.2f}"
+        if bid_model.bid > game.players[bid_model.player].balance:
+            return f"Bid exceeds the balance of ${game.players[bid_model.player].balance:.2f}"
+        return None
 
+    @timed(TRACKER_SECONDS, "place_bid")
     def place_bid(self, bid_model: BidModel) -> None:
         self.games[bid_model.gameId].log.append(bid_model)
         self.games[bid_model.gameId].currentBid = bid_model.bid
         self.games[bid_model.gameId].countdown = INITIAL_COUNTDOWN  # reset countdown
 
-    def finalize_bid(self, gameId: str) -> BidModel:
+    @timed(TRACKER_SECONDS, "finalize_bid")
+    def finalize_bid(self, gameId: str, nextTeam: str | None = None) -> BidModel:
         winner: BidModel
 
         if len(self.games[gameId].log) > 0:
@@ -105,54 +371,148 @@ class GameTracker:
                 gameId="",
                 player="",
                 bid=-1,
-                team=self.games[gameId].currentTeam.shortName,
+                team=self.get_current_team(gameId).shortName,
             )
 
         # pick random new team to auction
-        self.games[gameId].currentTeam = self.get_random_team(gameId)
+        self.get_random_team(gameId, nextTeam)
         self.games[gameId].currentBid = INITIAL_BID  # reset bid
         self.games[gameId].countdown = INITIAL_COUNTDOWN  # reset countdown
+        self.games[gameId].deadline = None  # next auction starts on its first bid
         self.games[gameId].log = []  # reset log
 
         return winner
 
-    def get_current_team(self, gameId: str) -> TeamInfo:
-        return self.games[gameId].currentTeam
+    def get_current_team(self, gameId: str) -> TeamInfo | None:
+        lot = self.games[gameId].current
+        return None if lot < 0 else self.catalog.lots[lot]
 
     def get_current_bid(self, gameId: str) -> float:
         return self.games[gameId].currentBid
 
     def get_current_countdown(self, gameId: str) -> float:
-        return self.games[gameId].countdown
+        if self.games[gameId].deadline is None:
+            return self.games[gameId].countdown
+        return max(0.0, self.games[gameId].deadline - time.time())
+
+    def get_deadline(self, gameId: str) -> float | None:
+        return self.games[gameId].deadline
+
+    def set_deadline(self, gameId: str, deadline: float) -> None:
+        self.games[gameId].deadline = deadline
+
+    @timed(TRACKER_SECONDS, "update_match_results")
+    def update_match_results(self, matches: list[MatchInfo]) -> set[str]:
+        """
+        Store new or changed match results and update the wins of the teams involved. Classic points are summed
+        from those wins when read, so only the games owning a changed lot are reported. Games with custom
+        scoring rules are rescored together in one batch.
+        Returns the ids of the games whose points changed.
+        """
+        known = {match.id: match for match in self.match_results}
+        changed_lots = 0  # bitset of lot ids
+        for match in matches:
+            known[match.id] = match
+            previous = self.counted_winners.pop(match.id, None)
+            if previous == (match.winner or None):
+                if previous:
+                    self.counted_winners[match.id] = previous
+                continue
+            if previous:
+                changed_lots |= self._add_win(previous, -1)
+            if match.winner:
+                self.counted_winners[match.id] = match.winner
+                changed_lots |= self._add_win(match.winner, 1)
+        self.match_results = [known[match_id] for match_id in sorted(known)]
+
+        affected: set[str] = set()
+        for lot in lot_ids(changed_lots):
+            affected |= self.lot_games[lot]
+        if matches:
+            self.results_version += 1
+            self._win_matrix = None
+            affected |= self.rescore_games(
+                [gameId for gameId, game in self.games.items() if game.scoring is not None]
+            )
+        return affected
+
+    @timed(TRACKER_SECONDS, "rescore_games")
+    def rescore_games(self, gameIds: list[str]) -> set[str]:
+        """
+        Recompute points for the given games under their scoring rules, all of them in one vectorized pass.
+        Returns the ids of the games whose points changed.
+        """
+        if not gameIds:
+            return set()
+        if self._win_matrix is None:
+            self._win_matrix = WinMatrix(self.teams_master, self.match_results)
+        standings = score_games({gameId: self.games[gameId] for gameId in gameIds}, self._win_matrix, self.catalog)
 
-    def decrement_countdown(self, gameId: str) -> None:
-        self.games[gameId].countdown -= 1
+        changed: set[str] = set()
+        for gameId, (lot_points, points) in standings.items():
+            game = self.games[gameId]
+            game.lot_points = lot_points
+            for player in game.players.values():
+                if player.points != points[player.index]:
+                    changed.add(gameId)
+                player.points = float(points[player.index])
+        return changed
 
-    def calculate_player_points(self, gameId: str) -> None:
+    def _add_win(self, team_name: str, wins: int) -> int:
+        # bitset of the lot whose wins changed; a bundle earns the wins of its teams
+        self.team_wins[team_name] = self.team_wins.get(team_name, 0) + wins
+        team = self.catalog.team_id.get(team_name)
+        if team is None:
+            return 0
+        lot = self.catalog.lot_of[team]
+        self.lot_wins[lot] += wins
+        return 1 << lot
+
+    @timed(TRACKER_SECONDS, "calculate_player_points")
+    def calculate_player_points(self, gameId: str) -> dict[str, dict[str, int]]:
         """
         Using very naive point system here. +1 for each team wins.
+
+        Full recomputation from match_results, kept as the reference for the per-lot wins.
+        Returns { player_name : { team_name: points, team_name:points... } }
         """
 
         # { player_name : { team_name: points, team_name:points... } }
         score_map = {
-            player.name: {team: 0 for team in player.teams.keys()}
+            player.name: {self.catalog.lots[lot].shortName: 0 for lot in lot_ids(player.owned)}
             for player in self.games[gameId].players.values()
         }
 
         for match in self.match_results:
+            if not match.winner:
+                continue  # not played yet
             winner = (
                 match.participants[0]
                 if match.winner == match.participants[0].shortName
                 else match.participants[1]
             )
+            lot = self.catalog.find_lot(winner.shortName)
+            if lot is None:
+                continue
+            lot_name = self.catalog.lots[lot].shortName  # the team itself, or the bundle it was auctioned in
             for player in score_map.keys():
-                if winner.shortName in score_map[player].keys():
-                    score_map[player][winner.shortName] += 1
+                if lot_name in score_map[player].keys():
+                    score_map[player][lot_name] += 1
 
-        for player, teams in score_map.items():
-            final_score = 0
-            for team_name, score in teams.items():
-                final_score += score
-                self.games[gameId].players[player].teams[team_name].points = score
+        return score_map
 
-            self.games[gameId].players[player].points = final_score
+    @timed(TRACKER_SECONDS, "check_player_points")
+    def check_player_points(self, gameId: str) -> bool:
+        """
+        Consistency check: True when the points summed from the per-lot wins match a full recomputation.
+        """
+        if self.games[gameId].scoring is not None:
+            return True  # custom rule sets are always fully recomputed
+        players = self.get_all_players(gameId)
+        for player, teams in self.calculate_player_points(gameId).items():
+            player_info = players[player]
+            if player_info.points != sum(teams.values()):
+                return False
+            if any(player_info.teams[team_name].points != score for team_name, score in teams.items()):
+                return False
+        return True
@@ -0,0 +1,272 @@
+import json
+import os
+import queue
+import threading
+
+from app.game_tracker import GameTracker
+from app.metrics import STORAGE_SECONDS, timed
+from app.types.types import BidModel, GameInfo, ScoringRules, valid_game_id
+
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "app/journal")
+LOG_SUFFIX = ".log"
+SNAPSHOT_SUFFIX = ".snapshot.json"
+DEADLINES_FILE = "deadlines.json"  # running auctions by game, so a restart can resume them without reading every game
+COMPACT_EVERY = 256  # events appended to a game's log before it is folded into a snapshot
+FLUSH_INTERVAL = 0.05  # seconds the writer keeps collecting appends before it fsyncs a batch
+
+# Event types written to the journal
+GAME_CREATED = "game_created"
+PLAYER_JOINED = "player_joined"
+BID_PLACED = "bid_placed"
+BID_FINALIZED = "bid_finalized"
+
+
+class EventJournal:
+    """
+    Append-only event log, one file per game.
+
+    Appends are queued from the event loop and a background thread writes them in batches with a single
+    fsync per touched file, so request handlers never wait on disk. Every COMPACT_EVERY events a game's
+    log is replaced by a snapshot of its GameInfo, which keeps the time to read a game back bounded.
+    Log records are numbered per game and a snapshot keeps the number of the last event it covers, so records
+    left in the log by a crash between writing a snapshot and truncating the log are skipped when it is read.
+
+    Games evicted from memory are archived as a snapshot and read back one at a time with read_game. The deadlines
+    of running auctions are kept in one small index file next to the logs, rewritten with each batch that changes
+    it, so a restart finds the auctions to resume without opening any game.
+    """
+
+    def __init__(self, directory: str = JOURNAL_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._queue: queue.Queue = queue.Queue()
+        self._counts: dict[str, int] = {}
+        self._sequences: dict[str, int] = {}  # game id -> number of its last queued event
+        self._unwritten: dict[str, int] = {}  # game id -> queued appends and snapshots, guarded by _written
+        self._written = threading.Condition()
+        self._deadlines: dict[str, float] = self._read_deadlines()  # game id -> deadline, guarded by _written
+        self._deadlines_changed = False
+        self._writer = threading.Thread(target=self._run, name="event-journal", daemon=True)
+        self._writer.start()
+
+    def append(self, gameId: str, event: dict) -> bool:
+        """
+        Queue an event for a game. Returns True once the game's log is long enough to be compacted.
+        """
+        sequence = self._sequences[gameId] = self._sequences.get(gameId, 0) + 1
+        self._queue_write(("event", gameId, json.dumps({**event, "seq": sequence})))
+        if event["type"] in (BID_PLACED, BID_FINALIZED):
+            with self._written:
+                if event["type"] == BID_PLACED:
+                    self._deadlines[gameId] = event["deadline"]
+                else:
+                    self._deadlines.pop(gameId, None)
+                self._deadlines_changed = True
+        self._counts[gameId] = self._counts.get(gameId, 0) + 1
+        return self._counts[gameId] >= COMPACT_EVERY
+
+    @timed(STORAGE_SECONDS, "snapshot")
+    def snapshot(self, gameId: str, game: GameInfo) -> None:
+        """
+        Queue a snapshot of a game. The game is serialized now, so it matches every event queued before it.
+        """
+        payload = f'{{"seq": {self._sequences.get(gameId, 0)}, "game": {game.model_dump_json()}}}'
+        self._queue_write(("snapshot", gameId, payload))
+        self._counts[gameId] = 0
+
+    def archive(self, gameId: str, game: GameInfo) -> None:
+        """
+        Snapshot a game that is leaving memory and forget about it until it is restored.
+        """
+        self.snapshot(gameId, game)
+        self._counts.pop(gameId, None)
+        self._sequences.pop(gameId, None)
+
+    def active_auctions(self) -> dict[str, float]:
+        """
+        Deadline of every auction that was running when its last event was journaled, by game id.
+        """
+        with self._written:
+            return dict(self._deadlines)
+
+    def has_game(self, gameId: str) -> bool:
+        if not valid_game_id(gameId):
+            return False
+        return os.path.exists(self._snapshot_path(gameId)) or os.path.exists(self._log_path(gameId))
+
+    def read_game(self, gameId: str) -> tuple[GameInfo | None, list[dict]] | None:
+        """
+        A game's snapshot and the events logged after it, or None if the game was never journaled. Events the
+        snapshot already covers are left out, and the game's next event is numbered after the last one read.
+        Waits until the game's queued writes are on disk, so run it off the event loop.
+        """
+        with self._written:
+            self._written.wait_for(lambda: gameId not in self._unwritten)
+        if not self.has_game(gameId):
+            return None
+        return self._read(gameId)
+
+    def restore(self, tracker: GameTracker, gameId: str, snapshot: GameInfo | None, events: list[dict]) -> None:
+        """
+        Rebuild a game read with read_game in the tracker.
+        """
+        if snapshot is not None:
+            tracker.load_game(gameId, snapshot)
+        for event in events:
+            apply_event(tracker, gameId, event)
+        self._counts[gameId] = len(events)
+        if tracker.get_deadline(gameId) is None:
+            with self._written:
+                if self._deadlines.pop(gameId, None) is not None:  # stale: stopped before the finalize was indexed
+                    self._deadlines_changed = True
+
+    def flush(self) -> None:
+        """
+        Block until everything queued so far is on disk.
+        """
+        self._queue.join()
+
+    def _queue_write(self, item: tuple[str, str, str]) -> None:
+        with self._written:
+            self._unwritten[item[1]] = self._unwritten.get(item[1], 0) + 1
+        self._queue.put(item)
+
+    def _log_path(self, gameId: str) -> str:
+        if not valid_game_id(gameId):
+            raise ValueError(f"Invalid game id {gameId!r}")
+        return os.path.join(self.directory, f"{gameId}{LOG_SUFFIX}")
+
+    def _snapshot_path(self, gameId: str) -> str:
+        if not valid_game_id(gameId):
+            raise ValueError(f"Invalid game id {gameId!r}")
+        return os.path.join(self.directory, f"{gameId}{SNAPSHOT_SUFFIX}")
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while True:
+                    batch.append(self._queue.get(timeout=FLUSH_INTERVAL))
+            except queue.Empty:
+                pass
+
+            try:
+                self._write_batch(batch)
+                self._write_deadlines()
+            except OSError as e:
+                print(f"ERROR WRITING JOURNAL: {e}")
+            finally:
+                with self._written:
+                    for _, gameId, _ in batch:
+                        self._unwritten[gameId] -= 1
+                        if not self._unwritten[gameId]:
+                            del self._unwritten[gameId]
+                    self._written.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: list[tuple[str, str, str]]) -> None:
+        files = {}
+        try:
+            for kind, gameId, payload in batch:
+                if kind == "event":
+                    if gameId not in files:
+                        files[gameId] = open(self._log_path(gameId), "a")
+                    files[gameId].write(payload + "\n")
+                else:
+                    # events queued before the snapshot must be durable before the log is truncated
+                    if gameId in files:
+                        _sync_and_close(files.pop(gameId))
+                    self._write_snapshot(gameId, payload)
+        finally:
+            for f in files.values():
+                _sync_and_close(f)
+
+    def _read_deadlines(self) -> dict[str, float]:
+        try:
+            with open(os.path.join(self.directory, DEADLINES_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            print(f"ERROR READING AUCTION DEADLINES: {e}")
+            return {}
+
+    def _write_deadlines(self) -> None:
+        with self._written:
+            if not self._deadlines_changed:
+                return
+            payload = json.dumps(self._deadlines)
+            self._deadlines_changed = False
+        path = os.path.join(self.directory, DEADLINES_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _write_snapshot(self, gameId: str, payload: str) -> None:
+        tmp_path = self._snapshot_path(gameId) + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path(gameId))
+        open(self._log_path(gameId), "w").close()
+
+    def _read(self, gameId: str) -> tuple[GameInfo | None, list[dict]]:
+        snapshot = None
+        sequence = 0
+        if os.path.exists(self._snapshot_path(gameId)):
+            with open(self._snapshot_path(gameId)) as f:
+                stored = json.load(f)
+            if "game" in stored:
+                sequence = stored["seq"]
+                stored = stored["game"]
+            snapshot = GameInfo.model_validate(stored)  # snapshots written before numbering are the bare game
+
+        events = []
+        if os.path.exists(self._log_path(gameId)):
+            with open(self._log_path(gameId)) as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn write from a crash, everything after it is lost
+                    if event.get("seq", sequence + 1) <= sequence:
+                        continue  # already in the snapshot: the log was not truncated before a crash
+                    sequence = event.get("seq", sequence + 1)
+                    events.append(event)
+        self._sequences[gameId] = sequence
+        return snapshot, events
+
+
+def _sync_and_close(f) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def apply_event(tracker: GameTracker, gameId: str, event: dict) -> None:
+    """
+    Apply one journaled event to the tracker. Team draws are replayed from the log rather than re-rolled.
+    """
+    if event["type"] == GAME_CREATED:
+        scoring = ScoringRules.model_validate(event["scoring"]) if event.get("scoring") else None
+        tracker.add_game(
+            gameId=gameId,
+            creator=event["creator"],
+            teamName=event["team"],
+            scoring=scoring,
+            drawSeed=event.get("drawSeed"),
+        )
+    elif event["type"] == PLAYER_JOINED:
+        tracker.add_player(gameId=gameId, player=event["player"])
+    elif event["type"] == BID_PLACED:
+        tracker.place_bid(BidModel(gameId=gameId, player=event["player"], bid=event["bid"], team=event["team"]))
+        if event.get("deadline") is not None:
+            tracker.set_deadline(gameId, event["deadline"])  # the auction resumes from it after a restart
+    elif event["type"] == BID_FINALIZED:
+        tracker.finalize_bid(gameId, nextTeam=event["team"])
+    else:
+        print(f"UNKNOWN JOURNAL EVENT: {event}")
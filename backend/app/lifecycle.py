@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from app.metrics import GAMES_EVICTED
+
+GAME_IDLE_TTL = float(os.getenv("GAME_IDLE_TTL", 30 * 60))  # seconds a game stays in memory after its last use
+MAX_RESIDENT_GAMES = int(os.getenv("MAX_RESIDENT_GAMES", 1000))  # games in memory before the least recent go
+SWEEP_INTERVAL = 30  # seconds between looks for idle games
+
+
+class GameLifecycle:
+    """
+    Bounds the games held in memory.
+
+    Every use of a game moves it to the back of an LRU order. A sweep walks that order from the front and
+    evicts games idle for longer than the TTL, and keeps evicting the least recently used ones while more than
+    capacity are resident. Games can_evict refuses (open sockets, a running auction, unsaved changes) are
+    skipped and looked at again on the next sweep, so capacity is a soft limit.
+    """
+
+    def __init__(
+        self,
+        can_evict: Callable[[str], bool],
+        evict: Callable[[str], None],
+        ttl: float = GAME_IDLE_TTL,
+        capacity: int = MAX_RESIDENT_GAMES,
+    ):
+        self.last_used: OrderedDict[str, float] = OrderedDict()  # game id -> monotonic time, least recent first
+        self.ttl = ttl
+        self.capacity = capacity
+        self._can_evict = can_evict
+        self._evict = evict
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def touch(self, game_id: str) -> None:
+        self.last_used[game_id] = time.monotonic()
+        self.last_used.move_to_end(game_id)
+        self._ensure_running()
+        if len(self.last_used) > self.capacity:
+            self._wakeup.set()
+
+    def sweep(self) -> list[str]:
+        """
+        Evict what is idle or over capacity now. Returns the evicted game ids.
+        """
+        expired = time.monotonic() - self.ttl
+        evicted = []
+        for game_id, used in list(self.last_used.items()):
+            if used > expired and len(self.last_used) <= self.capacity:
+                break  # everything after this was used more recently
+            if self._can_evict(game_id):
+                self._evict(game_id)
+                del self.last_used[game_id]
+                evicted.append(game_id)
+        GAMES_EVICTED.inc(amount=len(evicted))
+        return evicted
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(self._wakeup))
+
+    async def _run(self, wakeup: asyncio.Event) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=SWEEP_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"ERROR EVICTING GAMES: {e}")
@@ -0,0 +1,549 @@
+"""
+Load generator for the auction API.
+
+Starts the app in a uvicorn subprocess that serves the bundled tournament fixtures (TOURNAMENT_OFFLINE=1, no
+results polling), or drives a running server given with --url. Every simulated game is created and joined over
+HTTP, every player and spectator holds a /ws/{game_id} socket like the web client does, and players bid at random
+on whatever team their socket shows, at --bid-rate bids per second each.
+
+Prints one JSON document: bid latency percentiles, websocket fan-out delay (bid sent -> delta received, per
+socket), frames and messages per second, and CPU and RSS of the server process (only when it was started here).
+
+--workers runs the same load against a cluster instead: a broker (app.cluster) and that many workers sharing one
+database, with each game's requests and sockets going to one worker the way a load balancer with game affinity
+would send them. A list of counts runs once per count and reports the throughput of each side by side.
+
+    python -m app.loadtest --games 100 --players 4 --spectators 2 --bid-rate 0.5 --duration 30 > load.json
+    python -m app.loadtest --workers 1,2,4 --games 200 --bid-rate 1 --duration 20 > scaling.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from app.protocol import BATCH, DELTA, PING, SNAPSHOT, apply_patch
+
+SETUP_CONCURRENCY = 20  # games being created and joined at once
+SERVER_START_TIMEOUT = 30  # seconds to wait for a spawned server to answer
+SAMPLE_INTERVAL = 1  # seconds between server CPU/RSS samples
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(samples: list[float]) -> dict:
+    # milliseconds
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {"count": len(ordered), "p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": at(1.0)}
+
+
+class Recorder:
+    """
+    Everything measured during the run window. Setup traffic is not counted.
+    """
+
+    def __init__(self):
+        self.recording = False
+        self.bid_latency: list[float] = []
+        self.fanout_delay: list[float] = []
+        self.bids_accepted = 0
+        self.bids_rejected = 0
+        self.bids_skipped = 0  # the player could not afford to outbid
+        self.errors = 0
+        self.frames = 0
+        self.messages = 0
+
+
+class LoadGame:
+    def __init__(self, game_id: str, players: list[str], client: httpx.AsyncClient, ws_url: str):
+        self.game_id = game_id
+        self.players = players
+        self.client = client  # every request and socket of the game goes to the same server
+        self.ws_url = ws_url
+        self.sent: dict[tuple[str, int], float] = {}  # (team, bid) -> when the bid was sent
+        self.watchers: dict[str, "Watcher"] = {}  # player -> their socket
+
+
+class Watcher:
+    """
+    One socket on a game. Keeps the game state from the snapshot and deltas, and times every bid it sees.
+    """
+
+    def __init__(self, url: str, game: LoadGame, recorder: Recorder):
+        self.url = url
+        self.game = game
+        self.recorder = recorder
+        self.state: dict = {}
+        self.ready = asyncio.Event()
+
+    async def run(self, stop: asyncio.Event) -> None:
+        try:
+            async with websockets.connect(self.url, max_size=None) as ws:
+                while not stop.is_set():
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+                    except asyncio.TimeoutError:
+                        continue
+                    if self._receive(raw, time.perf_counter()):
+                        await ws.send("pong")
+        except Exception as e:
+            if not stop.is_set():
+                print(f"ERROR ON SOCKET {self.url}: {e}", file=sys.stderr)
+                self.recorder.errors += 1
+        finally:
+            self.ready.set()
+
+    def _receive(self, raw: str, received: float) -> bool:
+        """
+        Apply one frame. Returns True when it carried a ping that needs a pong.
+        """
+        if not raw.startswith("{"):
+            return False  # raw text like "gameStarted"
+        pinged = False
+        recording = self.recorder.recording
+        if recording:
+            self.recorder.frames += 1
+        for message in self._flatten(json.loads(raw)):
+            if recording:
+                self.recorder.messages += 1
+            if message["type"] == PING:
+                pinged = True
+            elif message["type"] == SNAPSHOT:
+                self.state = message["state"]
+                self.ready.set()
+            elif message["type"] == DELTA:
+                apply_patch(self.state, message["ops"])
+                if not recording:
+                    continue
+                team = (self.state.get("team") or {}).get("shortName")
+                for op in message["ops"]:
+                    sent = self.game.sent.get((team, op.get("value"))) if op["path"] == "/bid" else None
+                    if sent is not None:
+                        self.recorder.fanout_delay.append(received - sent)
+        return pinged
+
+    def _flatten(self, message: dict) -> list[dict]:
+        if message["type"] == BATCH:
+            return [inner for frame in message["frames"] for inner in self._flatten(frame)]
+        return [message]
+
+
+async def setup_game(client: httpx.AsyncClient, ws_url: str, players: int, recorder: Recorder) -> LoadGame:
+    names = [f"p{number}" for number in range(players)]
+    game_id = (await client.post("/create-game/", json={"player": names[0]})).json()["id"]
+    for name in names[1:]:
+        (await client.post("/join-game/", json={"gameId": game_id, "player": name})).raise_for_status()
+    game = LoadGame(game_id, names, client, ws_url)
+    for name in names:
+        game.watchers[name] = Watcher(f"{ws_url}/ws/{game_id}", game, recorder)
+    return game
+
+
+async def bidder(game: LoadGame, player: str, rate: float, recorder: Recorder, stop: asyncio.Event) -> None:
+    client = game.client
+    watcher = game.watchers[player]
+    await watcher.ready.wait()
+    while not stop.is_set():
+        await asyncio.sleep(random.expovariate(rate))
+        state = watcher.state
+        if not state.get("team") or player not in state.get("players", {}):
+            continue
+        team = state["team"]["shortName"]
+        bid = int(state["bid"]) + random.randint(1, 3)
+        if bid > state["players"][player]["balance"]:
+            recorder.bids_skipped += recorder.recording
+            continue
+
+        recording = recorder.recording
+        start = time.perf_counter()
+        game.sent[(team, bid)] = start
+        try:
+            body = {"gameId": game.game_id, "player": player, "bid": bid, "team": team}
+            response = await client.post("/bid/", json=body)
+        except httpx.HTTPError as e:
+            print(f"ERROR PLACING BID: {e!r}", file=sys.stderr)
+            recorder.errors += recording
+            continue
+        if not recording:
+            continue
+        recorder.bid_latency.append(time.perf_counter() - start)
+        if response.status_code == 200:
+            recorder.bids_accepted += 1
+        elif response.status_code == 400:
+            recorder.bids_rejected += 1  # outbid by another player, or the auction moved on
+        else:
+            recorder.errors += 1
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_usage(pid: int) -> tuple[float, float] | None:
+    """
+    CPU seconds used and RSS in MB of a process, read from /proc (Linux only).
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return cpu, rss_pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def total_usage(processes: list[subprocess.Popen]) -> tuple[float, float] | None:
+    # summed over the processes, None when any of them can't be read
+    cpu = rss = 0.0
+    for process in processes:
+        usage = process_usage(process.pid)
+        if usage is None:
+            return None
+        cpu, rss = cpu + usage[0], rss + usage[1]
+    return (cpu, rss) if processes else None
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class ServerProcess:
+    """
+    The app in a uvicorn subprocess, working offline from a scratch directory so its journal and cache are
+    thrown away afterwards. env overrides the settings, e.g. to join a cluster.
+    """
+
+    def __init__(self, env: dict[str, str] | None = None):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.workdir = tempfile.TemporaryDirectory(prefix="loadtest-")
+        env = {
+            **os.environ,
+            "PYTHONPATH": BACKEND_DIR,
+            "TOURNAMENT_OFFLINE": "1",
+            "RESULTS_SOURCE": "off",
+            "GAME_STORE": "journal",
+            "CLUSTER_BROKER": "off",
+            **(env or {}),
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.api:app", "--port", str(self.port), "--log-level", "warning"],
+            cwd=self.workdir.name,
+            env=env,
+            stdout=sys.stderr,  # keep stdout for the JSON result
+        )
+
+    async def wait_ready(self, client: httpx.AsyncClient) -> None:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                await client.post("/view-game/", json={"gameId": "-"})
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    raise RuntimeError("load test server did not start")
+                await asyncio.sleep(0.2)
+
+    def stop(self) -> None:
+        stop_process(self.process)
+        self.workdir.cleanup()
+
+
+class BrokerProcess:
+    """
+    A cluster broker (python -m app.cluster) in a subprocess.
+    """
+
+    def __init__(self):
+        self.port = free_port()
+        self.url = f"tcp://127.0.0.1:{self.port}"
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "app.cluster", str(self.port)],
+            env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+            stdout=sys.stderr,
+        )
+
+    async def wait_ready(self) -> None:
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+                writer.close()
+                return
+            except OSError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    raise RuntimeError("load test broker did not start")
+                await asyncio.sleep(0.1)
+
+    def stop(self) -> None:
+        stop_process(self.process)
+
+
+async def drive(args: argparse.Namespace, base_urls: list[str], numbers: list[int], ready, go) -> dict:
+    """
+    One client process's share of the load: set up the games numbered numbers, report ready with the number of
+    sockets, wait for go, then warm up and record for args.duration. Returns what it recorded.
+    """
+    recorder = Recorder()
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with contextlib.AsyncExitStack() as stack:
+        clients = [
+            await stack.enter_async_context(httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30))
+            for base_url in base_urls
+        ]
+        semaphore = asyncio.Semaphore(SETUP_CONCURRENCY)
+
+        async def limited_setup(number: int) -> LoadGame:
+            # games are spread over the servers round robin
+            server = number % len(clients)
+            async with semaphore:
+                ws_url = base_urls[server].replace("http", "ws", 1)
+                return await setup_game(clients[server], ws_url, args.players, recorder)
+
+        games = await asyncio.gather(*(limited_setup(number) for number in numbers))
+        watchers = [watcher for game in games for watcher in game.watchers.values()]
+        watchers += [
+            Watcher(f"{game.ws_url}/ws/{game.game_id}", game, recorder)
+            for game in games
+            for _ in range(args.spectators)
+        ]
+        tasks = [asyncio.create_task(watcher.run(stop)) for watcher in watchers]
+        await asyncio.gather(*(watcher.ready.wait() for watcher in watchers))
+        tasks += [
+            asyncio.create_task(bidder(game, player, args.bid_rate, recorder, stop))
+            for game in games
+            for player in game.players
+        ]
+
+        ready.put(len(watchers))
+        await asyncio.to_thread(go.wait)
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        recorder.recording = False
+        elapsed = time.perf_counter() - started
+        cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+    return {"elapsed": elapsed, "cpu_seconds": cpu, "recorded": vars(recorder)}
+
+
+def client_process(args: argparse.Namespace, base_urls: list[str], numbers: list[int], ready, go, results) -> None:
+    # entry point of a spawned client process; failures are reported on the queue the parent is waiting on
+    try:
+        results.put(asyncio.run(drive(args, base_urls, numbers, ready, go)))
+    except Exception as e:
+        ready.put(f"{e!r}")
+        results.put(f"{e!r}")
+
+
+async def run(args: argparse.Namespace, workers: int | None = None) -> dict:
+    """
+    One load run against args.url, a server started here, or a cluster of that many workers started here.
+    The simulated games are split over args.client_processes processes, so the load generator is not what
+    limits the throughput measured.
+    """
+    broker = BrokerProcess() if workers else None
+    shared = tempfile.TemporaryDirectory(prefix="loadtest-cluster-") if workers else None
+    servers: list[ServerProcess] = []
+    context = multiprocessing.get_context("spawn")  # a forked child would inherit this process's running loop
+    ready, go, results = context.Queue(), context.Event(), context.Queue()
+    drivers: list[multiprocessing.process.BaseProcess] = []
+
+    try:
+        if broker and shared:
+            await broker.wait_ready()
+            database_url = args.database_url or f"sqlite+aiosqlite:///{shared.name}/games.db"
+            for number in range(workers or 0):
+                env = {
+                    "GAME_STORE": "database",
+                    "DATABASE_URL": database_url,
+                    "CLUSTER_BROKER": broker.url,
+                    "WORKER_ID": f"load{number}",
+                }
+                servers.append(ServerProcess(env))
+        elif not args.url:
+            servers.append(ServerProcess())
+        base_urls = [server.url for server in servers] or [args.url]
+        for server in servers:
+            async with httpx.AsyncClient(base_url=server.url) as client:
+                await server.wait_ready(client)
+
+        for share in range(args.client_processes):
+            numbers = list(range(share, args.games, args.client_processes))
+            if numbers:
+                drivers.append(
+                    context.Process(
+                        target=client_process, args=(args, base_urls, numbers, ready, go, results), daemon=True
+                    )
+                )
+        for driver in drivers:
+            driver.start()
+        sockets = 0
+        for _ in drivers:
+            count = await asyncio.to_thread(ready.get)
+            if isinstance(count, str):
+                raise RuntimeError(f"load test client failed: {count}")
+            sockets += count
+
+        processes = [server.process for server in servers]
+        go.set()
+        await asyncio.sleep(args.warmup)
+        server_start = total_usage(processes)
+        broker_start = process_usage(broker.process.pid) if broker else None
+        rss_max = server_start[1] if server_start else None
+        started = time.perf_counter()
+        while time.perf_counter() - started < args.duration:
+            await asyncio.sleep(min(SAMPLE_INTERVAL, args.duration - (time.perf_counter() - started)))
+            sample = total_usage(processes)
+            if sample and rss_max is not None:
+                rss_max = max(rss_max, sample[1])
+        server_end = total_usage(processes)
+        broker_end = process_usage(broker.process.pid) if broker else None
+
+        shares = [await asyncio.to_thread(results.get) for _ in drivers]
+        failed = [share for share in shares if isinstance(share, str)]
+        if failed:
+            raise RuntimeError(f"load test client failed: {failed[0]}")
+    finally:
+        for driver in drivers:
+            driver.join(timeout=10)
+            if driver.is_alive():
+                driver.kill()
+        for server in servers:
+            server.stop()
+        if broker:
+            broker.stop()
+        if shared:
+            shared.cleanup()
+
+    # the client processes' recordings merged into one
+    recorder = Recorder()
+    for share in shares:
+        for name, value in share["recorded"].items():
+            if isinstance(value, list):
+                getattr(recorder, name).extend(value)
+            elif name != "recording":
+                setattr(recorder, name, getattr(recorder, name) + value)
+    elapsed = max(share["elapsed"] for share in shares)
+    client_cpu_seconds = sum(share["cpu_seconds"] for share in shares)
+    bids = recorder.bids_accepted + recorder.bids_rejected
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "games": args.games,
+            "players": args.players,
+            "spectators": args.spectators,
+            "bid_rate": args.bid_rate,
+            "duration": args.duration,
+            "url": args.url,
+            "workers": workers,
+            "client_processes": len(shares),
+            "cpus": os.cpu_count(),
+        },
+        "elapsed": round(elapsed, 3),
+        "sockets": sockets,
+        "bids": {
+            "sent": bids,
+            "accepted": recorder.bids_accepted,
+            "rejected": recorder.bids_rejected,
+            "skipped": recorder.bids_skipped,
+            "per_second": round(bids / elapsed, 2),
+        },
+        "errors": recorder.errors,
+        "bid_latency_ms": percentiles(recorder.bid_latency),
+        "fanout_delay_ms": percentiles(recorder.fanout_delay),
+        "websocket": {
+            "frames": recorder.frames,
+            "messages": recorder.messages,
+            "frames_per_second": round(recorder.frames / elapsed, 2),
+            "messages_per_second": round(recorder.messages / elapsed, 2),
+        },
+        "server": None if not (server_start and server_end and rss_max is not None) else {
+            # summed over the workers of a cluster
+            "cpu_seconds": round(server_end[0] - server_start[0], 3),
+            "cpu_percent": round((server_end[0] - server_start[0]) / elapsed * 100, 1),
+            "rss_mb": round(server_end[1], 1),
+            "rss_mb_max": round(rss_max, 1),
+        },
+        "broker": None if not (broker_start and broker_end) else {
+            "cpu_percent": round((broker_end[0] - broker_start[0]) / elapsed * 100, 1),
+        },
+        "client": {"cpu_seconds": round(client_cpu_seconds, 3), "processes": len(shares)},
+    }
+
+
+def scaling_row(result: dict) -> dict:
+    # one line of the worker count comparison
+    return {
+        "workers": result["config"]["workers"],
+        "bids_per_second": result["bids"]["per_second"],
+        "messages_per_second": result["websocket"]["messages_per_second"],
+        "bid_latency_p99_ms": result["bid_latency_ms"].get("p99"),
+        "fanout_delay_p99_ms": result["fanout_delay_ms"].get("p99"),
+        "server_cpu_percent": result["server"]["cpu_percent"] if result["server"] else None,
+        "errors": result["errors"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--players", type=int, default=4, help="players per game, each bidding and holding a socket")
+    parser.add_argument("--spectators", type=int, default=1, help="extra sockets per game that only watch")
+    parser.add_argument("--bid-rate", type=float, default=0.5, help="bids per second per player")
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured, after the warmup")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before measuring")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connections per server and client process")
+    parser.add_argument("--client-processes", type=int, default=1, help="processes the simulated games are split over")
+    parser.add_argument("--url", help="drive this running server instead of starting one, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--workers", help="start a cluster of this many workers, or one run per count, e.g. 1,2,4")
+    parser.add_argument("--database-url", help="database the cluster workers share (default: SQLite in a temp dir)")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+    if args.workers and args.url:
+        parser.error("--workers starts its own cluster, it can't be combined with --url")
+
+    if args.workers:
+        runs = [asyncio.run(run(args, int(count))) for count in args.workers.split(",")]
+        result = json.dumps({"scaling": [scaling_row(run) for run in runs], "runs": runs}, indent=2)
+    else:
+        result = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(result + "\n")
+    else:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics, and an opt-in sampling profiler.
+
+Metrics are plain counters, gauges and histograms kept in dicts keyed by label values; nothing is exported until
+/metrics is scraped. METRICS_ENABLED=0 turns timed() into a no-op, so the decorated hot paths cost nothing.
+"""
+import asyncio
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally
+from typing import Callable, Iterable
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"  # serves /debug/profile
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LOOP_LAG_INTERVAL = 0.25  # seconds between event loop lag probes
+PROFILE_INTERVAL = 0.005  # seconds between profiler samples
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def remove(self, labels: tuple) -> None:
+        self.values.pop(labels, None)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Gauge:
+    """
+    A value set by the code, or read from collect() when the metrics are scraped. A labelled gauge's collect()
+    returns a value per tuple of label values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], float | dict[tuple, float]] | None = None,
+        labels: tuple[str, ...] = (),
+    ):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self.collect = collect
+        self.labels = labels
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        value = self.collect() if self.collect else self.value
+        if not self.labels:
+            yield f"{self.name} {value}"
+            return
+        for labels, labelled in value.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {labelled}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values: dict[tuple, list] = {}  # labels -> [count per bucket (+Inf last), sum]
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labels + ("le",)
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Counter | Gauge | Histogram] = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+HTTP_SECONDS = REGISTRY.add(
+    Histogram("auction_http_request_seconds", "Time to answer an HTTP request.", ("method", "path", "status"))
+)
+TRACKER_SECONDS = REGISTRY.add(Histogram("auction_tracker_seconds", "Time spent in GameTracker methods.", ("method",)))
+STORAGE_SECONDS = REGISTRY.add(
+    Histogram("auction_storage_seconds", "Time spent saving or loading games.", ("operation",))
+)
+WS_MESSAGES = REGISTRY.add(Counter("auction_ws_messages_sent_total", "Websocket frames sent.", ("game",)))
+WS_BYTES = REGISTRY.add(Counter("auction_ws_bytes_sent_total", "Websocket payload bytes sent.", ("game",)))
+GAMES_EVICTED = REGISTRY.add(Counter("auction_games_evicted_total", "Idle games moved out of memory."))
+GAMES_RESTORED = REGISTRY.add(Counter("auction_games_restored_total", "Games loaded back from storage."))
+LOOP_LAG = REGISTRY.add(
+    Histogram("auction_event_loop_lag_seconds", "How late the event loop ran a callback that was due.")
+)
+TIMER_LATENESS = REGISTRY.add(
+    Histogram("auction_timer_lateness_seconds", "How long after its deadline an auction was finalized.")
+)
+
+
+def timed(histogram: Histogram, *labels: str):
+    """
+    Record every call's duration in histogram. Works on functions and coroutine functions.
+    """
+    def decorate(function):
+        if not METRICS_ENABLED:
+            return function
+
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def timed_coroutine(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, labels)
+            return timed_coroutine
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, labels)
+        return timed_function
+
+    return decorate
+
+
+class HttpMetrics:
+    """
+    ASGI middleware timing every HTTP request, labelled with its route's path template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_and_keep_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_keep_status)
+        finally:
+            path = getattr(scope.get("route"), "path", "unmatched")  # the router fills in scope["route"]
+            HTTP_SECONDS.observe(time.perf_counter() - start, (scope["method"], path, str(status)))
+
+
+async def watch_event_loop(interval: float = LOOP_LAG_INTERVAL) -> None:
+    """
+    Sleep for interval over and over and record how much longer than that each sleep took.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every PROFILE_INTERVAL seconds from a background thread, and reports how
+    often each stack was seen in the collapsed format flame graph tools read ("outer;inner;leaf count").
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Tally[str] = Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+
+if __name__ == "__main__":
+    # microseconds the metrics add per call on the hot paths; the end to end cost is a load test run with
+    # METRICS_ENABLED=0 and again with METRICS_ENABLED=1, compared on server CPU and bid latency
+    #   TOURNAMENT_OFFLINE=1 python -m app.metrics
+    #   METRICS_ENABLED=0 python -m app.loadtest --games 30 --players 4 --bid-rate 0.5 --duration 30
+    from app.game_tracker import GameTracker
+    from app.metrics import REGISTRY as APP_REGISTRY  # the one the app fills, not this script's copy
+    from app.types.types import BidModel
+
+    tracker = GameTracker(2025, "03", ("20", "21"))
+    tracker.add_game("BENCH", "p0", drawSeed=1)
+    tracker.add_player("BENCH", "p1")
+    team = tracker.get_current_team("BENCH")
+    assert team is not None
+    bid = BidModel(gameId="BENCH", player="p1", bid=1, team=team.shortName)
+    check_bid = getattr(GameTracker.check_bid, "__wrapped__", GameTracker.check_bid)  # undecorated when disabled
+
+    histogram = Histogram("bench_seconds", "Benchmark calls.", ("name",))
+    counter = Counter("bench_total", "Benchmark calls.", ("name",))
+
+    def nothing() -> None:
+        pass
+
+    async def nothing_async() -> None:
+        pass
+
+    def drive(coroutine_function: Callable) -> None:
+        # run a coroutine that never suspends without an event loop, so only the wrapper is measured
+        try:
+            coroutine_function().send(None)
+        except StopIteration:
+            pass
+
+    timed_nothing = timed(histogram, "nothing")(nothing)
+    timed_nothing_async = timed(histogram, "nothing_async")(nothing_async)
+    for value in LATENCY_BUCKETS:
+        histogram.observe(value, ("filled",))
+    cases = {
+        "function, bare": nothing,
+        "function, timed": timed_nothing,
+        "coroutine, bare": lambda: drive(nothing_async),
+        "coroutine, timed": lambda: drive(timed_nothing_async),
+        "check_bid, bare": lambda: check_bid(tracker, bid),
+        "check_bid, as served": lambda: tracker.check_bid(bid),
+        "counter inc": lambda: counter.inc(("BENCH",)),
+        "histogram observe": lambda: histogram.observe(0.003, ("BENCH",)),
+    }
+
+    print(f"metrics: {'enabled' if METRICS_ENABLED else 'disabled'}")
+    for name, run in cases.items():
+        rounds = 100_000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            run()
+        elapsed = (time.perf_counter() - start) / rounds * 1e6
+        print(f"{name:40} {elapsed:9.3f} us")
+    rounds = 100
+    start = time.perf_counter()
+    for _ in range(rounds):
+        text = APP_REGISTRY.render()
+    elapsed = (time.perf_counter() - start) / rounds * 1e6
+    print(f"{'/metrics render':40} {elapsed:9.1f} us {len(text):7} bytes")
@@ -1,79 +1,91 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, JSON, Boolean
+import os
+
+from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, JSON, Boolean, Index
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///march_madness.db")
+POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", 5))  # pooled connections kept open (ignored by SQLite)
+MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", 10))  # extra connections allowed under load
+
 Base = declarative_base()
 
 class Game(Base):
     __tablename__ = 'games'
-    
+
     id = Column(String, primary_key=True)
     creator = Column(String, nullable=False)
     current_team_id = Column(Integer, ForeignKey('teams.id'), nullable=True)
     current_bid = Column(Float, default=0.0)
     countdown = Column(Integer, default=30)
-    
+    deadline = Column(Float, nullable=True)  # wall-clock time the current auction closes
+    scoring = Column(JSON, nullable=True)  # ScoringRules, null for the classic +1 per win
+    draw_order = Column(JSON, nullable=True)  # team and bundle names not auctioned yet, the next one last
+
     # Relationships
     players = relationship("Player", back_populates="game", cascade="all, delete-orphan")
     current_team = relationship("Team", foreign_keys=[current_team_id])
-    remaining_teams = relationship("GameTeam", back_populates="game")
+    remaining_teams = relationship("GameTeam", back_populates="game", cascade="all, delete-orphan")
     bid_log = relationship("BidLog", back_populates="game", cascade="all, delete-orphan")
 
 class Player(Base):
     __tablename__ = 'players'
-    
+    __table_args__ = (Index("ix_players_game_id_name", "game_id", "name", unique=True),)
+
     id = Column(Integer, primary_key=True)
     game_id = Column(String, ForeignKey('games.id'), nullable=False)
     name = Column(String, nullable=False)
     balance = Column(Float, default=200.0)  # Default starting balance
-    
+
     # Relationships
     game = relationship("Game", back_populates="players")
-    purchased_teams = relationship("PlayerTeam", back_populates="player")
+    purchased_teams = relationship("PlayerTeam", back_populates="player", cascade="all, delete-orphan")
 
 class Team(Base):
     __tablename__ = 'teams'
-    
+
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    short_name = Column(String, nullable=False)
+    short_name = Column(String, nullable=False, unique=True)
     seed = Column(Integer, nullable=False)
     region = Column(String, nullable=False)
     eliminated = Column(Boolean, default=False)
 
 class GameTeam(Base):
     __tablename__ = 'game_teams'
-    
+
     id = Column(Integer, primary_key=True)
-    game_id = Column(String, ForeignKey('games.id'), nullable=False)
+    game_id = Column(String, ForeignKey('games.id'), nullable=False, index=True)
     team_id = Column(Integer, ForeignKey('teams.id'), nullable=False)
-    
+
     # Relationships
     game = relationship("Game", back_populates="remaining_teams")
     team = relationship("Team")
 
 class PlayerTeam(Base):
     __tablename__ = 'player_teams'
-    
+
     id = Column(Integer, primary_key=True)
-    player_id = Column(Integer, ForeignKey('players.id'), nullable=False)
+    player_id = Column(Integer, ForeignKey('players.id'), nullable=False, index=True)
     team_id = Column(Integer, ForeignKey('teams.id'), nullable=False)
     purchase_price = Column(Float, nullable=False)
-    
+
     # Relationships
     player = relationship("Player", back_populates="purchased_teams")
     team = relationship("Team")
 
 class BidLog(Base):
     __tablename__ = 'bid_logs'
-    
+    __table_args__ = (Index("ix_bid_logs_game_id_team_id", "game_id", "team_id"),)
+
     id = Column(Integer, primary_key=True)
     game_id = Column(String, ForeignKey('games.id'), nullable=False)
     player_id = Column(Integer, ForeignKey('players.id'), nullable=False)
     team_id = Column(Integer, ForeignKey('teams.id'), nullable=False)
     bid_amount = Column(Float, nullable=False)
     timestamp = Column(Float, nullable=False)
-    
+
     # Relationships
     game = relationship("Game", back_populates="bid_log")
     player = relationship("Player")
@@ -84,4 +96,12 @@ def init_db(database_url="sqlite:///march_madness.db"):
     engine = create_engine(database_url)
     Base.metadata.create_all(engine)
     SessionLocal = sessionmaker(bind=engine)
-    return SessionLocal 
\ No newline at end of file
+    return SessionLocal
+
+async def init_async_db(database_url=DATABASE_URL) -> async_sessionmaker[AsyncSession]:
+    # SQLite manages its own connections, every other engine gets a sized pool
+    pool_args = {} if database_url.startswith("sqlite") else {"pool_size": POOL_SIZE, "max_overflow": MAX_OVERFLOW}
+    engine = create_async_engine(database_url, pool_pre_ping=True, **pool_args)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return async_sessionmaker(engine, expire_on_commit=False)
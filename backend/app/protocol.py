@@ -0,0 +1,98 @@
+"""
+Versioned state protocol for /ws/{game_id}.
+
+Server -> client frames:
+    {"type": "snapshot", "epoch": e, "version": n, "state": {...}}  full game state, sent on connect and on resync
+    {"type": "delta", "version": n, "ops": [...]}                   JSON-patch style ops that turn version n-1 into n
+    {"type": "version", "version": n}                               heartbeat so idle clients can detect a missed delta
+    {"type": "ping", "now": t}                                      the client answers "pong"; silent sockets are closed
+    {"type": "batch", "frames": [...]}                              several of the above in one frame, in order
+
+Client -> server frames:
+    {"resync": n}  the client holds version n and wants everything after it
+    "pong"         answer to a ping; any message counts, but a client that sends nothing must answer pings
+
+A client that lost its socket reconnects with ?resume=<epoch>.<version> of the last state it applied. If the
+server still holds that state's history it sends only the deltas after it (or a version frame when nothing was
+missed); after a restart the epoch differs and the client gets a snapshot.
+
+Deadlines are the server's wall-clock time. Every socket gets a ping right after it connects, and pings carry the
+server's time as now, so clients count down against the server's clock rather than their own.
+
+Spectators use the read-only /spectate/{game_id} websocket or /spectate/{game_id}/events (Server-Sent Events, one
+frame per event). They get the same frames, with the deltas of a few updates a second gathered into batches, and
+need not answer pings. Their first frame is a ping with the server's time.
+
+Frames are JSON text, or binary MessagePack for sockets opened with ?encoding=msgpack (see app/encoding.py).
+Ops only address object members ("/players/bob/balance", "/remaining/Duke"); lists are always replaced whole.
+"""
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+VERSION = "version"
+BATCH = "batch"
+PING = "ping"
+
+
+def escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def unescape(key: str) -> str:
+    return key.replace("~1", "/").replace("~0", "~")
+
+
+def replace(path: str, value) -> dict:
+    return {"op": "replace", "path": path, "value": value}
+
+
+def diff(old: dict, new: dict, path: str = "") -> list[dict]:
+    """
+    Ops that turn old into new. Nested objects are diffed member by member, anything else is replaced.
+    """
+    ops: list[dict] = []
+    for key, value in new.items():
+        key_path = f"{path}/{escape(key)}"
+        if key in old and old[key] is value:
+            continue  # shared, unchanged values like the team list
+        if key not in old:
+            ops.append({"op": "add", "path": key_path, "value": value})
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            ops.extend(diff(old[key], value, key_path))
+        elif old[key] != value:
+            ops.append(replace(key_path, value))
+    for key in old:
+        if key not in new:
+            ops.append({"op": "remove", "path": f"{path}/{escape(key)}"})
+    return ops
+
+
+def compact(ops: list[dict]) -> list[dict]:
+    """
+    Drop ops that a later op overwrites (the same path or one of its parents), keeping the rest in order.
+    """
+    covered: set[str] = set()
+    kept = []
+    for op in reversed(ops):
+        path = op["path"]
+        parents = (path[:i] for i, char in enumerate(path) if char == "/" and i)
+        if path not in covered and not any(parent in covered for parent in parents):
+            kept.append(op)
+        covered.add(path)
+    kept.reverse()
+    return kept
+
+
+def apply_patch(state: dict, ops: list[dict]) -> None:
+    """
+    Apply ops to state in place.
+    """
+    for op in ops:
+        keys = [unescape(key) for key in op["path"].split("/")[1:]]
+        parent = state
+        for key in keys[:-1]:
+            parent = parent[key]
+        if op["op"] == "remove":
+            parent.pop(keys[-1], None)
+        else:
+            parent[keys[-1]] = op["value"]
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, cast
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import selectinload
+
+from app.game_tracker import GameTracker
+from app.metrics import STORAGE_SECONDS, timed
+from app.journal import GAME_CREATED, PLAYER_JOINED, BID_PLACED, BID_FINALIZED
+from app.models.database import DATABASE_URL, Game, Player, Team, GameTeam, PlayerTeam, BidLog, init_async_db
+from app.types.types import BidModel, GameInfo, PlayerInfo, ScoringRules, TeamInfo
+
+OPEN_ATTEMPTS = 5
+WRITE_RETRY_SECONDS = float(os.getenv("WRITE_RETRY_SECONDS", 300))  # retrying one write while the database is away
+WRITE_RETRY_MAX_DELAY = 5.0  # cap on the pause between attempts of one write
+# the database being unreachable or overloaded, as opposed to a write it will never accept
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError, OSError)
+
+logger = logging.getLogger(__name__)
+
+
+class GameRepository:
+    """
+    Game state persisted to the models/database.py schema.
+
+    The tracker stays the in-memory working set. Changes are recorded as the same events the journal takes and
+    written in order by one background task, so request handlers never wait on the database. Each event is one
+    transaction; finalizing a bid moves the team, charges the winner and draws the next team atomically.
+    Events recorded inside transaction() are written together in one transaction instead.
+
+    A write that fails because the database is unreachable is retried, and its game counts as writing until it
+    commits, so it is not evicted and reloaded from a stale row. A write that cannot be committed at all marks
+    its game dirty: the stored copy is missing a change, so the game stays in memory for the rest of the process.
+    """
+
+    def __init__(self, database_url: str = DATABASE_URL):
+        self.database_url = database_url
+        self._sessions: async_sessionmaker[AsyncSession] | None = None
+        self._team_ids: dict[str, int] = {}
+        self._teams: dict[int, TeamInfo] = {}
+        self._bundles: dict[str, list[str]] = {}
+        self._pending: asyncio.Queue | None = None
+        self._writer: asyncio.Task | None = None
+        self._unwritten: dict[str, int] = {}  # game id -> queued writes
+        self._grouped: dict[str, list[tuple]] = {}  # game id -> writes gathered by transaction()
+        self.dirty: set[str] = set()  # games with a write that was given up on
+        self._ready = asyncio.Event()  # set once the schema and team catalog are in place
+
+    async def open(self, catalog: dict[str, TeamInfo], bundles: dict[str, list[str]]) -> None:
+        """
+        Create the schema if needed and bulk insert any catalog teams the database does not hold yet.
+        Bundles are stored as teams of their own. Workers starting together race to do this, so the loser
+        retries against what the winner wrote.
+        """
+        self._bundles = bundles
+
+        for attempt in range(OPEN_ATTEMPTS):
+            try:
+                self._sessions = await init_async_db(self.database_url)
+                await self._seed_teams(catalog)
+                break
+            except DBAPIError as e:
+                if attempt == OPEN_ATTEMPTS - 1:
+                    raise
+                logger.warning("Error opening database, retrying: %s", e.orig)
+                await asyncio.sleep(0.1 * (attempt + 1))
+        self._ready.set()
+
+    async def _seed_teams(self, catalog: dict[str, TeamInfo]) -> None:
+        async with self._sessions.begin() as session:
+            known = set((await session.scalars(select(Team.short_name))).all())
+            missing = [
+                {"name": team.urlName, "short_name": name, "seed": team.seed, "region": team.region}
+                for name, team in catalog.items()
+                if name not in known
+            ]
+            if missing:
+                await session.execute(insert(Team), missing)
+            for team in (await session.scalars(select(Team))).all():
+                self._team_ids[team.short_name] = team.id
+                self._teams[team.id] = TeamInfo(
+                    shortName=team.short_name, urlName=team.name, seed=team.seed, region=team.region
+                )
+
+    def record(self, gameId: str, event: dict, tracker: GameTracker) -> None:
+        """
+        Queue the write for an event that was just applied to the tracker, with the parts of the game it changed.
+        """
+        if event["type"] == GAME_CREATED:
+            write = (self._create_game, gameId, tracker.game_info(gameId))
+        elif event["type"] == PLAYER_JOINED:
+            write = (self._add_player, gameId, tracker.get_player_info(gameId, event["player"]))
+        elif event["type"] == BID_PLACED:
+            bid = BidModel(gameId=gameId, player=event["player"], bid=event["bid"], team=event["team"])
+            team = tracker.get_current_team(gameId).shortName
+            write = (self._log_bid, gameId, (bid, team, tracker.get_deadline(gameId)))
+        elif event["type"] == BID_FINALIZED:
+            write = (self._finalize_bid, gameId, tracker.game_info(gameId))
+        else:
+            logger.error("Unknown repository event: %s", event)
+            return
+        if gameId in self._grouped:
+            self._grouped[gameId].append(write)
+        else:
+            self._queue(write)
+
+    @contextmanager
+    def transaction(self, gameId: str):
+        """
+        Write the game's events recorded inside the block in a single transaction, queued when the block ends.
+        """
+        if gameId in self._grouped:
+            yield  # already inside one
+            return
+        self._grouped[gameId] = []
+        try:
+            yield
+        finally:
+            writes = self._grouped.pop(gameId)
+            if writes:
+                self._queue((self._write_all, gameId, writes))
+
+    def _queue(self, write: tuple) -> None:
+        if self._pending is None:
+            self._pending = asyncio.Queue()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run())
+        self._pending.put_nowait(write)
+        self._unwritten[write[1]] = self._unwritten.get(write[1], 0) + 1
+
+    def writing(self, gameId: str) -> bool:
+        """
+        Whether the game has changes queued that are not committed yet, or a change that never will be.
+        """
+        return gameId in self._unwritten or gameId in self.dirty
+
+    async def flush(self) -> None:
+        """
+        Wait until every queued write is committed.
+        """
+        if self._pending is not None:
+            await self._pending.join()
+
+    async def _run(self) -> None:
+        await self._ready.wait()
+        while True:
+            write, gameId, payload = await self._pending.get()
+            try:
+                await self._write(write, gameId, payload)
+            finally:
+                self._unwritten[gameId] -= 1
+                if not self._unwritten[gameId]:
+                    del self._unwritten[gameId]
+                self._pending.task_done()
+
+    async def _write(self, write: Callable[..., Awaitable[None]], gameId: str, payload: Any) -> None:
+        # later writes build on earlier ones, so the queue waits while this one is retried
+        give_up = time.monotonic() + WRITE_RETRY_SECONDS
+        delay = 0.1
+        while True:
+            try:
+                async with self._sessions.begin() as session:
+                    await write(session, gameId, payload)
+                return
+            except TRANSIENT_ERRORS as e:
+                if time.monotonic() + delay > give_up:
+                    logger.error("Gave up writing game %s to the database, keeping it in memory: %s", gameId, e)
+                    break
+                logger.warning("Error writing game %s to the database, retrying in %.1fs: %s", gameId, delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+            except Exception:
+                logger.exception("Error writing game %s to the database, keeping it in memory", gameId)
+                break
+        self.dirty.add(gameId)
+
+    async def _write_all(self, session: AsyncSession, gameId: str, writes: list[tuple]) -> None:
+        for write, _, payload in writes:
+            await write(session, gameId, payload)
+            await session.flush()  # later writes read what earlier ones wrote, e.g. a new player's id
+
+    async def _create_game(self, session: AsyncSession, gameId: str, game: GameInfo) -> None:
+        session.add(
+            Game(
+                id=gameId,
+                creator=game.creator,
+                current_team_id=self._team_ids[game.currentTeam.shortName],
+                current_bid=game.currentBid,
+                countdown=game.countdown,
+                scoring=game.scoring.model_dump() if game.scoring else None,
+                draw_order=game.drawOrder,
+            )
+        )
+        await session.flush()
+        await session.execute(
+            insert(Player), [{"game_id": gameId, "name": p.name, "balance": p.balance} for p in game.players.values()]
+        )
+        await session.execute(
+            insert(GameTeam), [{"game_id": gameId, "team_id": self._team_ids[name]} for name in self._remaining(game)]
+        )
+
+    async def _add_player(self, session: AsyncSession, gameId: str, player: PlayerInfo) -> None:
+        session.add(Player(game_id=gameId, name=player.name, balance=player.balance))
+
+    async def _log_bid(self, session: AsyncSession, gameId: str, payload: tuple[BidModel, str, float | None]) -> None:
+        bid, team_name, deadline = payload
+        player_id = await self._player_id(session, gameId, bid.player)
+        session.add(
+            BidLog(
+                game_id=gameId,
+                player_id=player_id,
+                team_id=self._team_ids[team_name],
+                bid_amount=bid.bid,
+                timestamp=time.time(),
+            )
+        )
+        await session.execute(update(Game).where(Game.id == gameId).values(current_bid=bid.bid, deadline=deadline))
+
+    async def _finalize_bid(self, session: AsyncSession, gameId: str, game: GameInfo) -> None:
+        db_game = await session.get(Game, gameId)
+        sold_id = db_game.current_team_id
+
+        # the winner's new team, at the price of the last bid on it
+        last_bid = await session.scalar(
+            select(BidLog)
+            .where(BidLog.game_id == gameId, BidLog.team_id == sold_id)
+            .order_by(BidLog.id.desc())
+            .limit(1)
+        )
+        if last_bid is not None:
+            await session.execute(
+                update(Player)
+                .where(Player.id == last_bid.player_id)
+                .values(balance=Player.balance - last_bid.bid_amount)
+            )
+            session.add(PlayerTeam(player_id=last_bid.player_id, team_id=sold_id, purchase_price=last_bid.bid_amount))
+
+        # the next team (or every team of a drawn bundle) leaves the remaining pool
+        remaining = [self._team_ids[name] for name in self._remaining(game)]
+        await session.execute(
+            delete(GameTeam).where(GameTeam.game_id == gameId, GameTeam.team_id.not_in(remaining))
+        )
+        db_game.current_team_id = self._team_ids[game.currentTeam.shortName] if game.currentTeam else None
+        db_game.current_bid = game.currentBid
+        db_game.deadline = game.deadline
+        db_game.draw_order = game.drawOrder
+
+    def _remaining(self, game: GameInfo) -> list[str]:
+        # teams not auctioned yet, with bundles expanded to their teams
+        return [name for lot in game.drawOrder for name in self._bundles.get(lot, [lot])]
+
+    async def _player_id(self, session: AsyncSession, gameId: str, name: str) -> int:
+        return await session.scalar(select(Player.id).where(Player.game_id == gameId, Player.name == name))
+
+    async def active_auctions(self) -> dict[str, float]:
+        """
+        Deadline of every game with an auction running, by game id.
+        """
+        await self._ready.wait()
+        async with self._sessions() as session:
+            rows = await session.execute(select(Game.id, Game.deadline).where(Game.deadline.is_not(None)))
+            return {gameId: deadline for gameId, deadline in rows}
+
+    async def game_ids(self) -> list[str]:
+        await self._ready.wait()
+        async with self._sessions() as session:
+            return list((await session.scalars(select(Game.id))).all())
+
+    @timed(STORAGE_SECONDS, "load_game")
+    async def load_game(self, gameId: str) -> GameInfo | None:
+        """
+        Rebuild a game from the database, or None if it was never stored.
+        """
+        await self._ready.wait()
+        async with self._sessions() as session:
+            db_game = await session.scalar(
+                select(Game)
+                .where(Game.id == gameId)
+                .options(selectinload(Game.players).selectinload(Player.purchased_teams))
+            )
+            if db_game is None:
+                return None
+            bids = (
+                await session.execute(
+                    select(Player.name, BidLog.bid_amount)
+                    .join(Player, BidLog.player_id == Player.id)
+                    .where(BidLog.game_id == gameId, BidLog.team_id == db_game.current_team_id)
+                    .order_by(BidLog.id)
+                )
+            ).all()
+
+        players: dict[str, PlayerInfo] = {}
+        for db_player in db_game.players:
+            teams: dict[str, TeamInfo] = {}
+            for owned in db_player.purchased_teams:
+                team = self._teams[owned.team_id].model_copy(update={"purchasePrice": owned.purchase_price})
+                teams[team.shortName] = team
+            players[db_player.name] = PlayerInfo(
+                name=db_player.name, gameId=gameId, balance=db_player.balance, teams=teams
+            )
+
+        current = self._teams.get(db_game.current_team_id)
+        log = [] if current is None else [
+            BidModel(gameId=gameId, player=name, bid=amount, team=current.shortName) for name, amount in bids
+        ]
+        return GameInfo(
+            creator=db_game.creator,
+            players=players,
+            currentBid=db_game.current_bid,
+            countdown=db_game.countdown,
+            deadline=cast(float | None, db_game.deadline),
+            currentTeam=current,
+            drawOrder=cast(list[str], db_game.draw_order or []),
+            log=log,
+            scoring=ScoringRules.model_validate(db_game.scoring) if db_game.scoring else None,
+        )
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import time
+from typing import Callable
+
+from app.bracket import parse_scoreboard, link_bracket
+from app.game_tracker import GameTracker
+from app.scoreboard import ScoreboardProvider, FIXTURE_DIR
+from app.types.types import MatchInfo
+
+# (month, day) of every tournament game day, First Round through the Championship
+TOURNAMENT_DATES: tuple[tuple[str, str], ...] = (
+    ("03", "20"), ("03", "21"), ("03", "22"), ("03", "23"),
+    ("03", "27"), ("03", "28"), ("03", "29"), ("03", "30"),
+    ("04", "05"), ("04", "07"),
+)
+LIVE_POLL_INTERVAL = int(os.getenv("RESULTS_LIVE_POLL_INTERVAL", 30))  # seconds between polls while games are on
+IDLE_POLL_INTERVAL = int(os.getenv("RESULTS_IDLE_POLL_INTERVAL", 15 * 60))  # seconds between polls otherwise
+
+
+class LiveSource:
+    """
+    Polls the scoreboard feed for every tournament day. The cache TTL is the live poll interval, so unchanged
+    days cost a conditional request.
+    """
+
+    def __init__(self, year: int, dates: tuple[tuple[str, str], ...] = TOURNAMENT_DATES):
+        self.year = year
+        self.dates = dates
+        self.provider = ScoreboardProvider(ttl=LIVE_POLL_INTERVAL)
+
+    async def fetch(self) -> dict[str, dict]:
+        months: dict[str, tuple[str, ...]] = {}
+        for month, day in self.dates:
+            months[month] = months.get(month, ()) + (day,)
+
+        scoreboards: dict[str, dict] = {}
+        for month, days in months.items():
+            for day, data in (await self.provider.fetch_days(self.year, month, days)).items():
+                if data is not None:
+                    scoreboards[f"{self.year}-{month}-{day}"] = data
+        return scoreboards
+
+
+class ReplaySource:
+    """
+    Replays recorded scoreboards, one frame per poll, then keeps returning the last frame.
+    """
+
+    def __init__(self, frames: list[dict[str, dict]]):
+        self.frames = frames
+        self.position = 0
+
+    @classmethod
+    def from_fixtures(
+        cls, year: int, dates: tuple[tuple[str, str], ...] = TOURNAMENT_DATES, fixture_dir: str = FIXTURE_DIR
+    ) -> "ReplaySource":
+        """
+        Reveal the bundled scoreboard fixtures one tournament day per frame.
+        """
+        frames: list[dict[str, dict]] = []
+        revealed: dict[str, dict] = {}
+        for month, day in dates:
+            path = os.path.join(fixture_dir, f"{year}-{month}-{day}.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    revealed = {**revealed, f"{year}-{month}-{day}": json.load(f)}
+                frames.append(revealed)
+        return cls(frames)
+
+    async def fetch(self) -> dict[str, dict]:
+        if not self.frames:
+            return {}
+        frame = self.frames[min(self.position, len(self.frames) - 1)]
+        self.position += 1
+        return frame
+
+
+class ResultsIngestor:
+    """
+    Keeps GameTracker.match_results in step with the scoreboard.
+
+    Each poll parses every day, links the matches into the bracket and compares them with what the tracker
+    holds. Only new or changed matches are passed to on_update. Polls run every LIVE_POLL_INTERVAL seconds
+    while a game is scheduled today without a result, and every IDLE_POLL_INTERVAL seconds otherwise.
+    """
+
+    def __init__(
+        self,
+        tracker: GameTracker,
+        source: LiveSource | ReplaySource,
+        on_update: Callable[[list[MatchInfo]], None],
+        live_interval: float = LIVE_POLL_INTERVAL,
+        idle_interval: float = IDLE_POLL_INTERVAL,
+    ):
+        self.tracker = tracker
+        self.source = source
+        self.on_update = on_update
+        self.live_interval = live_interval
+        self.idle_interval = idle_interval
+        self._task: asyncio.Task | None = None
+
+    async def poll_once(self) -> list[MatchInfo]:
+        """
+        Fetch and store the latest results. Returns the matches that are new or changed since the last poll.
+        """
+        scoreboards = await self.source.fetch()
+        parsed: list[MatchInfo] = []
+        for key in sorted(scoreboards):
+            parsed.extend(parse_scoreboard(scoreboards[key]))
+        matches = link_bracket(parsed, self.tracker.teams_master)
+
+        known = {match.id: match for match in self.tracker.match_results}
+        changed = [match for match in matches if known.get(match.id) != match]
+        if changed:
+            self.tracker.update_match_results(changed)
+            self.on_update(changed)
+        return changed
+
+    def is_live(self) -> bool:
+        today = time.strftime("%m/%d/%Y")
+        return any(match.startDate == today and not match.winner for match in self.tracker.match_results)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"ERROR INGESTING MATCH RESULTS: {e}")
+            await asyncio.sleep(self.live_interval if self.is_live() else self.idle_interval)
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+SCOREBOARD_URL = os.getenv(
+    "SCOREBOARD_URL",
+    "https://data.ncaa.com/casablanca/scoreboard/basketball-men/d1/{year}/{month}/{day}/scoreboard.json",
+)
+CACHE_DIR = "app/cache/scoreboard"
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "scoreboard")
+CACHE_TTL = int(os.getenv("TOURNAMENT_CACHE_TTL", 6 * 60 * 60))  # seconds before a cached day is revalidated
+OFFLINE = os.getenv("TOURNAMENT_OFFLINE", "0") == "1"  # never touch the network, serve cache or fixtures
+REQUEST_TIMEOUT = 10  # seconds
+MAX_CONNECTIONS = 10  # pooled connections shared by all concurrent day fetches
+RETRIES = 2  # extra attempts after a connection error or 5xx
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled for each one after it
+
+
+def compact_scoreboard(data: dict) -> dict:
+    """
+    Keep only the scoreboard fields the app reads, in the same shape as the feed.
+    """
+    games = []
+    for game in data.get("games", []):
+        game = game.get("game", {})
+        games.append(
+            {
+                "game": {
+                    "gameState": game.get("gameState"),
+                    "bracketRegion": game.get("bracketRegion"),
+                    "bracketRound": game.get("bracketRound"),
+                    "startDate": game.get("startDate"),
+                    "away": _compact_team(game.get("away", {})),
+                    "home": _compact_team(game.get("home", {})),
+                }
+            }
+        )
+    return {"games": games}
+
+
+def _compact_team(team: dict) -> dict:
+    names = team.get("names", {})
+    return {
+        "names": {"short": names.get("short"), "seo": names.get("seo")},
+        "seed": team.get("seed"),
+        "winner": team.get("winner"),
+    }
+
+
+class ScoreboardProvider:
+    """
+    Scoreboard JSON per tournament day, read through an on-disk cache.
+
+    A cached day younger than ttl is served as is. Every stale or missing day is fetched concurrently over one
+    pooled HTTP client, and a day we already hold is revalidated with ETag / Last-Modified so an unchanged day
+    costs a 304. When the feed is unreachable, or in offline mode, the provider falls back to the stale cache
+    and then to the fixtures bundled with the app.
+    """
+
+    def __init__(
+        self,
+        url: str = SCOREBOARD_URL,
+        cache_dir: str = CACHE_DIR,
+        fixture_dir: str = FIXTURE_DIR,
+        ttl: int = CACHE_TTL,
+        offline: bool = OFFLINE,
+    ):
+        self.url = url
+        self.cache_dir = cache_dir
+        self.fixture_dir = fixture_dir
+        self.ttl = ttl
+        self.offline = offline
+
+    def get(self, year: int, month: str, day: str) -> dict | None:
+        return self.get_many(year, month, (day,))[day]
+
+    def get_many(self, year: int, month: str, days: tuple[str, ...]) -> dict[str, dict | None]:
+        """
+        Blocking wrapper around fetch_days for synchronous callers.
+        """
+        coroutine = self.fetch_days(year, month, days)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        # called from inside an event loop, run the fetch on a loop of its own
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coroutine).result()
+
+    async def fetch_days(self, year: int, month: str, days: tuple[str, ...]) -> dict[str, dict | None]:
+        """
+        Scoreboard for each day, fetching everything that is not fresh in the cache in one concurrent round.
+        """
+        results: dict[str, dict | None] = {}
+        stale: dict[str, dict | None] = {}
+        for day in days:
+            cached = self._read_cache(self._key(year, month, day))
+            if cached and time.time() - cached["fetched"] < self.ttl:
+                results[day] = cached["data"]
+            else:
+                stale[day] = cached
+
+        if stale and not self.offline:
+            limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits) as client:
+                fetched = await asyncio.gather(
+                    *(self._fetch(client, year, month, day, cached) for day, cached in stale.items())
+                )
+            for day, data in zip(stale, fetched):
+                if data is not None:
+                    results[day] = data
+
+        for day, cached in stale.items():
+            if day not in results:
+                results[day] = cached["data"] if cached else self._read_fixture(self._key(year, month, day))
+        return results
+
+    def _key(self, year: int, month: str, day: str) -> str:
+        return f"{year}-{month}-{day}"
+
+    async def _fetch(
+        self, client: httpx.AsyncClient, year: int, month: str, day: str, cached: dict | None
+    ) -> dict | None:
+        url = self.url.format(year=year, month=month, day=day)
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("lastModified"):
+            headers["If-Modified-Since"] = cached["lastModified"]
+
+        response = None
+        for attempt in range(RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.TransportError as e:
+                print(f"ERROR READING URL: {url}: {e!r}")
+                response = None
+                continue
+            if response.status_code < 500:
+                break
+            print(f"ERROR READING URL: {url}: {response.status_code}")
+
+        key = self._key(year, month, day)
+        if response is None:
+            return None
+        if response.status_code == 304 and cached:
+            self._write_cache(key, cached["data"], cached.get("etag"), cached.get("lastModified"))
+            return cached["data"]
+        if response.status_code != 200:
+            print(f"ERROR READING URL: {url}: {response.status_code}")
+            return None
+
+        data = compact_scoreboard(response.json())
+        self._write_cache(key, data, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return data
+
+    def _read_cache(self, key: str) -> dict | None:
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, key: str, data: dict, etag: str | None, last_modified: str | None) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        entry = {"fetched": time.time(), "etag": etag, "lastModified": last_modified, "data": data}
+        with open(path + ".tmp", "w") as f:
+            json.dump(entry, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    def _read_fixture(self, key: str) -> dict | None:
+        path = os.path.join(self.fixture_dir, f"{key}.json")
+        if not os.path.exists(path):
+            print(f"NO SCOREBOARD DATA FOR {key}")
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+
+# Shared provider used by the bracket helpers
+scoreboard = ScoreboardProvider()
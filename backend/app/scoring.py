@@ -0,0 +1,79 @@
+import numpy as np
+
+from app.bracket import round_index
+from app.catalog import GameState, TeamCatalog
+from app.types.types import MatchInfo, ScoringRules, TeamInfo
+
+ROUNDS = 6  # First Round through the Championship
+
+
+class WinMatrix:
+    """
+    Tournament results as arrays over the team catalog: wins[t, r] is 1 when team t won its round r game and
+    upsets[t, r] is how many seed lines better the team it beat was.
+    """
+
+    def __init__(self, teams: dict[str, TeamInfo], matches: list[MatchInfo]):
+        self.names = list(teams)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.seeds = np.array([team.seed for team in teams.values()], dtype=np.float64)
+        self.wins = np.zeros((len(self.names), ROUNDS))
+        self.upsets = np.zeros((len(self.names), ROUNDS))
+
+        for match in matches:
+            bracket_round = round_index(match.roundName)
+            if not match.winner or bracket_round is None:
+                continue
+            winner, loser = match.participants
+            if winner.shortName != match.winner:
+                winner, loser = loser, winner
+            if winner.shortName not in self.index:
+                continue
+            self.wins[self.index[winner.shortName], bracket_round] += 1
+            self.upsets[self.index[winner.shortName], bracket_round] += max(0, winner.seed - loser.seed)
+
+
+def compile_rules(rules: ScoringRules, matrix: WinMatrix) -> np.ndarray:
+    """
+    Points per catalog team under a rule set: every rule is a weight on the wins or upsets matrix.
+    """
+    per_win = rules.winPoints + np.asarray(rules.roundWeights, dtype=np.float64)[None, :]
+    per_win = per_win + rules.seedFactor * matrix.seeds[:, None]
+    return (matrix.wins * per_win).sum(axis=1) + rules.upsetBonus * matrix.upsets.sum(axis=1)
+
+
+def score_games(
+    games: dict[str, GameState], matrix: WinMatrix, catalog: TeamCatalog
+) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    Standings for many games at once. Games are grouped by rule set; a rule set's team points become points per
+    lot through the catalog, and one bincount over the owner arrays of every game in the group sums them into
+    per-player totals. matrix must be built over the catalog's teams, in the same order.
+
+    :return: { game_id: (points per lot id, points per player index) }
+    """
+    groups: dict[str, list[str]] = {}
+    for game_id, game in games.items():
+        groups.setdefault((game.scoring or ScoringRules()).model_dump_json(), []).append(game_id)
+
+    lot_count = len(catalog.lots)
+    standings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    for rules_json, game_ids in groups.items():
+        rules = ScoringRules.model_validate_json(rules_json)
+        lot_points = catalog.membership @ compile_rules(rules, matrix)  # owning a bundle means owning its teams
+
+        sizes = np.array([len(games[game_id].names) for game_id in game_ids])
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        owner = np.concatenate([np.frombuffer(games[game_id].owner, dtype=np.uint16) for game_id in game_ids])
+        sold = owner > 0
+        rows = (owner.astype(np.int64) - 1 + np.repeat(offsets, lot_count))[sold]  # buyer's row over all games
+
+        points = np.bincount(rows, weights=np.tile(lot_points, len(game_ids))[sold], minlength=sizes.sum())
+        if rules.perDollar:
+            prices = np.concatenate([np.frombuffer(games[game_id].prices, dtype=np.float32) for game_id in game_ids])
+            spent = np.bincount(rows, weights=prices[sold], minlength=sizes.sum())
+            points = np.divide(points, spent, out=np.zeros_like(points), where=spent > 0)
+
+        for game_id, offset, size in zip(game_ids, offsets, sizes):
+            standings[game_id] = (lot_points, points[offset:offset + size])
+    return standings
@@ -0,0 +1,188 @@
+"""
+Read-only game streams for spectators, over a websocket or Server-Sent Events.
+
+All spectators of a game share one stream. At most SPECTATOR_RATE times a second it gathers the hub's deltas
+since its last update into one batch frame, encoded once as JSON and once as an SSE event, and wakes every
+spectator to send those same strings. Spectators have no send queue, task or encoding of their own: each
+connection's handler waits for the next update and sends it. A spectator that missed an update, because its
+socket was slow, gets the hub's cached snapshot next, so slow spectators skip states instead of buffering them.
+A quiet game pings its spectators every HEARTBEAT_INTERVAL, which is how closed connections are noticed. Every
+spectator's first frame is a ping with the server's time, which countdowns run against.
+"""
+import asyncio
+import os
+import time
+from typing import AsyncIterator
+
+from app.broadcast import HEARTBEAT_INTERVAL, GameHub, batch_frame, clock_frame
+from app.encoding import JSON, Encoded, encode
+from app.protocol import PING
+
+SPECTATOR_RATE = float(os.getenv("SPECTATOR_RATE", 4))  # updates per second at most, each with every change since
+PING_EVENT = ": ping\n\n"  # an SSE comment, ignored by EventSource
+
+
+def json_text(encoded: Encoded) -> str:
+    # spectators are always sent JSON, which encodes to str; only msgpack gives bytes
+    return encoded.decode() if isinstance(encoded, bytes) else encoded
+
+
+PING_TEXT = json_text(encode({"type": PING}))
+
+
+def sse_event(epoch: str, version: int, data: str) -> str:
+    # the id lets a reconnecting EventSource resume with the Last-Event-ID header
+    return f"id: {epoch}.{version}\ndata: {data}\n\n"
+
+
+class SpectatorStream:
+    """
+    One game's spectator updates, coalesced to the configured rate.
+    """
+
+    def __init__(self, hub: GameHub, rate: float = SPECTATOR_RATE):
+        self.hub = hub
+        self.interval = 1 / rate
+        self.spectators = 0
+        self.base = hub.version  # the last update carries the deltas after base ...
+        self.version = hub.version  # ... up to version
+        self._ping = False  # the last wakeup was a ping, not an update
+        self._update: tuple[str, str] | None = None  # the last update as JSON and as an SSE event, None: snapshot
+        self._snapshot: tuple[int, str, str] | None = None  # hub version, snapshot JSON, snapshot SSE event
+        self._ready = asyncio.Event()  # set and replaced with every update
+        self._closed = False
+        self._task: asyncio.Task | None = None
+
+    async def follow(self, resume: str | None = None, sse: bool = False) -> AsyncIterator[str]:
+        """
+        Everything one spectator is sent, as JSON text or SSE events: the server's time, a snapshot unless the
+        resume token is current, then one frame per update until the stream closes.
+        """
+        self.spectators += 1
+        self._ensure_running()
+        try:
+            clock = json_text(clock_frame().encoded(JSON))
+            yield f"data: {clock}\n\n" if sse else clock  # no id, so it does not move the SSE resume point
+            version = self.hub.resume_version(resume)
+            if version is None or version < self.version:
+                version = self.hub.version
+                yield self._snapshot_text(sse)
+            while True:
+                ready = self._ready
+                await ready.wait()
+                if self._closed:
+                    return
+                if self._ping:
+                    yield PING_EVENT if sse else PING_TEXT
+                    continue
+                if version >= self.version:
+                    continue  # already holds this state, e.g. from the snapshot it started with
+                update = self._update
+                if version >= self.base and update is not None:
+                    version = self.version
+                    yield update[1] if sse else update[0]
+                else:
+                    version = self.hub.version
+                    yield self._snapshot_text(sse)
+        finally:
+            self.spectators -= 1
+
+    def close(self) -> None:
+        self._closed = True
+        self._ready.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _snapshot_text(self, sse: bool) -> str:
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != self.hub.version:
+            text = json_text(self.hub.snapshot_frame(JSON).encoded(JSON))
+            snapshot = self._snapshot = (self.hub.version, text, sse_event(self.hub.epoch, self.hub.version, text))
+        return snapshot[2] if sse else snapshot[1]
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self.base = self.version = self.hub.version
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        woken = time.monotonic()
+        while self.spectators:
+            await asyncio.sleep(self.interval)
+            self._ping = self.hub.version == self.version
+            if self._ping and time.monotonic() - woken < HEARTBEAT_INTERVAL:
+                continue
+            if not self._ping:
+                frames = self.hub.deltas_after(self.version)
+                self.base, self.version = self.version, self.hub.version
+                if frames is None:
+                    self._update = None  # more changes than the hub's history holds
+                else:
+                    text = json_text(batch_frame([frame.encoded(JSON) for frame in frames]))
+                    self._update = (text, sse_event(self.hub.epoch, self.version, text))
+            woken = time.monotonic()
+            ready, self._ready = self._ready, asyncio.Event()
+            ready.set()
+
+
+if __name__ == "__main__":
+    # CPU share of one core while many spectators watch one game, against the same sockets as player subscribers
+    #   python -m app.spectators
+    from app.broadcast import SEND_TIMEOUT
+    from app.protocol import replace
+
+    SECONDS = 5
+    RUNS = ((2000, 10, True), (2000, 50, True), (2000, 200, True), (5000, 50, True), (2000, 50, False))
+
+    class Sink:
+        # a socket that takes every frame at once
+        def __init__(self):
+            self.frames = 0
+
+        async def send_text(self, text: str) -> None:
+            self.frames += 1
+
+        async def send_bytes(self, data: bytes) -> None:
+            self.frames += 1
+
+        async def close(self, code: int = 1000) -> None:
+            pass
+
+    def game_state() -> dict:
+        players = {f"p{number}": {"name": f"p{number}", "balance": 200, "teams": []} for number in range(8)}
+        remaining = {f"Team {number}": {"shortName": f"Team {number}", "seed": number % 16 + 1} for number in range(64)}
+        return {"players": players, "bid": 0, "remaining": remaining, "deadline": None}
+
+    async def watch(sockets: int, deltas: float, spectate: bool) -> tuple[float, int]:
+        hub = GameHub("BENCH", snapshot=game_state)
+        sinks = [Sink() for _ in range(sockets)]
+        stream = SpectatorStream(hub)
+
+        async def spectator(sink: Sink) -> None:
+            # what the /spectate handler does for each socket
+            async for text in stream.follow():
+                await asyncio.wait_for(sink.send_text(text), SEND_TIMEOUT)
+
+        tasks = [asyncio.create_task(spectator(sink)) for sink in sinks] if spectate else []
+        if not spectate:
+            for sink in sinks:
+                hub.subscribe(sink)  # type: ignore[arg-type]
+        await asyncio.sleep(1)  # connected and caught up
+
+        start, cpu, bid = time.monotonic(), time.process_time(), 0
+        while time.monotonic() - start < SECONDS:
+            bid += 1
+            hub.publish([replace("/bid", bid), replace("/deadline", time.time() + 15)])
+            await asyncio.sleep(1 / deltas)
+        share = (time.process_time() - cpu) / (time.monotonic() - start)
+        stream.close()
+        hub.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return share, sum(sink.frames for sink in sinks)
+
+    print(f"{SECONDS}s per run, spectators at {SPECTATOR_RATE:g} updates/s")
+    for sockets, deltas, spectate in RUNS:  # sockets, deltas published per second, spectators or subscribers
+        share, frames = asyncio.run(watch(sockets, deltas, spectate))
+        kind = "spectators" if spectate else "subscribers"
+        print(f"{sockets:5} {kind:12} {deltas:4} deltas/s {share:7.1%} cpu {frames:9} frames")
@@ -0,0 +1,70 @@
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable
+
+from app.metrics import TIMER_LATENESS
+
+
+class AuctionTimers:
+    """
+    One scheduler task for every game's auction deadline.
+
+    Deadlines live on the monotonic clock in a heap. Extending a deadline pushes a new heap entry and leaves
+    the old one to be skipped when it surfaces, so a burst of bids costs a heap push each instead of a task.
+    on_expire is awaited exactly once per armed deadline.
+    """
+
+    def __init__(self, on_expire: Callable[[str], Awaitable[None]]):
+        self.deadlines: dict[str, float] = {}
+        self._on_expire = on_expire
+        self._heap: list[tuple[float, str]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def arm(self, game_id: str, seconds: float) -> float:
+        """
+        (Re)start a game's countdown. Returns the new deadline as wall-clock time for clients.
+        """
+        deadline = time.monotonic() + seconds
+        self.deadlines[game_id] = deadline
+        heapq.heappush(self._heap, (deadline, game_id))
+        self._ensure_running()
+        self._wakeup.set()
+        return time.time() + seconds
+
+    def cancel(self, game_id: str) -> None:
+        self.deadlines.pop(game_id, None)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(self._wakeup))
+
+    async def _run(self, wakeup: asyncio.Event) -> None:
+        while True:
+            # drop entries superseded by a later arm() or cancel()
+            while self._heap and self.deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            wakeup.clear()
+            if not self._heap:
+                await wakeup.wait()
+                continue
+
+            deadline, game_id = self._heap[0]
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self.deadlines[game_id]
+            TIMER_LATENESS.observe(-delay)
+            try:
+                await self._on_expire(game_id)
+            except Exception as e:
+                print(f"ERROR FINALIZING BID FOR GAME {game_id}: {e}")
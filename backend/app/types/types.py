@@ -1,10 +1,28 @@
+import os
+import re
+import string
 from typing import List
 from pydantic import BaseModel
 
 GAME_ID_NUM_CHAR = 6
+GAME_ID_CHARS = string.ascii_uppercase + string.digits
 INITIAL_COUNTDOWN = 10
 INITIAL_BID = 0
 INITIAL_BALANCE = 100
+BUNDLE_RULES = os.getenv("BUNDLE_RULES", "15:4,16:4")  # "seed:teams per bundle,...", "" auctions every team alone
+
+# Game states
+LOBBY = "lobby"  # created, the first team has not been bid on yet
+AUCTIONING = "auctioning"
+COMPLETE = "complete"  # every team has been auctioned, points still change with the results
+ARCHIVED = "archived"  # evicted from memory to storage, loaded back on its next use
+
+
+def valid_game_id(game_id: str) -> bool:
+    """
+    Whether game_id has the shape of a generated id. Ids name files and rows, so check them before any lookup.
+    """
+    return re.fullmatch(f"[{GAME_ID_CHARS}]{{{GAME_ID_NUM_CHAR}}}", game_id) is not None
 
 
 def jsonify_dict(input: dict[str, BaseModel]) -> dict:
@@ -15,8 +33,23 @@ def jsonify_list(input: list[BaseModel]) -> list:
     return [v.model_dump() for v in input]
 
 
+class ScoringRules(BaseModel):
+    """
+    Points a team earns per win: winPoints, plus roundWeights[round], plus seedFactor * its seed, plus upsetBonus per
+    seed line between it and a better seeded team it beat. perDollar divides a player's total by what they spent.
+    A bundle earns what its teams earn. The defaults are the classic rules, the same as no rule set: +1 per win.
+    """
+    winPoints: float = 1
+    roundWeights: List[float] = [0, 0, 0, 0, 0, 0]  # First Round through the Championship
+    seedFactor: float = 0
+    upsetBonus: float = 0
+    perDollar: bool = False
+
+
 class CreateModel(BaseModel):
     player: str
+    scoring: ScoringRules | None = None
+    drawSeed: int | None = None  # fixes the order teams come up for auction
 
 
 class JoinModel(BaseModel):
@@ -35,19 +68,35 @@ class BidModel(BaseModel):
     team: str
 
 
+class BatchCommand(BaseModel):
+    op: str  # "create", "join" or "bid"
+    gameId: str | None = None  # a game id, or the ref of a create earlier in the same batch
+    ref: str | None = None  # create: a name later commands in the batch use as gameId
+    player: str
+    bid: int | None = None
+    team: str | None = None
+    scoring: ScoringRules | None = None
+    drawSeed: int | None = None
+
+
+class BatchModel(BaseModel):
+    commands: List[BatchCommand]
+    id: int | str | None = None  # echoed in the reply on the /commands websocket
+
+
 class TeamInfo(BaseModel):
     shortName: str
     urlName: str
     seed: int
     region: str
     purchasePrice: float|None = None
-    points: int|None = None
+    points: float|None = None
 
 class PlayerInfo(BaseModel):
     name: str
     gameId: str
     balance: int = INITIAL_BALANCE
-    points: int = 0
+    points: float = 0
     teams: dict[str, TeamInfo] = {}
 
 
@@ -56,9 +105,11 @@ class GameInfo(BaseModel):
     players: dict[str, PlayerInfo] = {}
     currentBid: float = INITIAL_BID
     countdown: float = INITIAL_COUNTDOWN
-    currentTeam: TeamInfo = None
-    teams: dict[str, TeamInfo] = {}
+    deadline: float | None = None  # wall-clock time the current auction closes, None until the first bid
+    currentTeam: TeamInfo | None = None
+    drawOrder: List[str] = []  # teams and bundles not auctioned yet, the next one last
     log: List[BidModel] = []
+    scoring: ScoringRules | None = None  # None is the classic +1 per win
 
 
 class MatchInfo(BaseModel):
@@ -0,0 +1,101 @@
+import asyncio
+import importlib
+import os
+import random
+import tempfile
+
+os.environ.setdefault("TOURNAMENT_OFFLINE", "1")  # the bundled scoreboard fixtures, never the network
+STORAGE_DIR = tempfile.mkdtemp(prefix="auction-tests-")  # journal and bid archive of the app the tests import
+os.environ.setdefault("JOURNAL_DIR", os.path.join(STORAGE_DIR, "journal"))
+os.environ.setdefault("ANALYTICS_DB", os.path.join(STORAGE_DIR, "bids.sqlite"))
+
+import pytest
+
+from app.bracket import link_bracket, parse_scoreboard
+from app.game_tracker import GameTracker
+from app.results import ReplaySource
+from app.simulation import bracket_slots
+from app.types.types import BidModel, MatchInfo, TeamInfo
+
+ROUND_NAMES = ("First Round", "Second Round", "Sweet 16", "Elite Eight", "Final Four", "Championship")
+
+
+def new_tracker(bundle_rules: dict[int, int] | None = None) -> GameTracker:
+    return GameTracker(year=2025, month="03", day=("20", "21"), bundle_rules=bundle_rules)
+
+
+@pytest.fixture
+def tracker() -> GameTracker:
+    return new_tracker()
+
+
+@pytest.fixture(scope="session")
+def results() -> list[MatchInfo]:
+    """
+    The First Round results in the bundled fixtures, linked into the bracket.
+    """
+    days = asyncio.run(ReplaySource.from_fixtures(2025).fetch())
+    matches = [match for day in sorted(days) for match in parse_scoreboard(days[day])]
+    return link_bracket(matches, new_tracker().teams_master)
+
+
+def result(match_id: int, winner: TeamInfo, loser: TeamInfo, round_name: str = "First Round") -> MatchInfo:
+    return MatchInfo(
+        id=match_id,
+        nextMatchId=None,
+        roundName=round_name,
+        participants=[winner, loser],
+        winner=winner.shortName,
+        startDate="03/20/2025",
+    )
+
+
+def played_bracket(tracker: GameTracker, rng: random.Random, rounds: int = len(ROUND_NAMES)) -> list[MatchInfo]:
+    """
+    Results for the first rounds of the fixture field's bracket, every game won by a coin flip.
+    """
+    field = [tracker.catalog.teams[team] for team in bracket_slots(tracker.catalog)]
+    matches = []
+    for round_name in ROUND_NAMES[:rounds]:
+        winners = []
+        for top, bottom in zip(field[0::2], field[1::2]):
+            winner, loser = (top, bottom) if rng.random() < 0.5 else (bottom, top)
+            matches.append(result(len(matches) + 1, winner, loser, round_name))
+            winners.append(winner)
+        field = winners
+    return matches
+
+
+def bid(tracker: GameTracker, gameId: str, player: str, amount: int) -> BidModel:
+    """
+    Place a bid on the lot up for auction.
+    """
+    bid_model = BidModel(gameId=gameId, player=player, bid=amount, team=tracker.get_current_team(gameId).shortName)
+    tracker.place_bid(bid_model)
+    return bid_model
+
+
+def auction_everything(tracker: GameTracker, gameId: str, price: int = 1) -> None:
+    """
+    Sell every lot of a game, the players taking turns as the only bidder.
+    """
+    names = list(tracker.games[gameId].players)
+    turn = 0
+    while tracker.get_current_team(gameId) is not None:
+        bid(tracker, gameId, names[turn % len(names)], price)
+        tracker.finalize_bid(gameId)
+        turn += 1
+
+
+@pytest.fixture(scope="session")
+def api():
+    """
+    The app module, started with a test client in api.client. Games it creates stay in its tracker.
+    """
+    os.environ.update(RESULTS_SOURCE="off", SIMULATIONS="100")
+    from fastapi.testclient import TestClient
+
+    api = importlib.import_module("app.api")
+    with TestClient(api.app) as client:
+        api.client = client
+        yield api
@@ -0,0 +1,83 @@
+import csv
+
+import pytest
+
+from app.analytics import BidArchive
+
+# (game, team, seed, region, player, price, bids, at)
+SALES = [
+    ("GAME01", "Duke", 1, "East", "alice", 40.0, 3, 100.0),
+    ("GAME01", "Yale", 13, "East", "bob", 2.0, 1, 160.0),
+    ("GAME02", "Duke", 1, "East", "carol", 60.0, 5, 200.0),
+    ("GAME01", "Iowa", 1, "West", "alice", 20.0, 2, 230.0),
+]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = BidArchive(str(tmp_path / "bids.sqlite"))
+    for gameId, team, seed, region, player, price, bids, at in SALES:
+        for step in range(bids):
+            amount = price - (bids - 1 - step)
+            archive.record_bid(gameId, team, seed, region, player, amount, at - 10 * (bids - 1 - step))
+        archive.record_sale(gameId, team, seed, region, player, price, bids, at)
+    archive.flush()
+    yield archive
+    archive.close()
+
+
+def test_market_totals_follow_every_sale(archive):
+    market = {row["team"]: row for row in archive.market()}
+    assert list(market) == ["Duke", "Iowa", "Yale"]  # by seed, then team
+    duke = {"team": "Duke", "seed": 1, "region": "East", "sales": 2, "average": 50.0, "low": 40.0, "high": 60.0}
+    assert market["Duke"] == {**duke, "last": 60.0}
+    assert archive.seed_prices() == [
+        {"seed": 1, "sales": 3, "average": 40.0, "low": 20.0, "high": 60.0},
+        {"seed": 13, "sales": 1, "average": 2.0, "low": 2.0, "high": 2.0},
+    ]
+
+
+def test_team_prices_list_the_latest_sales_oldest_first(archive):
+    prices = archive.team_prices("Duke")
+    assert prices["market"]["sales"] == 2
+    assert [(sale["gameId"], sale["price"]) for sale in prices["sales"]] == [("GAME01", 40.0), ("GAME02", 60.0)]
+    assert [sale["price"] for sale in archive.team_prices("Duke", limit=1)["sales"]] == [60.0]
+    assert archive.team_prices("Kansas") == {"team": "Kansas", "market": None, "sales": []}
+
+
+def test_bid_velocity_and_spend_curve(archive):
+    # GAME01 bids at 80, 90, 100 (Duke), 160 (Yale), 220, 230 (Iowa)
+    assert archive.bid_velocity("GAME01", bucket=60) == [
+        {"at": 60, "bids": 3, "highest": 40.0},
+        {"at": 120, "bids": 1, "highest": 2.0},
+        {"at": 180, "bids": 2, "highest": 20.0},
+    ]
+    assert [(row["team"], row["spent"]) for row in archive.spend_curve("GAME01", "alice")] == [
+        ("Duke", 40.0),
+        ("Iowa", 60.0),
+    ]
+    assert archive.spend_curve("GAME02", "alice") == []
+
+
+def test_export_writes_the_whole_table(archive, tmp_path):
+    path = archive.export("sales", str(tmp_path / "sales.csv"))
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["game_id", "team", "seed", "region", "player", "price", "bids", "at"]
+    assert len(rows) == 1 + len(SALES)
+
+    with pytest.raises(ValueError):
+        archive.export("team_market", str(tmp_path / "market.csv"))
+    with pytest.raises(ValueError):
+        archive.export("bids", str(tmp_path / "bids.json"), format="json")
+
+
+def test_close_commits_what_is_still_queued(tmp_path):
+    archive = BidArchive(str(tmp_path / "bids.sqlite"))
+    archive.record_sale("GAME01", "Duke", 1, "East", "alice", 40.0, 1, 100.0)
+    archive.close()
+    archive.close()  # closing twice is harmless
+
+    reopened = BidArchive(archive.path)
+    assert [row["sales"] for row in reopened.market()] == [1]
+    reopened.close()
@@ -0,0 +1,62 @@
+import contextlib
+
+from app.journal import GAME_CREATED, PLAYER_JOINED
+
+CREATE = {"op": "create", "ref": "g", "player": "alice"}
+JOIN = {"op": "join", "gameId": "g", "player": "bob"}
+
+
+def post_batch(api, *commands):
+    response = api.client.post("/batch/", json={"commands": list(commands)})
+    assert response.status_code == 200
+    return response.json()["results"]
+
+
+def test_batch_creates_and_joins_by_ref(api):
+    results = post_batch(
+        api,
+        {"op": "create", "ref": "league", "player": "alice"},
+        {"op": "join", "gameId": "league", "player": "bob"},
+        {"op": "join", "gameId": "league", "player": "bob"},
+        {"op": "join", "gameId": "../../league", "player": "carol"},
+    )
+    game_id = results[0]["gameId"]
+    assert [result["ok"] for result in results] == [True, True, False, False]
+    assert results[2]["detail"] == "Player name already taken in this game"
+    assert results[3]["detail"] == "Game ID not found"
+    assert set(api.gameTracker.games[game_id].players) == {"alice", "bob"}
+
+
+def test_batch_create_is_written_in_the_game_transaction(api, monkeypatch):
+    grouped = set()
+    recorded = []
+
+    @contextlib.contextmanager
+    def transaction(game_id):
+        grouped.add(game_id)
+        yield
+        grouped.discard(game_id)
+
+    def record(game_id, event):
+        recorded.append((event["type"], game_id in grouped))
+
+    monkeypatch.setattr(api, "GAME_STORE", "database")
+    monkeypatch.setattr(api.repository, "transaction", transaction)
+    monkeypatch.setattr(api, "record_event", record)
+    post_batch(api, CREATE, JOIN)
+    assert recorded == [(GAME_CREATED, True), (PLAYER_JOINED, True)]
+
+
+def test_batch_reports_a_rejected_create(api, monkeypatch):
+    apply_game_event = api.apply_game_event
+
+    async def reject_creates(game_id, event):
+        if event["type"] == GAME_CREATED:
+            return "No more games today"
+        return await apply_game_event(game_id, event)
+
+    monkeypatch.setattr(api, "apply_game_event", reject_creates)
+    results = post_batch(api, CREATE, JOIN)
+    assert results[0] == {"ok": False, "gameId": results[0]["gameId"], "detail": "No more games today"}
+    assert results[1]["ok"] is False and results[1]["detail"] == "Game ID not found"
+    assert results[0]["gameId"] not in api.gameTracker.games
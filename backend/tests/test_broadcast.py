@@ -0,0 +1,264 @@
+import asyncio
+import copy
+import json
+
+import pytest
+
+from app import broadcast
+from app.broadcast import GameHub
+from app.protocol import BATCH, DELTA, PING, SNAPSHOT, VERSION, apply_patch, compact, diff, replace
+
+
+class FakeSocket:
+    """
+    Stands in for a websocket: records every frame sent to it and the code it was closed with. Sends wait for
+    the gate while it is closed, like a client that stopped reading.
+    """
+
+    def __init__(self):
+        self.sent: list[dict] = []
+        self.closed: int | None = None
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_text(self, text: str) -> None:
+        await self.gate.wait()
+        self.sent.extend(frames(json.loads(text)) if text.startswith("{") else [{"type": text}])
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed = code
+
+    def of_type(self, kind: str) -> list[dict]:
+        return [frame for frame in self.sent if frame["type"] == kind]
+
+
+def new_hub() -> GameHub:
+    return GameHub("GAME01", snapshot=lambda: {"bid": 0, "players": {"alice": {"balance": 200}}, "remaining": {}})
+
+
+def frames(message: dict) -> list[dict]:
+    """
+    The frames in a message, with batches (which may hold batches themselves) unwrapped.
+    """
+    if message["type"] != BATCH:
+        return [message]
+    return [frame for inner in message["frames"] for frame in frames(inner)]
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ({"bid": 1, "log": "a"}, {"bid": 2, "log": "a"}),
+        ({"players": {"alice": {"balance": 200}}}, {"players": {"alice": {"balance": 150}, "bob": {"balance": 200}}}),
+        ({"remaining": {"Duke": 1, "Yale": 13}}, {"remaining": {"Yale": 13}}),
+        ({"teams": [1, 2]}, {"teams": [2, 1], "current": None}),
+        # member names with the separator and the escape character in them
+        ({"remaining": {"Texas A&M/Corpus": 16, "a~1b": 2}}, {"remaining": {"a~1b": 3, "x~y/z": 4}}),
+        ({"a/b": {"~": 1}}, {"a/b": {"~": 2, "/": 3}}),
+    ],
+)
+def test_patch_of_the_diff_rebuilds_the_new_state(old, new):
+    state = copy.deepcopy(old)
+    ops = diff(old, new)
+    apply_patch(state, ops)
+    assert state == new
+
+    # a compacted run of diffs still ends at the last state
+    state, steps = copy.deepcopy(old), diff(old, new) + diff(new, old) + diff(old, new)
+    apply_patch(state, compact(steps))
+    assert state == new
+
+
+def test_escaped_paths_address_the_original_keys():
+    ops = diff({"remaining": {}}, {"remaining": {"a/b~c": 1}})
+    assert ops == [{"op": "add", "path": "/remaining/a~1b~0c", "value": 1}]
+    assert diff({"x": {"a/b~c": 1}}, {"x": {}}) == [{"op": "remove", "path": "/x/a~1b~0c"}]
+
+
+def test_client_that_missed_deltas_resyncs_from_its_version():
+    async def run():
+        hub = new_hub()
+        socket = FakeSocket()
+        hub.subscribe(socket)
+        await asyncio.sleep(0.01)
+        state = socket.of_type(SNAPSHOT)[0]["state"]
+
+        for bid in (1, 2, 3):
+            hub.publish([replace("/bid", bid)])
+        await asyncio.sleep(0.01)
+        deltas = socket.of_type(DELTA)
+        assert [delta["version"] for delta in deltas] == [1, 2, 3]
+
+        # the client applied version 1, then saw version 3 arrive: a gap, so it asks for everything after 1
+        apply_patch(state, deltas[0]["ops"])
+        socket.sent.clear()
+        hub.resync(socket, 1)
+        await asyncio.sleep(0.01)
+        assert [(frame["type"], frame["version"]) for frame in socket.sent] == [(DELTA, 2), (DELTA, 3)]
+        for delta in socket.sent:
+            apply_patch(state, delta["ops"])
+        assert state == hub.state
+
+        socket.sent.clear()
+        hub.resync(socket, hub.version)  # already current: nothing to send
+        await asyncio.sleep(0.01)
+        assert socket.sent == []
+        hub.close()
+
+    asyncio.run(run())
+
+
+def publish_to_a_slow_subscriber() -> tuple[GameHub, FakeSocket, FakeSocket]:
+    """
+    Publish ten deltas to a hub with one reading and one stalled socket, then let the stalled one read again.
+    """
+    async def run():
+        hub = new_hub()
+        fast, slow = FakeSocket(), FakeSocket()
+        slow.gate.clear()
+        hub.subscribe(fast)
+        hub.subscribe(slow)
+        await asyncio.sleep(0.01)
+
+        hub.publish_text("gameStarted")
+        for bid in range(1, 11):
+            hub.publish([replace("/bid", bid)])
+            await asyncio.sleep(0.002)  # long enough for the reading socket to keep up
+        await asyncio.sleep(0.01)
+        slow.gate.set()
+        await asyncio.sleep(0.01)
+        hub.close()
+        return hub, fast, slow
+
+    return asyncio.run(run())
+
+
+def test_slow_subscriber_skips_its_backlog_for_a_snapshot(monkeypatch):
+    monkeypatch.setattr(broadcast, "SEND_QUEUE_SIZE", 4)
+    hub, fast, slow = publish_to_a_slow_subscriber()
+
+    assert [frame["version"] for frame in fast.of_type(DELTA)] == list(range(1, 11))
+    assert fast.of_type("gameStarted") == slow.of_type("gameStarted") == [{"type": "gameStarted"}]
+
+    # the first snapshot was in flight when it stalled; the backlog was replaced with the latest snapshot since
+    first, *rest = slow.of_type(SNAPSHOT)
+    assert first["version"] == 0 and len(rest) == 1 and rest[0]["version"] <= 10
+    state = rest[0]["state"]
+    caught_up = [frame for frame in slow.of_type(DELTA) if frame["version"] > rest[0]["version"]]
+    assert len(slow.of_type(DELTA)) == len(caught_up) < 4
+    for delta in caught_up:
+        apply_patch(state, delta["ops"])
+    assert state == hub.state and slow.closed is None
+
+
+def test_slow_subscriber_is_disconnected_under_the_disconnect_policy(monkeypatch):
+    monkeypatch.setattr(broadcast, "SEND_QUEUE_SIZE", 4)
+    monkeypatch.setattr(broadcast, "SLOW_CONSUMER_POLICY", "disconnect")
+    hub, fast, slow = publish_to_a_slow_subscriber()
+
+    assert [frame["version"] for frame in fast.of_type(DELTA)] == list(range(1, 11)) and fast.closed is None
+    assert slow.closed == broadcast.SLOW_CONSUMER_CLOSE_CODE and slow.of_type(DELTA) == []
+
+
+def test_socket_that_stops_answering_pings_is_reaped(monkeypatch):
+    monkeypatch.setattr(broadcast, "HEARTBEAT_INTERVAL", 0.02)
+    monkeypatch.setattr(broadcast, "HEARTBEAT_TIMEOUT", 0.1)
+
+    async def run():
+        hub = new_hub()
+        answering, silent = FakeSocket(), FakeSocket()
+        hub.subscribe(answering)
+        hub.subscribe(silent)
+        for _ in range(15):
+            await asyncio.sleep(0.02)
+            hub.seen(answering)  # its pong
+        assert list(hub.subscribers) == [answering]
+        await asyncio.sleep(0.01)
+        hub.close()
+        return answering, silent
+
+    answering, silent = asyncio.run(run())
+    assert silent.closed == broadcast.DEAD_SOCKET_CLOSE_CODE and answering.closed is None
+    assert len(answering.of_type(PING)) > len(silent.of_type(PING)) > 1  # pinged until it was reaped
+
+
+def test_socket_whose_send_stalls_is_reaped(monkeypatch):
+    monkeypatch.setattr(broadcast, "SEND_TIMEOUT", 0.05)
+
+    async def run():
+        hub = new_hub()
+        stalled = FakeSocket()
+        stalled.gate.clear()  # e.g. a half-closed connection that never acknowledges
+        hub.subscribe(stalled)
+        await asyncio.sleep(0.1)
+        assert stalled not in hub.subscribers
+        await asyncio.sleep(0.01)
+        hub.close()
+        return stalled
+
+    stalled = asyncio.run(run())
+    assert stalled.closed == broadcast.DEAD_SOCKET_CLOSE_CODE and stalled.sent == []
+
+
+def resumed(hub: GameHub, token: str | None) -> list[dict]:
+    """
+    Frames a socket reconnecting with a resume token gets, after the ping with the server's time.
+    """
+    async def run():
+        socket = FakeSocket()
+        hub.subscribe(socket, resume=token)
+        await asyncio.sleep(0.01)
+        hub.close()
+        assert socket.sent[0]["type"] == PING
+        return socket.sent[1:]
+
+    return asyncio.run(run())
+
+
+def test_resume_token_from_this_epoch_gets_only_what_was_missed():
+    hub = new_hub()
+    for bid in (1, 2, 3):
+        hub.publish([replace("/bid", bid)])
+
+    assert [(frame["type"], frame["version"]) for frame in resumed(hub, f"{hub.epoch}.1")] == [(DELTA, 2), (DELTA, 3)]
+    assert resumed(hub, f"{hub.epoch}.3") == [{"type": VERSION, "version": 3}]  # nothing missed
+
+
+@pytest.mark.parametrize("token", [None, "", "ffffffff.3", "3", "{epoch}.x", "{epoch}.-1", "{epoch}.9"])
+def test_resume_token_from_another_epoch_or_malformed_gets_a_snapshot(token):
+    hub = new_hub()
+    for bid in (1, 2, 3):
+        hub.publish([replace("/bid", bid)])
+    token = token.format(epoch=hub.epoch) if token else token
+
+    (snapshot,) = resumed(hub, token)
+    assert snapshot["type"] == SNAPSHOT and snapshot["epoch"] == hub.epoch and snapshot["version"] == 3
+    assert snapshot["state"] == hub.state
+
+
+def test_resume_token_older_than_the_history_gets_a_snapshot(monkeypatch):
+    monkeypatch.setattr(broadcast, "HISTORY_LENGTH", 4)
+    hub = new_hub()
+    for bid in range(1, 11):
+        hub.publish([replace("/bid", bid)])
+
+    (snapshot,) = resumed(hub, f"{hub.epoch}.2")  # versions 3 to 6 are gone
+    assert snapshot["type"] == SNAPSHOT and snapshot["version"] == 10 and snapshot["state"]["bid"] == 10
+    assert [frame["version"] for frame in resumed(hub, f"{hub.epoch}.6")] == [7, 8, 9, 10]
+
+
+def test_malformed_resync_messages_are_ignored(api, capsys):
+    game_id = api.client.post("/create-game/", json={"player": "alice"}).json()["id"]
+    with api.client.websocket_connect(f"/ws/{game_id}") as websocket:
+        received = frames(websocket.receive_json())
+        if len(received) < 2:
+            received += frames(websocket.receive_json())
+        assert [frame["type"] for frame in received] == [PING, SNAPSHOT]
+
+        for message in ("{not json", '{"resync": "latest"}', '{"version": 1}', '{"resync": [1]}'):
+            websocket.send_text(message)
+        api.client.post("/join-game/", json={"gameId": game_id, "player": "bob"})
+
+        delta = frames(websocket.receive_json())[-1]  # the socket is still open and up to date
+        assert delta["type"] == DELTA and delta["version"] == received[1]["version"] + 1
+    assert capsys.readouterr().out.count("IGNORING MALFORMED WEBSOCKET MESSAGE") == 4
@@ -0,0 +1,115 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.catalog import lot_ids, parse_bundle_rules
+from app.types.types import INITIAL_BALANCE, BidModel
+
+from conftest import new_tracker
+
+
+def reference_lots(master, bundle_rules):
+    """
+    Lot name -> team names, built with plain dicts the way teams were bundled before the catalog.
+    """
+    lots = {name: [name] for name, team in master.items() if team.seed not in bundle_rules}
+    for seed, size in sorted(bundle_rules.items()):
+        names = [name for name, team in master.items() if team.seed == seed]
+        groups = [names[i:i + size] for i in range(0, len(names), size)]
+        for number, group in enumerate(groups):
+            lots[f"{seed} seed bundle" if len(groups) == 1 else f"{seed} seed bundle {number + 1}"] = group
+    return lots
+
+
+def test_parse_bundle_rules():
+    assert parse_bundle_rules("15:4,16:4") == {15: 4, 16: 4}
+    assert parse_bundle_rules(" 16 : 2 ") == {16: 2}
+    assert parse_bundle_rules("") == {}
+    for text in ("16", "16:0", "x:4", "16:-1"):
+        with pytest.raises(ValueError):
+            parse_bundle_rules(text)
+
+
+def test_no_bundle_rules_auctions_every_team_alone():
+    tracker = new_tracker(bundle_rules={})
+    assert tracker.bundles == {}
+    assert [lot.shortName for lot in tracker.catalog.lots] == [team.shortName for team in tracker.catalog.teams]
+
+
+def test_bundle_rules_set_the_bundles():
+    tracker = new_tracker(bundle_rules={16: 2})
+    sixteens = [team.shortName for team in tracker.catalog.teams if team.seed == 16]
+    assert tracker.bundles == {"16 seed bundle 1": sixteens[:2], "16 seed bundle 2": sixteens[2:4]}
+    assert all(team.seed != 16 for team in tracker.catalog.lots if team.region != "bundle")
+    assert len(tracker.catalog.lots) == len(tracker.catalog.teams) - 2
+
+
+@pytest.mark.parametrize("bundle_rules", [{15: 4, 16: 4}, {16: 2}, {13: 3, 14: 4}, {}])
+def test_catalog_arrays_match_the_dict_bundling(bundle_rules):
+    tracker = new_tracker(bundle_rules=bundle_rules)
+    catalog, master = tracker.catalog, tracker.teams_master
+    expected = reference_lots(master, bundle_rules)
+
+    lots = {lot.shortName: [catalog.teams[team].shortName for team in members]
+            for lot, members in zip(catalog.lots, catalog.members)}
+    assert lots == expected and list(lots) == list(expected)
+    for name, members in expected.items():
+        lot = catalog.lot_id[name]
+        assert catalog.find_lot(name) == lot
+        for member in members:
+            assert catalog.lot_of[catalog.team_id[member]] == lot and catalog.find_lot(member) == lot
+        row = np.zeros(len(catalog.teams))
+        row[[catalog.team_id[member] for member in members]] = 1
+        assert (catalog.membership[lot] == row).all()
+    assert catalog.find_lot("Not a team") is None
+
+
+def test_ownership_bitsets_match_a_dict_auction():
+    tracker = new_tracker()
+    rng = random.Random(2025)
+    names = ["alice", "bob", "carol", "dave"]
+    tracker.add_game("GAME01", names[0], drawSeed=11)
+    for name in names[1:]:
+        tracker.add_player("GAME01", name)
+
+    # the same auction kept in dicts: player -> {lot name: price}, player -> balance
+    bought = {name: {} for name in names}
+    balance = dict.fromkeys(names, INITIAL_BALANCE)
+    while (team := tracker.get_current_team("GAME01")) is not None:
+        bidders = [name for name in names if balance[name] > 0 and rng.random() < 0.7]
+        price = 0
+        for bidder in bidders:
+            if balance[bidder] > price:
+                price = rng.randint(price + 1, balance[bidder])
+                tracker.place_bid(BidModel(gameId="GAME01", player=bidder, bid=price, team=team.shortName))
+        winner = tracker.finalize_bid("GAME01")
+        if winner.player:
+            bought[winner.player][team.shortName] = winner.bid
+            balance[winner.player] -= winner.bid
+
+    def check(tracker):
+        game, catalog = tracker.games["GAME01"], tracker.catalog
+        for name, player in tracker.get_all_players("GAME01").items():
+            assert {team: info.purchasePrice for team, info in player.teams.items()} == bought[name]
+            assert player.balance == balance[name]
+            state = game.players[name]
+            assert sorted(lot_ids(state.owned)) == sorted(catalog.lot_id[lot] for lot in bought[name])
+            for lot in bought[name]:
+                assert game.owner[catalog.lot_id[lot]] == state.index + 1
+                assert game.prices[catalog.lot_id[lot]] == bought[name][lot]
+        unsold = set(catalog.lot_id) - {lot for lots in bought.values() for lot in lots}
+        assert all(game.owner[catalog.lot_id[lot]] == 0 for lot in unsold)
+
+    assert any(bought.values()) and len(set(map(len, bought.values()))) > 1
+    check(tracker)
+    restored = new_tracker()
+    restored.load_game("GAME01", tracker.game_info("GAME01"))
+    check(restored)
+
+
+def test_lot_ids_lists_the_set_bits_lowest_first():
+    assert list(lot_ids(0)) == []
+    assert list(lot_ids(0b1011)) == [0, 1, 3]
+    bits = [2, 17, 57, 63, 64, 200]
+    assert list(lot_ids(sum(1 << bit for bit in bits))) == bits
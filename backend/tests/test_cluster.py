@@ -0,0 +1,215 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import cluster as cluster_module
+from app.cluster import BrokerServer, BrokerUnavailable, Cluster, LoopbackBroker, TcpBroker
+
+
+class Worker:
+    """
+    A worker whose games are the numbers of the events applied to them.
+    """
+
+    def __init__(self, broker, name: str, storage: dict[str, list[int]]):
+        self.games: dict[str, list[int]] = {}
+        self.storage = storage
+        self.cluster = Cluster(
+            broker,
+            on_event=self.on_event,
+            on_text=lambda game_id, text: None,
+            on_owned=lambda game_id: None,
+            on_released=lambda game_id: None,
+            on_dropped=lambda game_id: self.games.pop(game_id, None),
+            load=self.load,
+            on_state=lambda game_id, state: self.games.__setitem__(game_id, list(state["events"])),
+            state=lambda game_id: {"events": self.games[game_id]} if game_id in self.games else None,
+            worker_id=name,
+        )
+
+    async def on_event(self, game_id: str, event: dict) -> None:
+        self.games.setdefault(game_id, []).append(event["n"])
+
+    async def load(self, game_id: str) -> bool:
+        if game_id in self.storage:
+            self.games[game_id] = list(self.storage[game_id])
+        return game_id in self.storage
+
+    async def send(self, game_id: str, *numbers: int):
+        return [await self.cluster.dispatch(game_id, {"n": n}) for n in numbers]
+
+
+async def loopback_brokers():
+    first = LoopbackBroker()
+    return first, LoopbackBroker(first.topics, first.leases), None
+
+
+async def tcp_brokers():
+    server = await BrokerServer(port=0).start()
+    port = server.sockets[0].getsockname()[1]
+    return TcpBroker("127.0.0.1", port), TcpBroker("127.0.0.1", port), server
+
+
+async def silent_broker():
+    """
+    A broker that accepts connections and never answers, and the writers of the connections it accepted.
+    """
+    connections = []
+
+    async def accept(reader, writer):
+        connections.append(writer)
+        await reader.read()
+
+    server = await asyncio.start_server(accept, "127.0.0.1", 0)
+    return server, connections
+
+
+async def until(condition, timeout=2):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_lost_broker_fails_pending_work_and_reconnects():
+    async def run():
+        server, connections = await silent_broker()
+        broker = TcpBroker("127.0.0.1", server.sockets[0].getsockname()[1])
+        released, dropped = [], []
+        cluster = Cluster(
+            broker,
+            on_event=None,
+            on_text=None,
+            on_owned=None,
+            on_released=released.append,
+            on_dropped=dropped.append,
+            load=None,
+            on_state=None,
+            state=None,
+        )
+        await broker.connect(cluster._receive, cluster._lost)
+        cluster.held = {"GAME01", "GAME02"}
+        cluster.owned = {"GAME01"}
+        dispatch = asyncio.create_task(cluster.dispatch("GAME01", {"type": "player_joined", "player": "bob"}))
+        lease = asyncio.create_task(broker.acquire(["GAME02"], "w0", 10))
+        await until(lambda: cluster._waiting and broker._requests)
+
+        connections[0].close()
+        for pending in (dispatch, lease):
+            with pytest.raises(BrokerUnavailable):
+                await pending
+        assert released == ["GAME01"] and not cluster.owned
+        assert sorted(dropped) == ["GAME01", "GAME02"] and not cluster.held
+        with pytest.raises(BrokerUnavailable):
+            await broker.publish({"game": "GAME01", "text": "gameStarted"})  # until it is back
+
+        await until(lambda: len(connections) == 2)
+        await until(lambda: broker._writer is not None)
+        await broker.publish({"game": "GAME01", "text": "gameStarted"})
+        await broker.close()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_broker_frees_the_leases_of_a_closed_connection():
+    async def run():
+        relay = BrokerServer(port=0)
+        server = await relay.start()
+        port = server.sockets[0].getsockname()[1]
+        first, second = TcpBroker("127.0.0.1", port), TcpBroker("127.0.0.1", port)
+
+        async def ignore(message):
+            pass
+
+        for broker in (first, second):
+            await broker.connect(ignore, lambda: None)
+        assert await first.acquire(["GAME01"], "w0", 10) == ["GAME01"]
+        assert await second.acquire(["GAME01"], "w1", 10) == []
+        await first.close()
+        await until(lambda: len(relay.connections) == 1)
+        assert await second.acquire(["GAME01"], "w1", 10) == ["GAME01"]
+        await second.close()
+        server.close()
+
+    asyncio.run(run())
+
+
+def test_cluster_refuses_the_journal_store():
+    env = {**os.environ, "CLUSTER_BROKER": "loopback", "GAME_STORE": "journal"}
+    run = subprocess.run([sys.executable, "-c", "import app.api"], env=env, capture_output=True, text=True)
+    assert run.returncode != 0 and "CLUSTER_BROKER needs GAME_STORE=database" in run.stderr
+
+
+@pytest.mark.parametrize("brokers", [loopback_brokers, tcp_brokers])
+def test_events_reach_only_the_workers_holding_the_game(brokers, monkeypatch):
+    monkeypatch.setattr(cluster_module, "LEASE_RENEW_INTERVAL", 0.01)
+
+    async def run():
+        first_broker, second_broker, server = await brokers()
+        storage = {"GAME02": [7]}
+        a, b = Worker(first_broker, "a", storage), Worker(second_broker, "b", storage)
+        for worker in (a, b):
+            await worker.cluster.start()
+
+        await a.cluster.claim("GAME01")
+        await a.send("GAME01", 1, 2)
+        assert a.cluster.owns("GAME01") and "GAME01" not in b.games
+
+        # b catches up from a while a keeps sending, then both apply everything in the same order
+        sending = asyncio.create_task(a.send("GAME01", *range(3, 50)))
+        await asyncio.sleep(0)
+        assert await b.cluster.hold("GAME01")
+        await sending
+        await b.send("GAME01", 50)
+        await until(lambda: len(a.games["GAME01"]) == 50)
+        assert a.games["GAME01"] == b.games["GAME01"] == list(range(1, 51))
+        assert not b.cluster.owns("GAME01")
+
+        # a lets go of the game, b takes over its lease and a no longer hears about it
+        a.games.pop("GAME01")
+        a.cluster.drop("GAME01")
+        await until(lambda: b.cluster.owns("GAME01"))
+        await b.send("GAME01", 51)
+        assert await a.send("GAME01", 52) == ["Game ID not found"]
+        assert "GAME01" not in a.games and b.games["GAME01"][-1] == 51
+
+        # nobody holds these: loaded from storage and leased, or not found
+        assert await a.cluster.hold("GAME02") and a.games["GAME02"] == [7] and a.cluster.owns("GAME02")
+        assert not await a.cluster.hold("NOGAME") and "NOGAME" not in a.cluster.held
+
+        for worker in (a, b):
+            await worker.cluster.stop()
+        if server is not None:
+            server.close()
+
+    asyncio.run(run())
+
+
+def test_joining_worker_asks_again_when_the_holder_does_not_answer(monkeypatch):
+    monkeypatch.setattr(cluster_module, "JOIN_TIMEOUT", 0.1)
+
+    async def run():
+        first_broker, second_broker, _ = await loopback_brokers()
+        mute = LoopbackBroker(first_broker.topics, first_broker.leases)
+
+        async def ignore(message):
+            pass
+
+        await mute.connect(ignore, lambda: None)
+        await mute.subscribe("GAME01", "mute:0")  # holds the game but never answers for it
+        worker = Worker(second_broker, "b", {"GAME01": [1, 2]})
+        await worker.cluster.start()
+
+        joining = asyncio.create_task(worker.cluster.hold("GAME01"))
+        await asyncio.sleep(0.15)
+        assert not joining.done() and "GAME01" not in worker.games
+        mute.unsubscribe("GAME01")
+        assert await joining and worker.games["GAME01"] == [1, 2] and worker.cluster.owns("GAME01")
+
+        await worker.cluster.stop()
+        await mute.close()
+
+    asyncio.run(run())
@@ -0,0 +1,212 @@
+from app.types.types import BidModel, ScoringRules, INITIAL_BALANCE, AUCTIONING, COMPLETE, LOBBY
+
+from conftest import auction_everything, bid, result
+
+
+def new_game(tracker, gameId="GAME01", players=("alice", "bob"), drawSeed=1, scoring=None):
+    tracker.add_game(gameId, players[0], drawSeed=drawSeed, scoring=scoring)
+    for player in players[1:]:
+        tracker.add_player(gameId, player)
+    return gameId
+
+
+def test_draw_seed_fixes_the_auction_order(tracker):
+    orders = []
+    for gameId, drawSeed in (("GAME01", 7), ("GAME02", 7), ("GAME03", 8)):
+        new_game(tracker, gameId, drawSeed=drawSeed)
+        order = []
+        while tracker.get_current_team(gameId) is not None:
+            order.append(tracker.get_current_team(gameId).shortName)
+            tracker.finalize_bid(gameId)
+        orders.append(order)
+    assert orders[0] == orders[1] != orders[2]
+    assert sorted(orders[0]) == sorted(lot.shortName for lot in tracker.catalog.lots)
+
+
+def test_check_bid(tracker):
+    gameId = new_game(tracker)
+    team = tracker.get_current_team(gameId).shortName
+
+    def check(player="alice", amount=5, team=team):
+        return tracker.check_bid(BidModel(gameId=gameId, player=player, bid=amount, team=team))
+
+    assert check() is None
+    assert check(player="carol") == "carol is not in this game"
+    assert check(team="not a team") == "not a team is not up for auction"
+    assert check(amount=INITIAL_BALANCE + 1).startswith("Bid exceeds the balance")
+    bid(tracker, gameId, "bob", 5)
+    assert check(amount=5).startswith("Bid must be higher")
+    assert check(amount=6) is None
+
+
+def test_place_bid_raises_the_current_bid(tracker):
+    gameId = new_game(tracker)
+    assert tracker.game_status(gameId) == LOBBY
+    bid(tracker, gameId, "alice", 3)
+    bid(tracker, gameId, "bob", 4)
+    assert tracker.get_current_bid(gameId) == 4
+    assert [entry.player for entry in tracker.games[gameId].log] == ["alice", "bob"]
+    assert tracker.game_status(gameId) == AUCTIONING
+
+
+def test_finalize_sells_to_the_last_bidder(tracker):
+    gameId = new_game(tracker)
+    sold = tracker.get_current_team(gameId).shortName
+    next_team = tracker.pick_team_name(gameId)
+    bid(tracker, gameId, "alice", 3)
+    bid(tracker, gameId, "bob", 8)
+    tracker.set_deadline(gameId, 123.0)
+
+    winner = tracker.finalize_bid(gameId)
+
+    assert (winner.player, winner.bid, winner.team) == ("bob", 8, sold)
+    bob = tracker.get_player_info(gameId, "bob")
+    assert bob.balance == INITIAL_BALANCE - 8
+    assert bob.teams[sold].purchasePrice == 8
+    assert tracker.get_player_info(gameId, "alice").balance == INITIAL_BALANCE
+    assert tracker.get_current_team(gameId).shortName == next_team
+    assert tracker.get_current_bid(gameId) == 0
+    assert tracker.get_deadline(gameId) is None
+    assert tracker.games[gameId].log == []
+    assert sold not in tracker.dump_remaining_teams(gameId)
+
+
+def test_finalize_without_bids_sells_nothing(tracker):
+    gameId = new_game(tracker)
+    unsold = tracker.get_current_team(gameId).shortName
+    winner = tracker.finalize_bid(gameId)
+    assert winner.player == "" and winner.team == unsold
+    assert all(not player.teams for player in tracker.get_all_players(gameId).values())
+
+
+def test_auctioning_everything_completes_the_game(tracker):
+    gameId = new_game(tracker)
+    auction_everything(tracker, gameId)
+    assert tracker.get_current_team(gameId) is None
+    assert tracker.game_status(gameId) == COMPLETE
+    owned = [name for player in tracker.get_all_players(gameId).values() for name in player.teams]
+    assert sorted(owned) == sorted(lot.shortName for lot in tracker.catalog.lots)
+    assert tracker.dump_remaining_teams(gameId) == {}
+
+
+def test_bundles_group_the_lowest_seeds(tracker):
+    bundles = tracker.bundles
+    assert set(bundles) == {"15 seed bundle", "16 seed bundle"}
+    for name, members in bundles.items():
+        seed = int(name.split()[0])
+        assert sorted(members) == sorted(t.shortName for t in tracker.catalog.teams if t.seed == seed)
+        assert not set(members) & set(tracker.catalog.lot_id)  # only auctioned as part of the bundle
+        assert all(tracker.catalog.find_lot(member) == tracker.catalog.lot_id[name] for member in members)
+
+
+def test_drawing_a_bundle_removes_all_of_its_teams(tracker):
+    gameId = new_game(tracker)
+    members = tracker.bundles["16 seed bundle"]
+    while tracker.get_current_team(gameId).shortName != "16 seed bundle":
+        tracker.finalize_bid(gameId)
+    assert not set(members) & set(tracker.dump_remaining_teams(gameId))
+    bid(tracker, gameId, "alice", 2)
+    tracker.finalize_bid(gameId)
+    assert "16 seed bundle" in tracker.get_player_info(gameId, "alice").teams
+
+
+def test_points_follow_results_incrementally(tracker, results):
+    # several games with different owners, checked against a full recomputation from match_results
+    for number, players in enumerate((("alice", "bob"), ("carol", "dave", "erin"), ("frank",))):
+        gameId = new_game(tracker, f"GAME0{number}", players, drawSeed=number)
+        auction_everything(tracker, gameId)
+
+    half = len(results) // 2
+    changed = tracker.update_match_results(results[:half])
+    assert changed == set(tracker.games)
+    assert all(tracker.check_player_points(gameId) for gameId in tracker.games)
+
+    tracker.update_match_results(results[half:])
+    assert all(tracker.check_player_points(gameId) for gameId in tracker.games)
+    for gameId in tracker.games:
+        total = sum(player.points for player in tracker.get_all_players(gameId).values())
+        assert total == sum(1 for match in results if match.winner in tracker.catalog.lot_id)
+
+
+def test_corrected_result_moves_the_point(tracker, results):
+    gameId = new_game(tracker)
+    auction_everything(tracker, gameId)
+    tracker.update_match_results(results)
+    match = next(m for m in results if all(team.shortName in tracker.catalog.lot_id for team in m.participants))
+    winner, loser = match.participants if match.participants[0].shortName == match.winner else match.participants[::-1]
+    owner = {team: player for player, info in tracker.get_all_players(gameId).items() for team in info.teams}
+    before = {player: info.points for player, info in tracker.get_all_players(gameId).items()}
+
+    tracker.update_match_results([result(match.id, loser, winner)])
+
+    after = {player: info.points for player, info in tracker.get_all_players(gameId).items()}
+    assert tracker.check_player_points(gameId)
+    assert sum(after.values()) == sum(before.values())
+    if owner[winner.shortName] != owner[loser.shortName]:
+        assert after[owner[winner.shortName]] == before[owner[winner.shortName]] - 1
+        assert after[owner[loser.shortName]] == before[owner[loser.shortName]] + 1
+
+
+def test_unchanged_results_touch_no_game(tracker, results):
+    gameId = new_game(tracker)
+    auction_everything(tracker, gameId)
+    tracker.update_match_results(results)
+    assert tracker.update_match_results(results) == set()
+
+
+def test_games_owning_no_changed_team_are_not_reported(tracker, results):
+    new_game(tracker, "GAME01")
+    gameId = new_game(tracker, "GAME02")
+    auction_everything(tracker, gameId)
+    assert tracker.update_match_results(results) == {gameId}
+
+
+def test_bundles_earn_the_wins_of_their_teams(tracker):
+    gameId = new_game(tracker)
+    auction_everything(tracker, gameId)
+    teams = {team.shortName: team for team in tracker.catalog.teams}
+    underdog = teams[tracker.bundles["16 seed bundle"][0]]
+    favorite = next(team for team in teams.values() if team.seed == 1)
+    owner = next(p for p, info in tracker.get_all_players(gameId).items() if "16 seed bundle" in info.teams)
+
+    assert tracker.update_match_results([result(1000, underdog, favorite)]) == {gameId}
+
+    player = tracker.get_player_info(gameId, owner)
+    assert player.teams["16 seed bundle"].points == 1
+    assert player.points == 1
+    assert tracker.check_player_points(gameId)
+
+
+def test_default_rules_score_like_classic(tracker, results):
+    # the same draw and buyers, one game without a rule set and one with the default rules
+    new_game(tracker, "CLASSIC")
+    new_game(tracker, "DEFAULT", scoring=ScoringRules())
+    for gameId in ("CLASSIC", "DEFAULT"):
+        auction_everything(tracker, gameId)
+    teams = {team.shortName: team for team in tracker.catalog.teams}
+    upsets = [
+        result(1000, teams[tracker.bundles["16 seed bundle"][0]], next(t for t in teams.values() if t.seed == 1)),
+        result(1001, teams[tracker.bundles["15 seed bundle"][0]], next(t for t in teams.values() if t.seed == 2)),
+    ]
+
+    tracker.update_match_results(results + upsets)
+
+    classic = tracker.get_all_players("CLASSIC")
+    default = tracker.get_all_players("DEFAULT")
+    assert {p: info.points for p, info in classic.items()} == {p: info.points for p, info in default.items()}
+    for player, info in classic.items():
+        assert {t: team.points for t, team in info.teams.items()} == {
+            t: team.points for t, team in default[player].teams.items()
+        }
+
+
+def test_owner_index_follows_eviction_and_loading(tracker, results):
+    gameId = new_game(tracker)
+    auction_everything(tracker, gameId)
+    stored = tracker.game_info(gameId)
+    tracker.remove_game(gameId)
+    assert tracker.update_match_results(results[:4]) == set()
+
+    tracker.load_game(gameId, stored)
+    assert tracker.update_match_results(results[4:]) == {gameId}
+    assert tracker.check_player_points(gameId)
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import repository as repository_module
+from app.journal import GAME_CREATED, PLAYER_JOINED
+from app.repository import GameRepository
+
+
+def database_gone() -> OperationalError:
+    return OperationalError("INSERT INTO players", {}, ConnectionError("database went away"))
+
+
+def run_with_failing_join(tracker, tmp_path, failures: list[Exception]):
+    """
+    Store a game, then have bob's join fail with each of failures in turn before it is written.
+    Returns the repository, whether it reported the game as writing mid-retry, and the game read back.
+    """
+    async def run():
+        repository = GameRepository(f"sqlite+aiosqlite:///{tmp_path}/games.db")
+        await repository.open({**tracker.teams_master, **tracker.lots}, tracker.bundles)
+        tracker.add_game("GAME01", "alice", drawSeed=1)
+        repository.record("GAME01", {"type": GAME_CREATED}, tracker)
+        await repository.flush()
+
+        add_player = repository._add_player
+        attempts = []
+
+        async def flaky_add_player(session, gameId, player):
+            attempts.append(player.name)
+            if len(attempts) <= len(failures):
+                raise failures[len(attempts) - 1]
+            await add_player(session, gameId, player)
+
+        repository._add_player = flaky_add_player
+        tracker.add_player("GAME01", "bob")
+        repository.record("GAME01", {"type": PLAYER_JOINED, "player": "bob"}, tracker)
+        await asyncio.sleep(0.05)
+        writing = repository.writing("GAME01")
+        await repository.flush()
+        return repository, writing, await repository.load_game("GAME01")
+
+    return asyncio.run(run())
+
+
+def test_write_is_retried_until_the_database_is_back(tracker, tmp_path):
+    repository, writing, game = run_with_failing_join(tracker, tmp_path, [database_gone(), database_gone()])
+    assert writing  # not evictable while the join is being retried
+    assert not repository.writing("GAME01") and not repository.dirty
+    assert set(game.players) == {"alice", "bob"}
+
+
+def test_game_stays_dirty_when_a_write_is_given_up(tracker, tmp_path, monkeypatch):
+    monkeypatch.setattr(repository_module, "WRITE_RETRY_SECONDS", 0.2)
+    repository, _, game = run_with_failing_join(tracker, tmp_path, [database_gone()] * 10)
+    assert repository.dirty == {"GAME01"} and repository.writing("GAME01")
+    assert set(game.players) == {"alice"}  # the stored copy is stale, so the game must not be reloaded from it
+
+
+@pytest.mark.parametrize("error", [ValueError("not a player"), KeyError("bob")])
+def test_write_the_database_rejects_is_not_retried(tracker, tmp_path, error):
+    repository, _, game = run_with_failing_join(tracker, tmp_path, [error])
+    assert repository.dirty == {"GAME01"} and repository.writing("GAME01")
+    assert set(game.players) == {"alice"}
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import scoreboard as scoreboard_module
+from app.scoreboard import FIXTURE_DIR, ScoreboardProvider, compact_scoreboard
+
+DAYS = ("20", "21", "22", "23")
+
+
+def day_feed(day: str) -> dict:
+    team = {"names": {"short": f"Team {day}", "seo": f"team-{day}", "char6": "TEAM"}, "seed": "1", "winner": True}
+    game = {"gameState": "final", "bracketRound": "First Round", "away": team, "home": team, "url": "/game/1"}
+    return {"games": [{"game": game}], "updated_at": "03-20-2025 10:00:00"}
+
+
+class StubFeed:
+    """
+    A local scoreboard feed. Each day answers from a list of status codes, one per request, repeating the last.
+    Records every request with its arrival time and headers.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.statuses: dict[str, list[int]] = {}
+        self.etag = '"v1"'
+        self.requests: list[tuple[str, float, dict]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        feed = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                day = self.path.split("/")[3]
+                with feed._lock:
+                    feed.requests.append((day, time.monotonic(), dict(self.headers)))
+                    feed.in_flight += 1
+                    feed.max_in_flight = max(feed.max_in_flight, feed.in_flight)
+                    statuses = feed.statuses.get(day, [200])
+                    status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+                time.sleep(feed.delay)
+                if status == 200 and self.headers.get("If-None-Match") == feed.etag:
+                    status = 304
+                body = json.dumps(day_feed(day)).encode() if status == 200 else b""
+                self.send_response(status)
+                self.send_header("ETag", feed.etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with feed._lock:
+                    feed.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}" + "/{year}/{month}/{day}/scoreboard.json"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def days_requested(self) -> list[str]:
+        return [day for day, _, _ in self.requests]
+
+
+@pytest.fixture
+def feed():
+    feed = StubFeed()
+    yield feed
+    feed.server.shutdown()
+    feed.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(scoreboard_module, "RETRY_BACKOFF", 0.05)
+
+
+def provider(feed, tmp_path, **kwargs) -> ScoreboardProvider:
+    return ScoreboardProvider(url=feed.url, cache_dir=str(tmp_path / "cache"), offline=False, **kwargs)
+
+
+def test_stale_days_are_fetched_concurrently(feed, tmp_path):
+    feed.delay = 0.3
+    start = time.monotonic()
+    days = provider(feed, tmp_path).get_many(2025, "03", DAYS)
+    elapsed = time.monotonic() - start
+
+    assert days == {day: compact_scoreboard(day_feed(day)) for day in DAYS}
+    assert sorted(feed.days_requested()) == list(DAYS)
+    assert feed.max_in_flight == len(DAYS) and elapsed < 2 * feed.delay  # one round trip, not one per day
+
+    # fresh in the cache now: no requests at all
+    assert provider(feed, tmp_path).get_many(2025, "03", DAYS) == days
+    assert len(feed.requests) == len(DAYS)
+
+
+def test_server_errors_are_retried_with_backoff(feed, tmp_path):
+    feed.statuses["20"] = [503, 502, 200]
+    assert provider(feed, tmp_path).get(2025, "03", "20") == compact_scoreboard(day_feed("20"))
+
+    times = [at for _, at, _ in feed.requests]
+    assert len(times) == 3
+    assert times[1] - times[0] >= scoreboard_module.RETRY_BACKOFF
+    assert times[2] - times[1] >= 2 * scoreboard_module.RETRY_BACKOFF
+
+
+def test_unchanged_day_is_revalidated_with_its_etag(feed, tmp_path):
+    first = provider(feed, tmp_path, ttl=0).get(2025, "03", "20")
+    cache_file = tmp_path / "cache" / "2025-03-20.json"
+    fetched = json.loads(cache_file.read_text())["fetched"]
+
+    assert provider(feed, tmp_path, ttl=0).get(2025, "03", "20") == first
+    (_, _, initial), (_, _, revalidation) = feed.requests
+    assert "If-None-Match" not in initial and revalidation["If-None-Match"] == feed.etag
+    assert json.loads(cache_file.read_text())["fetched"] > fetched  # the 304 refreshed the cached copy
+
+
+def test_unreachable_feed_falls_back_to_the_stale_cache(feed, tmp_path):
+    cached = provider(feed, tmp_path).get(2025, "03", "20")
+    feed.statuses["20"] = [500]
+    assert provider(feed, tmp_path, ttl=0).get(2025, "03", "20") == cached
+    assert len(feed.requests) == 1 + 1 + scoreboard_module.RETRIES
+
+
+def test_offline_mode_serves_the_fixtures_without_touching_the_feed(feed, tmp_path):
+    offline = ScoreboardProvider(url=feed.url, cache_dir=str(tmp_path / "cache"), offline=True)
+    days = offline.get_many(2025, "03", ("20", "21", "22"))
+
+    for day in ("20", "21"):
+        with open(f"{FIXTURE_DIR}/2025-03-{day}.json") as f:
+            assert days[day] == json.load(f)
+    assert days["22"] is None  # no fixture for that day
+    assert feed.requests == []
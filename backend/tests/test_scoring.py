@@ -0,0 +1,124 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.bracket import round_index
+from app.scoring import WinMatrix, compile_rules, score_games
+from app.types.types import BidModel, ScoringRules
+
+from conftest import new_tracker, played_bracket
+
+RULE_SETS = [
+    None,
+    ScoringRules(),
+    ScoringRules(winPoints=0, roundWeights=[1, 2, 4, 8, 16, 32]),
+    ScoringRules(winPoints=2, seedFactor=0.5, upsetBonus=1.5),
+    ScoringRules(roundWeights=[0, 1, 1, 2, 3, 5], upsetBonus=1, perDollar=True),
+    ScoringRules(winPoints=10, seedFactor=1, perDollar=True),
+]
+
+
+def reference_team_points(rules, matches):
+    """
+    Team name -> points, summed one result at a time with dicts the way scoring worked before the win matrix.
+    """
+    points = {}
+    for match in matches:
+        winner, loser = match.participants
+        if winner.shortName != match.winner:
+            winner, loser = loser, winner
+        bracket_round = round_index(match.roundName)
+        earned = rules.winPoints + rules.roundWeights[bracket_round] + rules.seedFactor * winner.seed
+        earned += rules.upsetBonus * max(0, winner.seed - loser.seed)
+        points[winner.shortName] = points.get(winner.shortName, 0) + earned
+    return points
+
+
+def reference_player_points(rules, team_points, bundles, players):
+    """
+    Player name -> points over the lots they bought, a bundle earning what its teams earn.
+    """
+    standings = {}
+    for name, player in players.items():
+        points = sum(team_points.get(team, 0) for lot in player.teams for team in bundles.get(lot, [lot]))
+        spent = sum(team.purchasePrice for team in player.teams.values())
+        standings[name] = (points / spent if spent else 0.0) if rules.perDollar else points
+    return standings
+
+
+def auctioned_games(tracker, rng):
+    """
+    One game per rule set, each sold off in a different random auction; some lots go unsold, some players buy nothing.
+    """
+    names = ["alice", "bob", "carol", "dave", "erin"]
+    for number, rules in enumerate(RULE_SETS):
+        gameId = f"GAME{number:02d}"
+        tracker.add_game(gameId, names[0], scoring=rules, drawSeed=number)
+        for name in names[1:]:
+            tracker.add_player(gameId, name)
+        while (team := tracker.get_current_team(gameId)) is not None:
+            if rng.random() < 0.9:
+                bidder = rng.choice(names[:-1])  # erin never bids
+                amount = rng.randint(1, 3)
+                tracker.place_bid(BidModel(gameId=gameId, player=bidder, bid=amount, team=team.shortName))
+            tracker.finalize_bid(gameId)
+    return {f"GAME{number:02d}": rules or ScoringRules() for number, rules in enumerate(RULE_SETS)}
+
+
+@pytest.mark.parametrize("rules", RULE_SETS[1:])
+def test_compiled_rules_match_dict_scoring(tracker, rules):
+    matches = played_bracket(tracker, random.Random(7))
+    matrix = WinMatrix(tracker.teams_master, matches)
+    expected = reference_team_points(rules, matches)
+
+    points = compile_rules(rules, matrix)
+    assert points == pytest.approx([expected.get(name, 0) for name in matrix.names])
+    assert matrix.wins.sum(axis=0).tolist() == [32, 16, 8, 4, 2, 1]
+
+
+def test_score_games_matches_dict_scoring():
+    tracker = new_tracker()
+    rng = random.Random(2025)
+    games = auctioned_games(tracker, rng)
+    matches = played_bracket(tracker, rng)
+    matrix = WinMatrix(tracker.teams_master, matches)
+
+    standings = score_games(tracker.games, matrix, tracker.catalog)
+    for gameId, rules in games.items():
+        team_points = reference_team_points(rules, matches)
+        lot_points, points = standings[gameId]
+        for lot, members in enumerate(tracker.catalog.members):
+            names = [tracker.catalog.teams[team].shortName for team in members]
+            assert lot_points[lot] == pytest.approx(sum(team_points.get(name, 0) for name in names))
+        players = tracker.get_all_players(gameId)
+        expected = reference_player_points(rules, team_points, tracker.bundles, players)
+        by_index = {name: points[player.index] for name, player in tracker.games[gameId].players.items()}
+        assert by_index == pytest.approx(expected)
+        assert by_index["erin"] == 0
+
+
+def test_tracker_points_match_dict_scoring_round_by_round():
+    tracker = new_tracker()
+    rng = random.Random(64)
+    games = auctioned_games(tracker, rng)
+    matches = played_bracket(tracker, rng)
+
+    # results arrive round by round, so custom rule sets are rescored and classic wins added incrementally
+    played = 0
+    for games_in_round in (32, 16, 8, 4, 2, 1):
+        tracker.update_match_results(matches[:played + games_in_round])
+        played += games_in_round
+        for gameId, rules in games.items():
+            team_points = reference_team_points(rules, matches[:played])
+            players = tracker.get_all_players(gameId)
+            expected = reference_player_points(rules, team_points, tracker.bundles, players)
+            assert {name: player.points for name, player in players.items()} == pytest.approx(expected)
+            for player in players.values():
+                for name, team in player.teams.items():
+                    members = tracker.bundles.get(name, [name])
+                    assert team.points == pytest.approx(sum(team_points.get(member, 0) for member in members))
+            assert tracker.check_player_points(gameId)
+
+    wins = WinMatrix(tracker.teams_master, matches).wins.sum(axis=1)
+    assert np.array_equal(tracker.lot_wins, tracker.catalog.membership @ wins)
@@ -0,0 +1,113 @@
+import asyncio
+import random
+
+import numpy as np
+import pytest
+
+from app.bracket import round_index
+from app.scoring import WinMatrix, compile_rules
+from app.simulation import TournamentSimulator, bracket_slots, forced_winners, seed_probabilities, simulate
+from app.types.types import ScoringRules
+
+from conftest import played_bracket
+
+SIMULATIONS = 20_000
+
+
+def reference_expected_wins(field, probabilities, played):
+    """
+    Team name -> expected wins per round, computed exactly with dicts: the chance a team is still alive, times its
+    chance of beating each team it can meet next. played maps (round, winner) of games already decided.
+    """
+    alive = dict.fromkeys(field, 1.0)
+    expected = {team: [0.0] * 6 for team in field}
+    for bracket_round in range(6):
+        size = 2 ** (bracket_round + 1)
+        advance = {}
+        for start in range(0, len(field), size):
+            top, bottom = field[start:start + size // 2], field[start + size // 2:start + size]
+            decided = [winner for winner in top + bottom if (bracket_round, winner) in played]
+            for half, others in ((top, bottom), (bottom, top)):
+                for team in half:
+                    if decided:
+                        advance[team] = float(team == decided[0])
+                    else:
+                        advance[team] = alive[team] * sum(alive[other] * probabilities[team][other] for other in others)
+        for team, chance in advance.items():
+            expected[team][bracket_round] = chance
+        alive = advance
+    return expected
+
+
+@pytest.fixture
+def bracket(tracker):
+    """
+    Catalog slots in bracket order, with seed based win chances per pair of team names.
+    """
+    catalog = tracker.catalog
+    slots = bracket_slots(catalog)
+    seeds = np.array([team.seed for team in catalog.teams], dtype=np.float64)
+    probabilities = seed_probabilities(seeds)
+    names = [team.shortName for team in catalog.teams]
+    chances = {names[i]: {names[j]: probabilities[i, j] for j in range(len(names))} for i in range(len(names))}
+    return slots, seeds, probabilities, [names[team] for team in slots], chances
+
+
+def test_fully_played_bracket_replays_its_results(tracker, bracket):
+    slots, seeds, probabilities, _, _ = bracket
+    matches = played_bracket(tracker, random.Random(3))
+    forced = forced_winners(slots, tracker.catalog, matches)
+    assert [int((forced[r] >= 0).sum()) for r in range(6)] == [32, 16, 8, 4, 2, 1]
+
+    wins, upsets = simulate(slots, forced, probabilities, seeds, 50, seed=1)
+    actual = WinMatrix({team.shortName: team for team in tracker.catalog.teams}, matches)
+    assert np.array_equal(wins, 50 * actual.wins) and np.array_equal(upsets, 50 * actual.upsets)
+
+
+def test_every_simulation_plays_a_whole_bracket(tracker, bracket, results):
+    slots, seeds, probabilities, _, _ = bracket
+    forced = forced_winners(slots, tracker.catalog, results)
+    wins, upsets = simulate(slots, forced, probabilities, seeds, 1000, seed=5)
+
+    assert wins.sum(axis=0).tolist() == [32_000, 16_000, 8_000, 4_000, 2_000, 1_000]
+    losers = [tracker.catalog.team_id[team.shortName] for match in results for team in match.participants
+              if team.shortName != match.winner]
+    assert wins[losers].sum() == 0 and upsets[losers].sum() == 0
+    assert (upsets >= 0).all() and upsets.sum() > 0
+
+    again = simulate(slots, forced, probabilities, seeds, 1000, seed=5)
+    assert np.array_equal(wins, again[0]) and np.array_equal(upsets, again[1])
+
+
+@pytest.mark.parametrize("rounds_played", [0, 1, 3])
+def test_monte_carlo_converges_on_the_exact_expected_wins(tracker, bracket, rounds_played):
+    slots, seeds, probabilities, field, chances = bracket
+    matches = played_bracket(tracker, random.Random(11), rounds=rounds_played)
+    forced = forced_winners(slots, tracker.catalog, matches)
+    played = {(round_index(match.roundName), match.winner) for match in matches}
+
+    wins, _ = simulate(slots, forced, probabilities, seeds, SIMULATIONS, seed=2025)
+    expected = reference_expected_wins(field, chances, played)
+    for team in field:
+        simulated = wins[tracker.catalog.team_id[team]] / SIMULATIONS
+        assert simulated == pytest.approx(expected[team], abs=0.02)
+
+
+def test_simulator_prices_lots_from_expected_wins(tracker, results):
+    simulator = TournamentSimulator(tracker.catalog, simulations=2_000, processes=1)
+    assert simulator.lot_points(None) is None
+    assert asyncio.run(simulator.run(1, results))
+    assert not asyncio.run(simulator.run(1, results))  # this version is already simulated
+
+    membership = tracker.catalog.membership
+    classic = simulator.lot_points(None)
+    assert np.array_equal(classic, simulator.lot_points(ScoringRules()))
+    assert classic == pytest.approx(membership @ simulator._expected.wins.sum(axis=1))
+    assert classic.sum() == pytest.approx(63)  # every simulated bracket has 63 winners
+
+    rules = ScoringRules(winPoints=0, roundWeights=[1, 2, 4, 8, 16, 32], upsetBonus=1)
+    assert simulator.lot_points(rules) == pytest.approx(membership @ compile_rules(rules, simulator._expected))
+
+    unsold = list(range(len(tracker.catalog.lots)))
+    valuations = simulator.valuations(None, unsold, budget=500)
+    assert sum(value["fairValue"] for value in valuations.values()) == pytest.approx(500, abs=0.5)
@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+from app import spectators
+from app.broadcast import GameHub
+from app.protocol import BATCH, DELTA, PING, SNAPSHOT, apply_patch, replace
+from app.spectators import PING_EVENT, PING_TEXT, SpectatorStream
+
+RATE = 50  # updates per second, so the tests wait milliseconds for an update
+
+
+def new_hub() -> GameHub:
+    return GameHub("GAME01", snapshot=lambda: {"bid": 0, "players": {"alice": {"balance": 200}}})
+
+
+def messages(text: str) -> list[dict]:
+    frame = json.loads(text)
+    return frame["frames"] if frame["type"] == BATCH else [frame]
+
+
+def test_spectators_share_one_update_per_interval():
+    async def run():
+        hub = new_hub()
+        stream = SpectatorStream(hub, rate=RATE)
+        first, second = stream.follow(), stream.follow()
+        for follower in (first, second):
+            assert json.loads(await anext(follower))["type"] == PING  # the server's time comes first
+            snapshot = json.loads(await anext(follower))
+            assert snapshot["type"] == SNAPSHOT and snapshot["state"]["bid"] == 0
+
+        pending = [asyncio.create_task(anext(follower)) for follower in (first, second)]
+        hub.publish([replace("/bid", 5)])
+        hub.publish([replace("/players/alice/balance", 195)])
+        texts = await asyncio.gather(*pending)
+        assert texts[0] is texts[1]  # encoded once for every spectator
+        assert [(message["type"], message["version"]) for message in messages(texts[0])] == [(DELTA, 1), (DELTA, 2)]
+        stream.close()
+        assert [text async for text in first] == []
+
+    asyncio.run(run())
+
+
+def test_spectator_that_missed_an_update_gets_a_snapshot():
+    async def run():
+        hub = new_hub()
+        stream = SpectatorStream(hub, rate=RATE)
+        slow, fast = stream.follow(), stream.follow()
+        for follower in (slow, fast):
+            await anext(follower)
+            await anext(follower)
+
+        state = {"bid": 0, "players": {"alice": {"balance": 200}}}
+        for bid in (1, 2):
+            pending = asyncio.create_task(anext(fast))
+            hub.publish([replace("/bid", bid)])
+            apply_patch(state, messages(await pending)[0]["ops"])
+
+        pending = [asyncio.create_task(anext(follower)) for follower in (slow, fast)]
+        hub.publish([replace("/bid", 3)])
+        missed, caught_up = await asyncio.gather(*pending)
+        snapshot = json.loads(missed)
+        assert snapshot["type"] == SNAPSHOT and snapshot["version"] == 3 and snapshot["state"]["bid"] == 3
+        apply_patch(state, messages(caught_up)[0]["ops"])
+        assert state == snapshot["state"]
+        stream.close()
+
+    asyncio.run(run())
+
+
+def test_current_resume_token_skips_the_snapshot():
+    async def run():
+        hub = new_hub()
+        hub.publish([replace("/bid", 4)])
+        stream = SpectatorStream(hub, rate=RATE)
+        follower = stream.follow(resume=f"{hub.epoch}.{hub.version}")
+        await anext(follower)
+        pending = asyncio.create_task(anext(follower))
+        hub.publish([replace("/bid", 6)])
+        assert [message["type"] for message in messages(await pending)] == [DELTA]
+        stream.close()
+
+        stale = SpectatorStream(hub, rate=RATE).follow(resume=f"another.{hub.version}")
+        await anext(stale)
+        assert json.loads(await anext(stale))["type"] == SNAPSHOT
+
+    asyncio.run(run())
+
+
+def test_sse_events_carry_their_resume_id(monkeypatch):
+    monkeypatch.setattr(spectators, "HEARTBEAT_INTERVAL", 0)
+
+    async def run():
+        hub = new_hub()
+        stream = SpectatorStream(hub, rate=RATE)
+        events, socket = stream.follow(sse=True), stream.follow()
+        clock = await anext(events)
+        assert clock.startswith("data: ") and "id:" not in clock
+        snapshot = await anext(events)
+        assert snapshot.startswith(f"id: {hub.epoch}.0\ndata: ") and snapshot.endswith("\n\n")
+        await anext(socket)
+        await anext(socket)
+
+        # a quiet game pings: an SSE comment for EventSource, a ping frame for sockets
+        assert await anext(events) == PING_EVENT and await anext(socket) == PING_TEXT
+
+        pending = asyncio.create_task(anext(events))
+        hub.publish([replace("/bid", 8)])
+        event = await pending
+        while event == PING_EVENT:
+            event = await anext(events)
+        assert event.startswith(f"id: {hub.epoch}.1\ndata: ")
+        assert json.loads(event.split("data: ", 1)[1])["ops"] == [replace("/bid", 8)]
+        stream.close()
+
+    asyncio.run(run())
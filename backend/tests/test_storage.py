@@ -0,0 +1,193 @@
+import json
+import time
+
+import pytest
+
+from app import journal as journal_module
+from app.journal import EventJournal, GAME_CREATED, PLAYER_JOINED, BID_PLACED, BID_FINALIZED
+from app.lifecycle import GameLifecycle
+from app.types.types import valid_game_id
+
+from conftest import bid, new_tracker
+
+BAD_IDS = ("../../etc/passwd", "..", "GAME01/../GAME02", "game01", "GAME0", "GAME012", "", "GAME0\x00")
+
+
+@pytest.fixture
+def journal(tmp_path) -> EventJournal:
+    return EventJournal(str(tmp_path))
+
+
+def journaled_game(tracker, journal, gameId="GAME01"):
+    tracker.add_game(gameId, "alice", drawSeed=3)
+    journal.append(gameId, {"type": GAME_CREATED, "creator": "alice", "team": None, "drawSeed": 3})
+    tracker.add_player(gameId, "bob")
+    journal.append(gameId, {"type": PLAYER_JOINED, "player": "bob"})
+    team = tracker.get_current_team(gameId).shortName
+    bid(tracker, gameId, "bob", 7)
+    journal.append(gameId, {"type": BID_PLACED, "player": "bob", "bid": 7, "team": team, "deadline": None})
+    return gameId
+
+
+def test_valid_game_id():
+    assert valid_game_id("GAME01")
+    assert valid_game_id("A1B2C3")
+    for game_id in BAD_IDS:
+        assert not valid_game_id(game_id)
+
+
+def test_evicted_game_restores_from_its_snapshot(tracker, journal):
+    gameId = journaled_game(tracker, journal)
+    game = tracker.game_info(gameId)
+    journal.archive(gameId, game)
+    tracker.remove_game(gameId)
+
+    restored = new_tracker()
+    journal.restore(restored, gameId, *journal.read_game(gameId))
+    assert restored.game_info(gameId) == game
+
+
+def test_game_restores_from_its_log(tracker, journal):
+    gameId = journaled_game(tracker, journal)
+    snapshot, events = journal.read_game(gameId)
+    assert snapshot is None and [event["type"] for event in events] == [GAME_CREATED, PLAYER_JOINED, BID_PLACED]
+
+    restored = new_tracker()
+    journal.restore(restored, gameId, snapshot, events)
+    assert restored.game_info(gameId) == tracker.game_info(gameId)
+
+
+def test_appends_are_numbered_and_compact_into_a_snapshot(tracker, journal, monkeypatch):
+    monkeypatch.setattr(journal_module, "COMPACT_EVERY", 3)
+    gameId = journaled_game(tracker, journal)
+    journal.flush()
+    with open(journal._log_path(gameId)) as f:
+        assert [json.loads(line)["seq"] for line in f] == [1, 2, 3]
+
+    assert journal.append(gameId, {"type": PLAYER_JOINED, "player": "carol"})  # time to compact
+    tracker.add_player(gameId, "carol")
+    journal.snapshot(gameId, tracker.game_info(gameId))
+    journal.append(gameId, {"type": PLAYER_JOINED, "player": "dave"})
+    tracker.add_player(gameId, "dave")
+
+    snapshot, events = journal.read_game(gameId)
+    assert snapshot is not None and set(snapshot.players) == {"alice", "bob", "carol"}
+    assert [(event["seq"], event["player"]) for event in events] == [(5, "dave")]
+    restored = new_tracker()
+    journal.restore(restored, gameId, snapshot, events)
+    assert restored.game_info(gameId) == tracker.game_info(gameId)
+
+
+def test_crash_before_the_log_is_truncated_replays_nothing_twice(tracker, journal):
+    gameId = journaled_game(tracker, journal)
+    team = tracker.get_current_team(gameId).shortName
+    tracker.finalize_bid(gameId)
+    journal.append(gameId, {"type": BID_FINALIZED, "sold": team, "team": tracker.get_current_team(gameId).shortName})
+    journal.flush()
+    with open(journal._log_path(gameId)) as f:
+        log = f.read()
+
+    journal.snapshot(gameId, tracker.game_info(gameId))
+    journal.flush()
+    with open(journal._log_path(gameId), "w") as f:
+        f.write(log)  # the snapshot replaced the old one, then the process died before truncating the log
+
+    reopened = EventJournal(journal.directory)
+    snapshot, events = reopened.read_game(gameId)
+    assert events == []
+    restored = new_tracker()
+    reopened.restore(restored, gameId, snapshot, events)
+    assert restored.game_info(gameId) == tracker.game_info(gameId)
+
+    # numbering carries on after the snapshot, so the next event is not mistaken for one it covers
+    reopened.append(gameId, {"type": PLAYER_JOINED, "player": "carol"})
+    assert [event["player"] for event in reopened.read_game(gameId)[1]] == ["carol"]
+
+
+def test_running_auctions_survive_a_restart(tracker, journal):
+    deadline = time.time() + 30
+    for gameId in ("GAME01", "GAME02"):
+        journaled_game(tracker, journal, gameId)
+        team = tracker.get_current_team(gameId).shortName
+        bid(tracker, gameId, "alice", 8)
+        tracker.set_deadline(gameId, deadline)
+        journal.append(gameId, {"type": BID_PLACED, "player": "alice", "bid": 8, "team": team, "deadline": deadline})
+    tracker.finalize_bid("GAME02")
+    next_team = tracker.get_current_team("GAME02").shortName
+    journal.append("GAME02", {"type": BID_FINALIZED, "sold": team, "team": next_team})
+    journal.flush()
+
+    reopened = EventJournal(journal.directory)  # the server restarted
+    assert reopened.active_auctions() == {"GAME01": deadline}
+    restored = new_tracker()
+    reopened.restore(restored, "GAME01", *reopened.read_game("GAME01"))
+    assert restored.get_deadline("GAME01") == deadline and restored.get_current_bid("GAME01") == 8
+
+
+def test_log_written_before_numbering_still_restores(tracker, journal):
+    gameId = journaled_game(tracker, journal)
+    journal.flush()
+    with open(journal._log_path(gameId)) as f:
+        events = [json.loads(line) for line in f]
+    with open(journal._log_path(gameId), "w") as f:
+        f.writelines(json.dumps({k: v for k, v in event.items() if k != "seq"}) + "\n" for event in events)
+
+    restored = new_tracker()
+    journal.restore(restored, gameId, *EventJournal(journal.directory).read_game(gameId))
+    assert restored.game_info(gameId) == tracker.game_info(gameId)
+
+
+def test_archiving_a_game_with_no_appended_events(tracker, journal):
+    tracker.add_game("GAME01", "alice", drawSeed=3)
+    journal.archive("GAME01", tracker.game_info("GAME01"))
+    snapshot, events = journal.read_game("GAME01")
+    assert snapshot == tracker.game_info("GAME01") and events == []
+
+
+def test_journal_never_opens_a_path_for_a_bad_id(tmp_path, journal):
+    (tmp_path.parent / "secret.log").write_text("{}\n")
+    for game_id in BAD_IDS + ("../secret",):
+        assert not journal.has_game(game_id)
+        assert journal.read_game(game_id) is None
+    assert journal.read_game("GAME01") is None  # valid but never journaled
+
+
+def test_sweep_evicts_idle_and_least_recent_games():
+    evicted = []
+    busy = {"GAME02"}
+    lifecycle = GameLifecycle(can_evict=lambda game_id: game_id not in busy, evict=evicted.append, ttl=60, capacity=3)
+    now = time.monotonic()
+    for game_id, idle in (("GAME01", 120), ("GAME02", 90), ("GAME03", 30), ("GAME04", 20), ("GAME05", 10)):
+        lifecycle.last_used[game_id] = now - idle
+
+    # GAME01 is idle; GAME02 is idle too but busy, so GAME03 goes in its place to get back under capacity
+    assert lifecycle.sweep() == ["GAME01", "GAME03"]
+    assert list(lifecycle.last_used) == ["GAME02", "GAME04", "GAME05"]
+
+    busy.clear()
+    assert lifecycle.sweep() == ["GAME02"]
+    assert lifecycle.sweep() == []
+    assert evicted == ["GAME01", "GAME03", "GAME02"]
+
+
+def test_api_evicts_and_restores_a_game(api):
+    game_id = api.client.post("/create-game/", json={"player": "alice", "drawSeed": 5}).json()["id"]
+    assert api.client.post("/join-game/", json={"gameId": game_id, "player": "bob"}).status_code == 200
+    game = api.gameTracker.game_info(game_id)
+
+    api.evict_game(game_id)
+    assert game_id not in api.gameTracker.games and game_id not in api.game_hubs
+
+    response = api.client.post("/view-game/", json={"gameId": game_id})
+    assert response.status_code == 200
+    assert api.gameTracker.game_info(game_id) == game
+
+
+def test_api_rejects_ids_that_are_not_game_ids(api, monkeypatch):
+    def read_game(game_id):
+        raise AssertionError(f"storage looked up {game_id!r}")
+
+    monkeypatch.setattr(api.journal, "read_game", read_game)
+    for game_id in BAD_IDS:
+        response = api.client.post("/join-game/", json={"gameId": game_id, "player": "mallory"})
+        assert response.status_code == 404
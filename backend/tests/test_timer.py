@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from app.timer import AuctionTimers
+
+
+def run_timers(schedule) -> list[tuple[str, float]]:
+    """
+    Run schedule(timers) on a fresh AuctionTimers. Returns each expired game in firing order, with the seconds
+    after the start it fired at.
+    """
+    fired: list[tuple[str, float]] = []
+
+    async def run():
+        async def on_expire(game_id: str) -> None:
+            fired.append((game_id, time.monotonic()))
+
+        timers = AuctionTimers(on_expire)
+        start = time.monotonic()
+        await schedule(timers)
+        return start
+
+    start = asyncio.run(run())
+    return [(game_id, at - start) for game_id, at in fired]
+
+
+def test_games_expire_in_deadline_order_once_each():
+    async def schedule(timers):
+        for game_id, seconds in (("GAME03", 0.15), ("GAME01", 0.05), ("GAME02", 0.1)):
+            timers.arm(game_id, seconds)
+        deadline = timers.arm("GAME04", 0.1)
+        assert abs(deadline - (time.time() + 0.1)) < 0.01  # wall-clock time, for clients
+        await asyncio.sleep(0.3)
+        assert timers.deadlines == {}
+
+    fired = run_timers(schedule)
+    assert [game_id for game_id, _ in fired] == ["GAME01", "GAME02", "GAME04", "GAME03"]
+    assert all(seconds >= expected for (_, seconds), expected in zip(fired, (0.05, 0.1, 0.1, 0.15)))
+
+
+def test_rearming_moves_the_deadline_and_cancel_stops_it():
+    async def schedule(timers):
+        timers.arm("GAME01", 0.05)
+        timers.arm("GAME02", 0.05)
+        timers.arm("GAME03", 0.05)
+        await asyncio.sleep(0.02)
+        for _ in range(3):
+            timers.arm("GAME01", 0.1)  # a burst of bids: only the last countdown counts
+        timers.cancel("GAME02")  # sold before its countdown ran out
+        timers.arm("GAME03", 0.01)  # re-armed sooner
+        await asyncio.sleep(0.25)
+
+    fired = run_timers(schedule)
+    assert [game_id for game_id, _ in fired] == ["GAME03", "GAME01"]
+    assert fired[0][1] < 0.05 and fired[1][1] >= 0.12
+
+
+def test_a_failing_expiry_does_not_stop_the_others():
+    fired = []
+
+    async def run():
+        async def on_expire(game_id: str) -> None:
+            fired.append(game_id)
+            if game_id == "GAME01":
+                raise RuntimeError("finalize failed")
+
+        timers = AuctionTimers(on_expire)
+        timers.arm("GAME01", 0.01)
+        timers.arm("GAME02", 0.02)
+        await asyncio.sleep(0.1)
+        timers.arm("GAME01", 0.01)  # and it can be armed again
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert fired == ["GAME01", "GAME02", "GAME01"]
+
+
+def started_auction(api):
+    game_id = api.client.post("/create-game/", json={"player": "alice", "drawSeed": 9}).json()["id"]
+    api.client.post("/join-game/", json={"gameId": game_id, "player": "bob"})
+    team = api.gameTracker.get_current_team(game_id).shortName
+    response = api.client.post("/bid/", json={"gameId": game_id, "player": "bob", "bid": 2, "team": team})
+    assert response.status_code == 200 and game_id in api.auction_timers.deadlines
+    return game_id, team
+
+
+def test_bid_queued_ahead_of_an_expired_finalize_keeps_the_auction_open(api):
+    game_id, team = started_auction(api)
+    api.gameTracker.set_deadline(game_id, time.time() - 1)  # the countdown ran out and the timer queued a finalize
+
+    async def bid_then_finalize():
+        await asyncio.gather(
+            api.submit(game_id, {"type": "bid", "player": "alice", "bid": 3, "team": team}),
+            api.submit(game_id, {"type": "finalize"}),
+        )
+
+    api.client.portal.call(bid_then_finalize)
+    assert api.gameTracker.get_current_team(game_id).shortName == team
+    assert api.gameTracker.get_current_bid(game_id) == 3
+    assert api.gameTracker.get_deadline(game_id) > time.time() and game_id in api.auction_timers.deadlines
+
+
+def test_sale_cancels_the_countdown(api):
+    game_id, team = started_auction(api)
+    api.gameTracker.set_deadline(game_id, time.time() - 1)
+
+    api.client.portal.call(api.submit, game_id, {"type": "finalize"})
+    assert api.gameTracker.get_current_team(game_id).shortName != team
+    assert api.gameTracker.get_deadline(game_id) is None and game_id not in api.auction_timers.deadlines
+
+    api.client.portal.call(api.submit, game_id, {"type": "finalize"})  # no bids on the next team: nothing to sell
+    assert api.gameTracker.games[game_id].players["bob"].owned != 0
+    assert len(api.gameTracker.games[game_id].draw) == len(api.gameTracker.catalog.lots) - 2
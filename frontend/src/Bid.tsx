@@ -61,6 +61,12 @@ function Bid(props: BidProps) {
         body: JSON.stringify({ gameId: props.gameId, player: props.player, bid: bidNumber, team: props.team }),
       });
 
+      if (response.status === 400) {
+        // rejected by the server, e.g. someone else bid higher first
+        const body = await response.json();
+        alert(body.detail);
+        return;
+      }
       if (!response.ok) {
         throw new Error('Bid submission failed');
       }
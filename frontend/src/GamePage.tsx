@@ -5,7 +5,7 @@ import React, { useState, useEffect } from "react";
 
 import Bid from "./Bid";
 import Bracket from "./Bracket";
-import { PlayerInfo, TeamInfo, BACKEND_URL } from "./Utils"
+import { PlayerInfo, TeamInfo, PatchOp, ApplyPatch, ServerClock, BACKEND_URL } from "./Utils"
 import { ReactComponent as CrownIcon } from "./icons/crown.svg";
 import { ReactComponent as UserIcon } from "./icons/user.svg";
 
@@ -17,114 +17,176 @@ type WebSocketMessage = {
     players?: Map<string, PlayerInfo>;
     bid?: number;
     countdown?: number;
+    deadline?: number | null;
     team?: TeamInfo;
     log?: string;
     remaining?: TeamInfo[];
     all_teams?: TeamInfo[];
 };
 
+type ServerMessage =
+    | { type: "snapshot"; epoch: string; version: number; state: { [key: string]: any } }
+    | { type: "delta"; version: number; ops: PatchOp[] }
+    | { type: "version"; version: number }
+    | { type: "ping"; now?: number }
+    | { type: "batch"; frames: ServerMessage[] };
+
+function toTeamInfo(temp_team: { [key: string]: any }): TeamInfo {
+    return {
+        shortName: temp_team["shortName"],
+        urlName: temp_team["urlName"],
+        seed: temp_team["seed"],
+        region: temp_team["region"]
+    };
+}
+
+// Converts one top-level field of the server game state into what the page renders
+function toWebSocketMessage(key: string, value: any): WebSocketMessage {
+    switch (key) {
+        case "players": {
+            const players = new Map<string, PlayerInfo>();
+            Object.entries(value).forEach(([key, temp_player]: [string, any]) => {
+                players.set(key, {
+                    name: temp_player.name,
+                    gameId: temp_player.gameId,
+                    balance: parseInt(temp_player.balance),
+                    points: parseFloat(temp_player.points),
+                    teams: Object.values(temp_player.teams).map((temp_team: any) => {
+                        return { ...toTeamInfo(temp_team), purchasePrice: temp_team.purchasePrice };
+                    }),
+                });
+            });
+            return { players };
+        }
+        case "bid":
+            return { bid: value };
+        case "countdown":
+            return { countdown: value };
+        case "deadline":
+            return { deadline: value };
+        case "log":
+            return { log: value };
+        case "team":
+            return value ? { team: toTeamInfo(value) } : {};
+        case "remaining":
+            return { remaining: Object.values(value).map((temp_team: any) => toTeamInfo(temp_team)) };
+        case "all_teams":
+            return { all_teams: value.map((temp_team: any) => toTeamInfo(temp_team)) };
+        default:
+            return {};
+    }
+}
+
 // Extract WebSocket logic to a custom hook
 function useGameWebSocket(gameId: string) {
     const [wsData, setWsData] = useState<WebSocketMessage>({});
     const [error, setError] = useState<string | null>(null);
+    const [clock] = useState(() => new ServerClock());
 
     useEffect(() => {
-        const ws = new WebSocket(`ws://${BACKEND_URL}/ws/${gameId}`);
+        let ws: WebSocket;
+        let state: { [key: string]: any } = {};
+        let epoch = "";
+        let version = -1;
+        let retries = 0;
+        let reconnectTimer: ReturnType<typeof setTimeout> | undefined;
+        let closed = false;
 
-        ws.onerror = (error) => {
-            setError('WebSocket connection error');
-            console.error('WebSocket error:', error);
+        const requestResync = () => {
+            ws.send(JSON.stringify({ resync: version }));
         };
 
-        ws.onclose = () => {
-            setError('WebSocket connection closed');
+        // Only fields touched by the message are converted, the rest of wsData keeps its identity
+        const updateFields = (keys: string[]) => {
+            const update: WebSocketMessage = {};
+            new Set(keys).forEach((key) => Object.assign(update, toWebSocketMessage(key, state[key])));
+            setWsData((prev: WebSocketMessage) => ({ ...prev, ...update }));
         };
 
-        ws.onmessage = (event) => {
-            if (event.data === "gameStarted") {
-                // ignore
+        const handleMessage = (data: ServerMessage) => {
+            if (data.type === "batch") {
+                data.frames.forEach(handleMessage);
             }
-            else {
-                try {
-                    const data: WebSocketMessage = JSON.parse(event.data);
-                    console.log("DATA", data);
-                    if ("players" in data && data.players) {
-                        const players = new Map<string, PlayerInfo>();
-                        Object.entries(data.players).forEach(([key, temp_player]: [string, any]) => {
-                            players.set(key, {
-                                name: temp_player.name,
-                                gameId: temp_player.gameId,
-                                balance: parseInt(temp_player.balance),
-                                points: parseInt(temp_player.points),
-                                teams: Object.values(temp_player.teams).map((temp_team: any) => {
-                                    return {
-                                        shortName: temp_team.shortName,
-                                        urlName: temp_team.urlName,
-                                        seed: temp_team.seed,
-                                        region: temp_team.region,
-                                        purchasePrice: temp_team.purchasePrice
-                                    };
-                                }),
-                            });
-                        });
-                        setWsData((prev: WebSocketMessage) => ({ ...prev, players }));
-                    }
-                    else if ("bid" in data) {
-                        setWsData((prev: WebSocketMessage) => ({ ...prev, bid: data["bid"] }));
-                    }
-                    else if ("countdown" in data) {
-                        setWsData((prev: WebSocketMessage) => ({ ...prev, countdown: data["countdown"] }));
-                    }
-                    else if ("team" in data && data.team) {
-                        const team = data.team as TeamInfo;
-                        setWsData((prev: WebSocketMessage) => ({
-                            ...prev, team: {
-                                shortName: team.shortName,
-                                urlName: team.urlName,
-                                seed: team.seed,
-                                region: team.region
-                            }
-                        }));
-                    }
-                    else if ("log" in data) {
-                        setWsData((prev: WebSocketMessage) => ({ ...prev, log: data["log"] }));
-                    }
-                    else if ("remaining" in data && data.remaining) {
-                        const remaining_teams: TeamInfo[] = data.remaining.map((temp_team: { [key: string]: any }, i: number) => {
-                            return {
-                                shortName: temp_team["shortName"],
-                                urlName: temp_team["urlName"],
-                                seed: temp_team["seed"],
-                                region: temp_team["region"]
-                            };
-                        });
-                        setWsData((prev: WebSocketMessage) => ({ ...prev, remaining: remaining_teams }));
-                    }
-                    else if ("all_teams" in data && data.all_teams) {
-                        const all_teams: TeamInfo[] = data.all_teams.map((temp_team: { [key: string]: any }, i: number) => {
-                            return {
-                                shortName: temp_team["shortName"],
-                                urlName: temp_team["urlName"],
-                                seed: temp_team["seed"],
-                                region: temp_team["region"]
-                            };
-                        })
-                        setWsData((prev: WebSocketMessage) => ({ ...prev, all_teams }));
-                    }
-                } catch (error) {
-                    console.error('Error parsing WebSocket message:', error);
-                    setError('Invalid message format received');
+            else if (data.type === "snapshot") {
+                state = data.state;
+                epoch = data.epoch;
+                version = data.version;
+                updateFields(Object.keys(state));
+            }
+            else if (data.type === "delta") {
+                if (data.version <= version) {
+                    return; // already included in the snapshot we hold
+                }
+                if (data.version !== version + 1) {
+                    requestResync();
+                    return;
                 }
+                state = ApplyPatch(state, data.ops);
+                version = data.version;
+                updateFields(data.ops.map((op) => op.path.split("/")[1]));
+            }
+            else if (data.type === "version" && data.version > version) {
+                requestResync();
+            }
+            else if (data.type === "ping") {
+                if (data.now !== undefined) {
+                    clock.sync(data.now);
+                }
+                ws.send("pong"); // the server closes sockets that stop answering
             }
         };
+
+        // After a dropped socket or a server restart, reconnect with the state we hold so the server only sends
+        // what we missed; it answers with a snapshot when it cannot
+        const connect = () => {
+            const resume = version >= 0 ? `?resume=${epoch}.${version}` : "";
+            ws = new WebSocket(`ws://${BACKEND_URL}/ws/${gameId}${resume}`);
+
+            ws.onopen = () => {
+                retries = 0;
+                setError(null);
+            };
+
+            ws.onerror = (error) => {
+                console.error('WebSocket error:', error);
+            };
+
+            ws.onclose = (event) => {
+                if (closed || event.code === 4000) {
+                    setError(closed ? null : 'Game not found');
+                    return;
+                }
+                setError('WebSocket connection closed, reconnecting...');
+                reconnectTimer = setTimeout(connect, Math.min(1000 * 2 ** retries, 30000));
+                retries += 1;
+            };
+
+            ws.onmessage = (event) => {
+                if (event.data === "gameStarted") {
+                    // ignore
+                }
+                else {
+                    try {
+                        handleMessage(JSON.parse(event.data));
+                    } catch (error) {
+                        console.error('Error parsing WebSocket message:', error);
+                        setError('Invalid message format received');
+                    }
+                }
+            };
+        };
+
+        connect();
         return () => {
+            closed = true;
+            clearTimeout(reconnectTimer);
             if (ws.readyState === WebSocket.OPEN) {
                 ws.close();
             }
         };
-    }, [gameId]);
+    }, [gameId, clock]);
 
-    return { wsData, error };
+    return { wsData, error, clock };
 }
 
 function GamePage() {
@@ -146,7 +208,7 @@ function GamePage() {
 
     const baseColor = "#FFD700";
 
-    const { wsData, error } = useGameWebSocket(gameId);
+    const { wsData, error, clock } = useGameWebSocket(gameId);
 
     // resets current highest bid when a new team is auctioned
     useEffect(() => {
@@ -162,9 +224,6 @@ function GamePage() {
         if (wsData.bid !== undefined) {
             setCurrentHighestBid(wsData.bid);
         }
-        if (wsData.countdown !== undefined) {
-            setCountdown(wsData.countdown);
-        }
         if (wsData.team !== undefined) {
             setTeam(wsData.team);
         }
@@ -178,7 +237,22 @@ function GamePage() {
         if (wsData.all_teams !== undefined) {
             setAllTeams(wsData.all_teams);
         }
-    }, [wsData.players, wsData.bid, wsData.countdown, wsData.team, wsData.log, wsData.remaining, wsData.all_teams, error]);
+    }, [wsData.players, wsData.bid, wsData.team, wsData.log, wsData.remaining, wsData.all_teams, error]);
+
+    // counts down locally from the server's deadline on the server's clock, the server does not send per-second ticks
+    useEffect(() => {
+        const deadline = wsData.deadline;
+        if (deadline === undefined || deadline === null) {
+            if (wsData.countdown !== undefined) {
+                setCountdown(wsData.countdown);
+            }
+            return;
+        }
+        const tick = () => setCountdown(Math.max(0, Math.ceil(deadline - clock.now())));
+        tick();
+        const interval = setInterval(tick, 250);
+        return () => clearInterval(interval);
+    }, [wsData.deadline, wsData.countdown, clock]);
 
     return (
         <div id="outer-container">
@@ -240,7 +314,7 @@ function GamePage() {
                                                                 gameId={gameId}
                                                                 player={playerName}
                                                                 currentHighestBid={currentHighestBid}
-                                                                team={`${team.shortName} (${team.seed})`}
+                                                                team={team.shortName}
                                                                 balance={playerInfos.get(playerName)?.balance || 0}
                                                             />
                                                         </Grid>
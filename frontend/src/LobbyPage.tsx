@@ -3,7 +3,7 @@ import { Button, Typography, List, ListItem, Card, Chip } from "@mui/joy";
 import { Grid, Paper } from "@mui/material";
 import { useLocation, useNavigate } from "react-router-dom";
 
-import { BACKEND_URL } from "./Utils"
+import { ApplyPatch, BACKEND_URL } from "./Utils"
 import imageSrc from "./images/march_madness_logo_auction.png";
 import { ReactComponent as CrownIcon } from "./icons/crown.svg";
 import { ReactComponent as UserIcon } from "./icons/user.svg";
@@ -21,6 +21,28 @@ function LobbyPage() {
   useEffect(() => {
     const ws = new WebSocket(`ws://${BACKEND_URL}/ws/${gameId}`);
     wsRef.current = ws;
+    let state: { [key: string]: any } = {};
+    let version = -1;
+
+    const handleMessage = (data: any) => {
+      if (data.type === "batch") {
+        data.frames.forEach(handleMessage);
+      }
+      else if (data.type === "snapshot") {
+        state = data.state;
+        version = data.version;
+      }
+      else if (data.type === "delta" && data.version === version + 1) {
+        state = ApplyPatch(state, data.ops);
+        version = data.version;
+      }
+      else if (data.type === "ping") {
+        ws.send("pong"); // the server closes sockets that stop answering
+      }
+      else if (data.version > version) {
+        ws.send(JSON.stringify({ resync: version }));
+      }
+    };
 
     ws.onmessage = (event) => {
       if (event.data === "gameStarted") {
@@ -28,10 +50,9 @@ function LobbyPage() {
         navigate("/game", { state: { gameId, isCreator, playerName } });
       }
       else {
-        const data = JSON.parse(event.data);
-
-        if ("players" in data) {
-          setPlayers(Object.keys(data["players"]));
+        handleMessage(JSON.parse(event.data));
+        if (state.players) {
+          setPlayers(Object.keys(state.players));
         }
       }
     };
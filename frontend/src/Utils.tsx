@@ -96,4 +96,45 @@ export function GenerateRegionBracketData(regionTeams: TeamInfo[]): Match[] {
 export function IntegrateMatchResults(bracketMatches:Match[], matchResults:Match[]): Match[] {
     
     return bracketMatches;
-}
\ No newline at end of file
+}
+export interface PatchOp {
+    op: "add" | "replace" | "remove"
+    path: string
+    value?: any
+}
+
+// Applies server deltas without mutating the input. Only objects along each path are copied,
+// so untouched parts of the state keep their identity.
+export function ApplyPatch(state: { [key: string]: any }, ops: PatchOp[]): { [key: string]: any } {
+    const root = { ...state };
+    for (const op of ops) {
+        const keys = op.path.split("/").slice(1).map((key) => key.replace(/~1/g, "/").replace(/~0/g, "~"));
+        let parent: any = root;
+        for (const key of keys.slice(0, -1)) {
+            parent[key] = { ...parent[key] };
+            parent = parent[key];
+        }
+        const last = keys[keys.length - 1];
+        if (op.op === "remove") {
+            delete parent[last];
+        }
+        else {
+            parent[last] = op.value;
+        }
+    }
+    return root;
+}
+
+// The server's wall-clock time, from the "now" it sends with pings, advanced by the local monotonic clock so that
+// countdowns to server deadlines do not depend on this machine's clock being right
+export class ServerClock {
+    private offset: number | null = null; // server seconds minus local monotonic seconds
+
+    sync(serverNow: number) {
+        this.offset = serverNow - performance.now() / 1000;
+    }
+
+    now(): number {
+        return this.offset === null ? Date.now() / 1000 : performance.now() / 1000 + this.offset;
+    }
+}
@@ -1,17 +1,132 @@
 import { Typography, List, ListItem, Chip } from "@mui/joy";
 import { Paper, Grid, Card } from "@mui/material";
 import { useLocation } from "react-router-dom";
-import React, { useState, useEffect, useRef } from "react";
+import React, { useState, useEffect } from "react";
 
 import Bracket from "./Bracket";
-import { PlayerInfo, TeamInfo, Match, BACKEND_URL } from "./Utils"
+import { TeamInfo, ApplyPatch, ServerClock, BACKEND_URL } from "./Utils"
 import { ReactComponent as CrownIcon } from "./icons/crown.svg";
 import { ReactComponent as UserIcon } from "./icons/user.svg";
 
+import "./css/App.css";
+import "./css/Fonts.css";
+
+// Read-only game state from the spectator stream. EventSource reconnects by itself and sends the id of the
+// last update it got, so the server only sends what was missed.
+function useSpectatorStream(gameId: string) {
+    const [state, setState] = useState<{ [key: string]: any }>({});
+    const [clock] = useState(() => new ServerClock());
+
+    useEffect(() => {
+        const source = new EventSource(`http://${BACKEND_URL}/spectate/${gameId}/events`);
+        let current: { [key: string]: any } = {};
+        let version = -1;
+
+        const handleMessage = (data: any) => {
+            if (data.type === "batch") {
+                data.frames.forEach(handleMessage);
+            }
+            else if (data.type === "snapshot") {
+                current = data.state;
+                version = data.version;
+            }
+            else if (data.type === "delta" && data.version === version + 1) {
+                current = ApplyPatch(current, data.ops);
+                version = data.version;
+            }
+            else if (data.type === "ping" && data.now !== undefined) {
+                clock.sync(data.now);
+            }
+        };
+
+        source.onmessage = (event) => {
+            handleMessage(JSON.parse(event.data));
+            setState(current);
+        };
+        return () => source.close();
+    }, [gameId, clock]);
+
+    return { state, clock };
+}
+
 function ViewPage() {
+    const location = useLocation();
+    const { gameId } = location.state || {};
+    const { state, clock } = useSpectatorStream(gameId);
+    const [countdown, setCountdown] = useState<number>(0);
+    const baseColor = "#FFD700";
+
+    const team: TeamInfo | null = state.team || null;
+    const allTeams: TeamInfo[] = state.all_teams || [];
+    const players: [string, any][] = Object.entries(state.players || {});
+
+    // counts down locally from the server's deadline on the server's clock, like the game page
+    useEffect(() => {
+        const deadline = state.deadline;
+        if (deadline === undefined || deadline === null) {
+            setCountdown(state.countdown || 0);
+            return;
+        }
+        const tick = () => setCountdown(Math.max(0, Math.ceil(deadline - clock.now())));
+        tick();
+        const interval = setInterval(tick, 250);
+        return () => clearInterval(interval);
+    }, [state.deadline, state.countdown, clock]);
 
     return (
         <div id="outer-container">
+            <Paper elevation={1} sx={{ height: "720px", width: "1400px", padding: "10px", backgroundColor: "white" }} >
+                <Grid container spacing={1} sx={{ display: "flex", justifyContent: "center", alignItems: "center", flexDirection: "row" }}>
+                    {/* Bracket and the team up for auction */}
+                    <Grid item xs={10}>
+                        <Card sx={{ height: "555px", width: "100%", padding: "5px", backgroundColor: "white", border: 1, borderRadius: 1, borderColor: "black" }}>
+                            {allTeams.length > 0 && team ?
+                                <Bracket all_teams={allTeams} selected_team={team} />
+                                : <Typography>No teams available</Typography>
+                            }
+                        </Card>
+                        <Card sx={{ marginTop: "10px", padding: "10px", backgroundColor: "white", border: 1, borderRadius: 1, borderColor: "black" }}>
+                            <Typography sx={{ fontFamily: "doubleFeature", fontSize: "40px" }}>
+                                {team ? `${team.shortName} (${team.seed})` : "Auction over"}
+                            </Typography>
+                            <Typography sx={{ fontSize: "20px" }}>
+                                Current bid: ${(state.bid || 0).toFixed(2)} - {countdown.toString().padStart(2, "0")}s
+                            </Typography>
+                            <Typography sx={{ fontSize: "14px" }}>{state.log || ""}</Typography>
+                        </Card>
+                    </Grid>
+
+                    {/* Players */}
+                    <Grid item xs={2}>
+                        <Card sx={{ height: "690px", overflowY: "auto", width: "100%", backgroundColor: "white", border: 1, borderRadius: 1, borderColor: "black" }}>
+                            <List sx={{ width: "100%" }}>
+                                {players.length > 0 ?
+                                    players.map(([player, player_info], i) => {
+                                        const playerColor = `hsl(${(i * 30) % 360}, 70%, 50%)`;
+                                        return (
+                                            <ListItem key={player}>
+                                                {i === 0 ? <CrownIcon fill={baseColor} width="20px" height="20px" /> : <UserIcon fill={playerColor} width="20px" height="20px" />}
+                                                <Chip sx={{ padding: "0 20px", backgroundColor: "var(--off-white-color)" }}>
+                                                    <Typography sx={{ fontFamily: "doubleFeature" }}>{player}</Typography>
+                                                    <Typography sx={{ fontSize: "12px" }}>
+                                                        Balance: $ {Number(player_info.balance).toFixed(2)}
+                                                    </Typography>
+                                                    {Object.values(player_info.teams).map((temp_team: any) => (
+                                                        <Typography key={temp_team.shortName} sx={{ marginLeft: "10px", fontSize: "12px" }}>
+                                                            - {temp_team.shortName} (${temp_team.purchasePrice})
+                                                        </Typography>
+                                                    ))}
+                                                </Chip>
+                                            </ListItem>
+                                        );
+                                    })
+                                    : <Typography>No players</Typography>
+                                }
+                            </List>
+                        </Card>
+                    </Grid>
+                </Grid>
+            </Paper>
         </div>
     )
 }